@@ -0,0 +1,276 @@
+"""
+Armazém das bases grandes das sessões (base carregada, resultado da filtragem).
+
+Em vez de cada sessão guardar os seus DataFrames no `st.session_state`, eles
+ficam aqui, compartilhados pelo processo. Cada base é gravada uma vez em um
+arquivo Arrow IPC no disco local e mantida em memória enquanto couber no
+limite (LIMITE_MEMORIA_SESSOES_MB, somando todas as sessões). Acima dele, as
+bases usadas há mais tempo saem da memória; na próxima leitura o arquivo é
+mapeado em memória e o DataFrame é montado sem cópia (números sem nulos e
+textos apontam para o arquivo; só códigos de categorias e colunas com nulos
+são copiados), então quem ocupa a memória é o cache de páginas do sistema, que
+ele pode descartar. Acima do limite de disco as bases menos usadas são
+descartadas de vez e a sessão precisa recarregá-las. Sem disco (sem pyarrow ou
+com LIMITE_DISCO_SESSOES_MB <= 0) não há para onde tirá-las da memória: acima do
+limite de memória as bases usadas há mais tempo também são descartadas de vez.
+
+Uma base com `chave` de conteúdo (ex: a impressão digital da base carregada) é
+guardada uma só vez, mesmo que várias sessões a usem. O índice fica só em
+memória: cada processo usa o seu subdiretório, apagado ao terminar (ou, se o
+processo morreu, pelo próximo que iniciar).
+"""
+
+import atexit
+import itertools
+import os
+import secrets
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+
+from dados_constantes import DIRETORIO_ARMAZEM_SESSOES, LIMITE_DISCO_SESSOES_MB, LIMITE_MEMORIA_SESSOES_MB
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.ipc as ipc
+    ARMAZEM_DISPONIVEL = True
+except ImportError:
+    ARMAZEM_DISPONIVEL = False
+
+
+def _processo_vivo(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, OSError):
+        return True
+    return True
+
+
+def _tabela_arrow(df: pd.DataFrame):
+    """
+    Tabela Arrow de `df`. Nas colunas float os nulos voltam a ser NaN (valor, não
+    nulo): assim a leitura mapeada não precisa copiar a coluna para preenchê-los.
+    """
+    tabela = pa.Table.from_pandas(df)
+    for i, campo in enumerate(tabela.schema):
+        coluna = tabela.column(i)
+        if pa.types.is_floating(campo.type) and coluna.null_count:
+            tabela = tabela.set_column(i, campo, pc.fill_null(coluna, float('nan')))
+    return tabela
+
+
+def _bytes_copiados(tabela, df: pd.DataFrame) -> int:
+    """Memória de `df` (montado de `tabela` mapeada) que não aponta para o arquivo."""
+    total = 0
+    for i, coluna in enumerate(df.columns):
+        tipo = tabela.schema.field(i).type if i < tabela.num_columns else None
+        sem_copia = (tipo is not None and tabela.column(i).null_count == 0
+                     and (pa.types.is_integer(tipo) or pa.types.is_floating(tipo) or pa.types.is_temporal(tipo)
+                          or pa.types.is_large_string(tipo) or pa.types.is_string(tipo)))
+        if not sem_copia:
+            total += int(df[coluna].memory_usage(index=False, deep=False))
+    return total
+
+
+class _Artefato:
+    def __init__(self, chave: str, df: pd.DataFrame):
+        self.chave = chave
+        self.df = df
+        self.attrs = dict(df.attrs)
+        self.bytes_memoria = int(df.memory_usage(deep=True).sum())
+        self.caminho = None
+        self.bytes_disco = 0
+        self.sessoes = set()
+        self.ultimo_uso = time.time()
+
+
+class ArmazemSessoes:
+    """Bases das sessões em memória e em arquivos Arrow mapeados, com despejo LRU por limites."""
+
+    def __init__(self, diretorio: str = DIRETORIO_ARMAZEM_SESSOES, limite_memoria_mb: float = LIMITE_MEMORIA_SESSOES_MB,
+                 limite_disco_mb: float = LIMITE_DISCO_SESSOES_MB):
+        self.limite_memoria_bytes = int(limite_memoria_mb * 1024 * 1024)
+        self.limite_disco_bytes = int(limite_disco_mb * 1024 * 1024)
+        self._trava = threading.RLock()
+        self._artefatos = OrderedDict()  # chave -> _Artefato, do usado há mais tempo ao mais recente
+        self._referencias = {}  # (sessão, nome) -> chave
+        self._sequencia = itertools.count()
+        self.diretorio = None
+        if ARMAZEM_DISPONIVEL and self.limite_disco_bytes > 0:
+            os.makedirs(diretorio, exist_ok=True)
+            self._limpar_processos_encerrados(diretorio)
+            self.diretorio = tempfile.mkdtemp(prefix=f"{os.getpid()}-", dir=diretorio)
+            atexit.register(shutil.rmtree, self.diretorio, True)
+
+    @staticmethod
+    def _limpar_processos_encerrados(diretorio: str):
+        for entrada in os.scandir(diretorio):
+            pid = entrada.name.split('-', 1)[0]
+            if entrada.is_dir() and pid.isdigit() and not _processo_vivo(int(pid)):
+                shutil.rmtree(entrada.path, ignore_errors=True)
+
+    # --- Gravação e leitura dos arquivos ---
+    def _gravar(self, df: pd.DataFrame) -> str:
+        caminho = os.path.join(self.diretorio, f"{secrets.token_hex(8)}.arrow")
+        temporario = caminho + '.tmp'
+        try:
+            tabela = _tabela_arrow(df)
+            with pa.OSFile(temporario, 'wb') as destino, ipc.new_file(destino, tabela.schema) as escritor:
+                escritor.write_table(tabela)
+            os.replace(temporario, caminho)
+        except Exception:
+            self._remover_arquivo(temporario)
+            raise
+        return caminho
+
+    @staticmethod
+    def _mapear(caminho: str, attrs: dict):
+        """(DataFrame montado do arquivo mapeado em memória, bytes copiados)."""
+        tabela = ipc.open_file(pa.memory_map(caminho, 'r')).read_all()
+        df = tabela.to_pandas(split_blocks=True)
+        df.attrs.update(attrs)
+        return df, _bytes_copiados(tabela, df)
+
+    @staticmethod
+    def _remover_arquivo(caminho: str):
+        try:
+            os.remove(caminho)
+        except OSError:
+            pass
+
+    # --- API ---
+    def guardar(self, sessao: str, nome: str, df: pd.DataFrame, chave: str = None) -> str:
+        """
+        Guarda `df` como `nome` da `sessao` (substituindo o anterior). `chave` identifica
+        o conteúdo: com a mesma chave, sessões compartilham uma única cópia.
+        """
+        chave = chave or f"{sessao}:{nome}:{next(self._sequencia)}"
+        while True:
+            with self._trava:
+                existente = self._artefatos.get(chave)
+            novo = None
+            if existente is None:
+                novo = _Artefato(chave, df)
+                if self.diretorio is not None:
+                    # Fora da trava: gravar uma base grande não segura as outras sessões
+                    novo.caminho = self._gravar(df)
+                    novo.bytes_disco = os.path.getsize(novo.caminho)
+            with self._trava:
+                artefato = self._artefatos.get(chave)
+                if artefato is None and novo is None:
+                    # A outra sessão descartou a chave entre as travas: grava de novo
+                    continue
+                if artefato is None:
+                    artefato = self._artefatos[chave] = novo
+                else:
+                    if novo is not None and novo.caminho:
+                        # Outra sessão guardou a mesma chave enquanto gravávamos
+                        self._remover_arquivo(novo.caminho)
+                    if artefato.df is None:
+                        artefato.df = df
+                        artefato.bytes_memoria = int(df.memory_usage(deep=True).sum())
+                if self._referencias.get((sessao, nome)) != chave:
+                    # Soltar a mesma chave a descartaria se só esta sessão a usa
+                    self._soltar(sessao, nome)
+                self._referencias[(sessao, nome)] = chave
+                artefato.sessoes.add(sessao)
+                self._usar(artefato)
+                self._aplicar_limites(protegido=chave)
+            return chave
+
+    def obter(self, sessao: str, nome: str):
+        """DataFrame guardado como `nome` da `sessao`, ou None (nunca guardado ou descartado)."""
+        with self._trava:
+            chave = self._referencias.get((sessao, nome))
+            artefato = self._artefatos.get(chave)
+            if artefato is None:
+                return None
+            self._usar(artefato)
+            if artefato.df is not None:
+                return artefato.df
+            caminho, attrs = artefato.caminho, artefato.attrs
+        df, copiados = self._mapear(caminho, attrs)
+        with self._trava:
+            if self._artefatos.get(chave) is artefato and artefato.df is None:
+                artefato.df = df
+                artefato.bytes_memoria = copiados
+                self._aplicar_limites(protegido=chave)
+        return df
+
+    def remover(self, sessao: str, nome: str):
+        with self._trava:
+            self._soltar(sessao, nome)
+
+    def contem(self, sessao: str, nome: str) -> bool:
+        with self._trava:
+            return self._referencias.get((sessao, nome)) in self._artefatos
+
+    def uso(self, sessao: str = None) -> dict:
+        """Bytes em memória e em disco das bases (de uma sessão, ou de todas)."""
+        with self._trava:
+            artefatos = [a for a in self._artefatos.values() if sessao is None or sessao in a.sessoes]
+            return {
+                'memoria': sum(a.bytes_memoria for a in artefatos if a.df is not None),
+                'disco': sum(a.bytes_disco for a in artefatos),
+                'bases': len(artefatos),
+                'sessoes': len({s for a in artefatos for s in a.sessoes}),
+            }
+
+    # --- Internos (com a trava) ---
+    def _usar(self, artefato: _Artefato):
+        artefato.ultimo_uso = time.time()
+        self._artefatos.move_to_end(artefato.chave)
+
+    def _soltar(self, sessao: str, nome: str):
+        chave = self._referencias.pop((sessao, nome), None)
+        artefato = self._artefatos.get(chave)
+        if artefato is None:
+            return
+        if not any(k[0] == sessao and c == chave for k, c in self._referencias.items()):
+            artefato.sessoes.discard(sessao)
+        if not artefato.sessoes:
+            self._descartar(artefato)
+
+    def _descartar(self, artefato: _Artefato):
+        self._artefatos.pop(artefato.chave, None)
+        for referencia in [k for k, c in self._referencias.items() if c == artefato.chave]:
+            del self._referencias[referencia]
+        if artefato.caminho:
+            # Leituras mapeadas em andamento continuam válidas (o arquivo some só do diretório)
+            self._remover_arquivo(artefato.caminho)
+        artefato.df = None
+
+    def _aplicar_limites(self, protegido: str = None):
+        """
+        Tira da memória (ou descarta, se não estão no disco) e depois descarta as
+        bases usadas há mais tempo até caber nos limites.
+        """
+        memoria = sum(a.bytes_memoria for a in self._artefatos.values() if a.df is not None)
+        for artefato in list(self._artefatos.values()):
+            if memoria <= self.limite_memoria_bytes:
+                break
+            if artefato.chave == protegido or artefato.df is None:
+                continue
+            memoria -= artefato.bytes_memoria
+            if artefato.caminho is None:
+                # Sem arquivo no disco: a base só sai da memória se for descartada
+                self._descartar(artefato)
+                continue
+            # Já está no disco: sair da memória é só soltar a referência
+            artefato.df = None
+            artefato.bytes_memoria = 0
+        disco = sum(a.bytes_disco for a in self._artefatos.values())
+        for artefato in list(self._artefatos.values()):
+            if disco <= self.limite_disco_bytes:
+                break
+            if artefato.chave == protegido or artefato.caminho is None:
+                continue
+            disco -= artefato.bytes_disco
+            self._descartar(artefato)
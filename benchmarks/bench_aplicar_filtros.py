@@ -0,0 +1,232 @@
+"""
+Benchmark de ponta a ponta do filtrador, etapa por etapa.
+
+Gera bases sintéticas (gerador_bases) nos tamanhos pedidos, grava os CSVs em um
+diretório temporário e mede cada etapa: leitura dos arquivos (sem o cache
+Parquet), pré-processamento, cada processador de configuração, finalização e
+exportação do CSV. Para cada etapa são registrados o tempo de parede, a memória
+residente ao final e, com --tracemalloc, o pico de alocações da etapa. Cada
+execução é acrescentada ao histórico em JSON, e a comparação com a execução
+anterior de mesmo tamanho/convênio é impressa no fim.
+
+Uso (a partir da raiz do repositório):
+    python benchmarks/bench_aplicar_filtros.py --linhas 100000 1000000 --convenio govsp
+    python benchmarks/bench_aplicar_filtros.py --linhas 5000000 10000000 --tracemalloc
+"""
+
+import argparse
+import datetime
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import filtradores  # noqa: E402
+from cache_parquet import CacheParquet  # noqa: E402
+from exportacao import exportar  # noqa: E402
+from gerador_bases import gerar_base, gravar_csvs  # noqa: E402
+from juntar_arquivos import ler_arquivos_csv  # noqa: E402
+from registro_eventos import RegistradorEventos, usar_registrador  # noqa: E402
+
+HISTORICO_PADRAO = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'historico_benchmarks.json')
+
+
+def _config(**valores) -> dict:
+    config = {
+        'cartao_escolhido': 'Novo', 'operador_logico': 'E (AND)', 'condicoes': [], 'banco': '243',
+        'coeficiente': 30.0, 'comissao': 5.0, 'parcelas': 96, 'coeficiente_parcela': 1.0,
+        'margem_minima_cartao': 30.0, 'usa_margem_seguranca': False,
+        'modo_margem_seguranca': None, 'valor_margem_seguranca': None,
+    }
+    config.update(valores)
+    return config
+
+
+def cenario(convenio: str):
+    """Parâmetros gerais e configurações de banco típicos de uma campanha de Crédito Novo."""
+    params = {
+        'tipo_campanha': 'Novo', 'convenio': convenio, 'equipe': 'outbound', 'convai_percent': 10,
+        'comissao_minima': 10.0, 'comissao_maxima': 100000.0, 'margem_limite': 20.0,
+        'data_limite_idade': datetime.date.today().replace(year=datetime.date.today().year - 72),
+        'selecao_lotacao': [], 'selecao_lotacao_palavras': ['detran', 'unidade 0007'],
+        'selecao_vinculos': ['ESTAGIARIO'], 'selecao_vinculos_palavras': ['cedido'],
+    }
+    configs = [
+        _config(banco='33', condicoes=[{'tipo': 'coluna_palavras', 'coluna': 'Lotacao', 'palavras': ['educacao', 'saúde']}]),
+        _config(banco='243', operador_logico='Ou (OR)', usa_margem_seguranca=True,
+                modo_margem_seguranca='Percentual (%)', valor_margem_seguranca=5.0,
+                condicoes=[{'tipo': 'coluna_valor', 'coluna': 'MG_Emprestimo_Total', 'operador': '>', 'valor': '800'},
+                           {'tipo': 'coluna_palavras', 'coluna': 'Vinculo_Servidor', 'palavras': ['efetivo']}]),
+        _config(banco='74', coeficiente=20.0),
+    ]
+    return params, configs
+
+
+def _rss_mb():
+    if resource is None:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(pico / 1024 / 1024 if sys.platform == 'darwin' else pico / 1024, 1)
+
+
+class Cronometro:
+    """Acumula as medições de cada etapa."""
+
+    def __init__(self, usar_tracemalloc: bool):
+        self.usar_tracemalloc = usar_tracemalloc
+        self.etapas = []
+
+    @contextmanager
+    def etapa(self, nome: str):
+        if self.usar_tracemalloc:
+            tracemalloc.reset_peak()
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            medicao = {'etapa': nome, 'segundos': round(time.perf_counter() - inicio, 4), 'pico_rss_mb': _rss_mb()}
+            if self.usar_tracemalloc:
+                medicao['pico_alocado_mb'] = round(tracemalloc.get_traced_memory()[1] / 1024 / 1024, 1)
+            self.etapas.append(medicao)
+
+    def envolver(self, nome: str, funcao):
+        def envolvida(*args, **kwargs):
+            with self.etapa(nome):
+                return funcao(*args, **kwargs)
+        return envolvida
+
+
+@contextmanager
+def _etapas_cronometradas(cronometro: Cronometro):
+    """Troca temporariamente as etapas de `filtradores` por versões cronometradas."""
+    originais = {
+        '_preprocessar_base': filtradores._preprocessar_base,
+        '_finalizar_base': filtradores._finalizar_base,
+    }
+    processadores = dict(filtradores.PROCESSADORES)
+    genericos = dict(filtradores.PROCESSADORES_GENERICOS)
+    contador = {'n': 0}
+
+    def processador_cronometrado(funcao):
+        def envolvida(*args, **kwargs):
+            contador['n'] += 1
+            with cronometro.etapa(f"config_{contador['n']}:{funcao.__name__}"):
+                return funcao(*args, **kwargs)
+        return envolvida
+
+    try:
+        for nome, funcao in originais.items():
+            setattr(filtradores, nome, cronometro.envolver(nome, funcao))
+        for chave, funcao in processadores.items():
+            filtradores.PROCESSADORES[chave] = processador_cronometrado(funcao)
+        for chave, funcao in genericos.items():
+            filtradores.PROCESSADORES_GENERICOS[chave] = processador_cronometrado(funcao)
+        yield
+    finally:
+        for nome, funcao in originais.items():
+            setattr(filtradores, nome, funcao)
+        filtradores.PROCESSADORES.update(processadores)
+        filtradores.PROCESSADORES_GENERICOS.update(genericos)
+
+
+def _versao_codigo() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=RAIZ, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'desconhecida'
+
+
+def executar(linhas: int, convenio: str, seed: int, arquivos: int, usar_tracemalloc: bool) -> dict:
+    """Roda o benchmark completo para uma base de `linhas` linhas e retorna o registro."""
+    cronometro = Cronometro(usar_tracemalloc)
+    params, configs = cenario(convenio)
+    with tempfile.TemporaryDirectory(prefix='bench_filtrador_') as diretorio:
+        caminhos = gravar_csvs(gerar_base(linhas, convenio, seed), os.path.join(diretorio, 'base'), arquivos)
+
+        if usar_tracemalloc:
+            tracemalloc.start()
+        inicio = time.perf_counter()
+        with usar_registrador(RegistradorEventos()):
+            with cronometro.etapa('carregar_arquivos_csv'):
+                df = ler_arquivos_csv(caminhos, cache=CacheParquet(limite_mb=0))
+            with _etapas_cronometradas(cronometro):
+                base_filtrada, stats = filtradores.aplicar_filtros(df, params, configs)
+            with cronometro.etapa('exportar_csv'):
+                exportar(base_filtrada, os.path.join(diretorio, 'campanha.csv'), 'csv')
+        total = time.perf_counter() - inicio
+        if usar_tracemalloc:
+            tracemalloc.stop()
+
+    return {
+        'data': datetime.datetime.now().isoformat(timespec='seconds'),
+        'versao': _versao_codigo(),
+        'linhas': linhas,
+        'convenio': convenio,
+        'seed': seed,
+        'arquivos': arquivos,
+        'linhas_saida': len(base_filtrada),
+        'total_segundos': round(total, 4),
+        'pico_rss_mb': _rss_mb(),
+        'etapas': cronometro.etapas,
+    }
+
+
+def _ler_historico(caminho: str) -> list:
+    try:
+        with open(caminho, encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return []
+
+
+def _imprimir(registro: dict, anterior: dict = None):
+    print(f"\n{registro['linhas']} linhas ({registro['convenio']}), versão {registro['versao']}: "
+          f"{registro['total_segundos']:.2f}s, pico RSS {registro['pico_rss_mb']} MB, {registro['linhas_saida']} linhas na saída")
+    tempos_anteriores = {e['etapa']: e['segundos'] for e in (anterior or {}).get('etapas', [])}
+    for etapa in registro['etapas']:
+        linha = f"  {etapa['etapa']:<45} {etapa['segundos']:9.3f}s"
+        if 'pico_alocado_mb' in etapa:
+            linha += f"  {etapa['pico_alocado_mb']:9.1f} MB"
+        if etapa['etapa'] in tempos_anteriores and tempos_anteriores[etapa['etapa']] > 0:
+            variacao = (etapa['segundos'] / tempos_anteriores[etapa['etapa']] - 1) * 100
+            linha += f"  ({variacao:+.0f}% vs {anterior['versao']})"
+        print(linha)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do filtrador por etapa.")
+    parser.add_argument('--linhas', type=int, nargs='+', default=[100_000],
+                        help="Tamanhos das bases (ex: 100000 1000000 5000000 10000000).")
+    parser.add_argument('--convenio', choices=['govsp', 'govmt'], default='govsp')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--arquivos', type=int, default=2, help="Em quantos CSVs cada base é dividida.")
+    parser.add_argument('--tracemalloc', action='store_true', help="Mede o pico de alocações de cada etapa (mais lento).")
+    parser.add_argument('--historico', default=HISTORICO_PADRAO, help="Arquivo JSON com o histórico de execuções.")
+    args = parser.parse_args()
+
+    historico = _ler_historico(args.historico)
+    for linhas in args.linhas:
+        registro = executar(linhas, args.convenio, args.seed, args.arquivos, args.tracemalloc)
+        anteriores = [r for r in historico if r['linhas'] == linhas and r['convenio'] == args.convenio]
+        _imprimir(registro, anteriores[-1] if anteriores else None)
+        historico.append(registro)
+        with open(args.historico, 'w', encoding='utf-8') as f:
+            json.dump(historico, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,152 @@
+"""
+Benchmark e verificação da fila de auditoria contra um PostgREST local (stub).
+
+Sobe um servidor HTTP que imita a API do PostgREST (POST /<tabela> com a lista
+de linhas em JSON, autenticação pelos cabeçalhos apikey/Authorization) e
+responde 503 às primeiras --falhas requisições. A fila (fila_auditoria) envia
+para ele com o EnvioPostgrest, o mesmo usado com `postgrest_url` nos secrets.
+
+Mede o tempo de cada salvamento (só a gravação no SQLite local, com o worker
+rodando) e o tempo até a fila esvaziar, e confere que todas as linhas chegaram
+ao servidor (ao menos uma vez) e que nada ficou pendente ou parado por falha.
+Sai com código 1 se alguma linha se perdeu.
+
+Uso (a partir da raiz do repositório):
+    python benchmarks/bench_fila_auditoria.py
+    python benchmarks/bench_fila_auditoria.py --salvamentos 2000 --configs 8 --falhas 5
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+import fila_auditoria  # noqa: E402
+from espelho_auditoria import TABELA_AUDITORIA  # noqa: E402
+from fila_auditoria import EnvioPostgrest, FilaAuditoria  # noqa: E402
+
+CHAVE_TESTE = 'chave-de-teste'
+
+
+class StubPostgrest:
+    """PostgREST de mentira: guarda as linhas recebidas por tabela; as primeiras `falhas` requisições recebem 503."""
+
+    def __init__(self, falhas: int = 0, chave: str = CHAVE_TESTE):
+        self.recebidas = {}
+        self.requisicoes = 0
+        self.recusadas = 0
+        self._falhas = falhas
+        self._trava = threading.Lock()
+        stub = self
+
+        class Manipulador(BaseHTTPRequestHandler):
+            def do_POST(self):
+                corpo = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                with stub._trava:
+                    stub.requisicoes += 1
+                    if self.headers.get('apikey') != chave or self.headers.get('Authorization') != f"Bearer {chave}":
+                        self.send_response(401)
+                    elif stub._falhas > 0:
+                        stub._falhas -= 1
+                        stub.recusadas += 1
+                        self.send_response(503)
+                    else:
+                        stub.recebidas.setdefault(self.path.lstrip('/'), []).extend(json.loads(corpo))
+                        self.send_response(201)
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self._servidor = ThreadingHTTPServer(('127.0.0.1', 0), Manipulador)
+        self._thread = threading.Thread(target=self._servidor.serve_forever, daemon=True)
+
+    @property
+    def url_rest(self) -> str:
+        return f"http://127.0.0.1:{self._servidor.server_port}"
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *excecao):
+        self._servidor.shutdown()
+        self._servidor.server_close()
+
+
+def _linha(salvamento: int, config: int) -> dict:
+    """Linha no formato de supabase_utils.montar_linhas_auditoria (com um id de conferência)."""
+    return {
+        'convenio': 'govsp', 'tipo_campanha_geral': 'Novo', 'equipe': 'outbound',
+        'banco': '243', 'produto': 'Novo', 'coeficiente': 30.0 + config, 'comissao': 5.0,
+        'parcelas': 96, 'params_gerais': {'salvamento': salvamento},
+        'conferencia': f"{salvamento}:{config}",
+    }
+
+
+def executar(salvamentos: int, configs: int, tamanho_lote: int, falhas: int, timeout: float) -> dict:
+    with StubPostgrest(falhas=falhas) as stub, tempfile.TemporaryDirectory() as diretorio:
+        fila = FilaAuditoria(EnvioPostgrest(stub.url_rest, CHAVE_TESTE, timeout=5.0),
+                             caminho=os.path.join(diretorio, 'fila.sqlite'),
+                             tamanho_lote=tamanho_lote, intervalo=0.05).iniciar()
+        tempos = []
+        inicio = time.perf_counter()
+        for s in range(salvamentos):
+            t = time.perf_counter()
+            fila.enfileirar(TABELA_AUDITORIA, [_linha(s, c) for c in range(configs)])
+            tempos.append(time.perf_counter() - t)
+        fim_salvamentos = time.perf_counter()
+
+        limite = time.monotonic() + timeout
+        while fila.situacao()['pendentes'] and time.monotonic() < limite:
+            time.sleep(0.02)
+        fim_envio = time.perf_counter()
+        fila.parar(5)
+        situacao = fila.situacao()
+
+        esperadas = {f"{s}:{c}" for s in range(salvamentos) for c in range(configs)}
+        recebidas = [linha['conferencia'] for linha in stub.recebidas.get(TABELA_AUDITORIA, [])]
+        return {
+            'linhas': len(esperadas),
+            'salvamento_ms_mediana': round(statistics.median(tempos) * 1000, 3),
+            'salvamento_ms_p95': round(sorted(tempos)[int(len(tempos) * 0.95) - 1] * 1000, 3) if tempos else 0.0,
+            'salvamentos_segundos': round(fim_salvamentos - inicio, 3),
+            'ate_esvaziar_segundos': round(fim_envio - inicio, 3),
+            'requisicoes': stub.requisicoes,
+            'recusadas': stub.recusadas,
+            'perdidas': len(esperadas - set(recebidas)),
+            'duplicadas': len(recebidas) - len(set(recebidas)),
+            'pendentes': situacao['pendentes'],
+            'falhas': situacao['falhas'],
+        }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark da fila de auditoria contra um PostgREST local.")
+    parser.add_argument('--salvamentos', type=int, default=500, help="Quantidade de salvamentos de configuração.")
+    parser.add_argument('--configs', type=int, default=5, help="Configurações de banco (linhas) por salvamento.")
+    parser.add_argument('--lote', type=int, default=fila_auditoria.TAMANHO_LOTE, help="Linhas por envio.")
+    parser.add_argument('--falhas', type=int, default=3, help="Primeiras requisições recusadas com 503.")
+    parser.add_argument('--espera-inicial', type=float, default=0.05,
+                        help="Espera antes da primeira nova tentativa (a da fila é ESPERA_INICIAL).")
+    parser.add_argument('--timeout', type=float, default=120.0, help="Tempo máximo para a fila esvaziar.")
+    args = parser.parse_args(argv)
+
+    fila_auditoria.ESPERA_INICIAL = args.espera_inicial
+    resultado = executar(args.salvamentos, args.configs, args.lote, args.falhas, args.timeout)
+    print(json.dumps(resultado, indent=2))
+    ok = resultado['perdidas'] == 0 and resultado['pendentes'] == 0 and resultado['falhas'] == 0
+    print("OK: todas as linhas chegaram ao PostgREST." if ok else "FALHA: linhas perdidas ou presas na fila.")
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
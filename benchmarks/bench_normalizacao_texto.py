@@ -0,0 +1,74 @@
+"""
+Benchmark da normalização de texto: `apply` linha a linha (implementação
+anterior do pré-processamento) contra normalizacao_texto.normalizar_serie.
+
+Uso (a partir da raiz do repositório):
+    python benchmarks/bench_normalizacao_texto.py --linhas 1000000
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from normalizacao_texto import normalizar_serie  # noqa: E402
+
+NOMES = ['MARIA', 'JOSÉ', 'ANA', 'JOÃO', 'ANTÔNIO', 'FRANCISCA', 'CARLOS', 'PAULO', 'LUCIA', 'MÁRCIO']
+SOBRENOMES = ['DA SILVA', 'DOS SANTOS', 'OLIVEIRA', 'SOUZA', 'PEREIRA', 'LIMA', 'CONCEIÇÃO', 'ARAÚJO']
+LOTACOES = ['SECRETARIA DA EDUCAÇÃO', 'SECRETARIA DA SAÚDE', 'POLÍCIA MILITAR', 'DETRAN', 'FAZENDA']
+
+
+def _gerar(linhas: int, seed: int):
+    rng = np.random.default_rng(seed)
+    nomes = (pd.Series(np.array(NOMES)[rng.integers(0, len(NOMES), linhas)]) + ' ' +
+             pd.Series(np.array(SOBRENOMES)[rng.integers(0, len(SOBRENOMES), linhas)]) + ' ' +
+             pd.Series(rng.integers(0, linhas, linhas).astype(str)))
+    lotacoes = pd.Series(np.array(LOTACOES)[rng.integers(0, len(LOTACOES), linhas)]).astype('category')
+    return nomes.astype('str'), lotacoes
+
+
+def _medir(funcao, repeticoes: int) -> float:
+    melhor = float('inf')
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        melhor = min(melhor, time.perf_counter() - inicio)
+    return melhor
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark da normalização de texto.")
+    parser.add_argument('--linhas', type=int, default=1_000_000)
+    parser.add_argument('--repeticoes', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    nomes, lotacoes = _gerar(args.linhas, args.seed)
+    titulo = {'titulo': True}
+    completo = {'titulo': True, 'sem_acentos': True, 'espacos': True}
+
+    casos = [
+        ("Nome_Cliente título (apply)",
+         lambda: nomes.apply(lambda x: x.title() if pd.notna(x) and isinstance(x, str) else x)),
+        ("Nome_Cliente título (vetorizado)", lambda: normalizar_serie(nomes, titulo)),
+        ("Nome_Cliente completo (vetorizado)", lambda: normalizar_serie(nomes, completo)),
+        ("Lotacao completo (apply)",
+         lambda: lotacoes.astype(str).apply(lambda x: ' '.join(x.split()).title())),
+        ("Lotacao completo (categorias)", lambda: normalizar_serie(lotacoes, completo)),
+    ]
+    print(f"{args.linhas} linhas, melhor de {args.repeticoes} repetições")
+    tempos = {}
+    for nome, funcao in casos:
+        tempos[nome] = _medir(funcao, args.repeticoes)
+        print(f"  {nome:<38} {tempos[nome]:8.3f}s")
+    ganho = tempos["Nome_Cliente título (apply)"] / max(tempos["Nome_Cliente título (vetorizado)"], 1e-9)
+    print(f"Ganho no título do nome: {ganho:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+"""
+Gerador de bases sintéticas de higienização (govsp/govmt) para benchmarks.
+
+As bases imitam as reais no que importa para o desempenho:
+- CPFs duplicados (um cliente com vários vínculos) e parte deles com pontuação;
+- Matrículas compartilhadas entre as linhas do mesmo cliente;
+- Lotacao/Vinculo_Servidor com distribuição concentrada (poucos valores dominam);
+- Data_Nascimento em formatos misturados e com valores inválidos;
+- margens MG_* com negativos, nulos e uso parcial de benefício/cartão.
+Tudo é gerado de forma vetorizada a partir de uma seed, então a mesma chamada
+produz sempre a mesma base.
+
+Uso:
+    python benchmarks/gerador_bases.py 1000000 /tmp/base_govsp --convenio govsp --arquivos 2
+"""
+
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+VINCULOS = ['EFETIVO', 'TEMPORARIO', 'COMISSIONADO', 'CELETISTA', 'APOSENTADO', 'PENSIONISTA',
+            'CONTRATADO', 'ESTAGIARIO', 'CEDIDO', 'EFETIVO ESTAVEL', 'EMPREGO PUBLICO', 'MILITAR']
+ORGAOS = ['SECRETARIA DE EDUCACAO', 'SECRETARIA DA SAÚDE', 'POLICIA MILITAR', 'POLÍCIA CIVIL', 'FAZENDA',
+          'DETRAN', 'HOSPITAL DAS CLÍNICAS', 'TRIBUNAL DE JUSTICA', 'ASSEMBLEIA LEGISLATIVA', 'UNIVERSIDADE ESTADUAL']
+NOMES = ['MARIA', 'JOSÉ', 'ANA', 'JOÃO', 'ANTÔNIO', 'FRANCISCA', 'CARLOS', 'PAULO', 'LÚCIA', 'MÁRCIO', 'PEDRO', 'JULIANA']
+SOBRENOMES = ['DA SILVA', 'DOS SANTOS', 'OLIVEIRA', 'SOUZA', 'PEREIRA', 'LIMA', 'CONCEIÇÃO', 'ARAÚJO', 'DE ÁVILA']
+
+
+def _zipf(rng, n_valores: int, n: int, expoente: float = 1.1) -> np.ndarray:
+    """Índices em [0, n_valores) com distribuição concentrada nos primeiros valores."""
+    pesos = 1.0 / np.arange(1, n_valores + 1) ** expoente
+    return rng.choice(n_valores, size=n, p=pesos / pesos.sum())
+
+
+def _margem(rng, n: int, media: float, desvio: float, fracao_nula: float = 0.05) -> np.ndarray:
+    valores = np.round(rng.normal(media, desvio, n), 2)
+    valores[rng.random(n) < fracao_nula] = np.nan
+    return valores
+
+
+def _datas_nascimento(rng, n: int) -> pd.Series:
+    """Datas dd/mm/aaaa com ~5% em ISO, ~5% sem zero à esquerda e ~1% inválidas."""
+    dias = rng.integers(0, 365 * 55, n)
+    datas = pd.Timestamp('1945-01-01') + pd.to_timedelta(dias, unit='D')
+    codigos, unicas = pd.factorize(datas)
+    unicas = pd.DatetimeIndex(unicas)
+    padrao = unicas.strftime('%d/%m/%Y').to_numpy(dtype=object)
+    iso = unicas.strftime('%Y-%m-%d').to_numpy(dtype=object)
+    curto = (unicas.day.astype(str) + '/' + unicas.month.astype(str) + '/' + unicas.year.astype(str)).to_numpy(dtype=object)
+
+    sorteio = rng.random(n)
+    textos = padrao[codigos]
+    textos[sorteio < 0.05] = iso[codigos][sorteio < 0.05]
+    faixa_curta = (sorteio >= 0.05) & (sorteio < 0.10)
+    textos[faixa_curta] = curto[codigos][faixa_curta]
+    textos[sorteio > 0.99] = 'DATA INVALIDA'
+    return pd.Series(textos, dtype='str')
+
+
+def gerar_base(n: int, convenio: str = 'govsp', seed: int = 42) -> pd.DataFrame:
+    """Base sintética com `n` linhas no layout dos arquivos de higienização."""
+    rng = np.random.default_rng(seed)
+    n_clientes = max(1, int(n * 0.75))
+
+    # Clientes com mais de uma linha (vínculos) repetem CPF e Matrícula
+    cliente = rng.integers(0, n_clientes, n)
+    cpfs_clientes = rng.integers(10 ** 9, 10 ** 11, n_clientes)
+    cpf = pd.Series(cpfs_clientes[cliente]).astype(str).str.zfill(11)
+    pontuado = rng.random(n) < 0.3
+    cpf_pontuado = cpf.str[:3] + '.' + cpf.str[3:6] + '.' + cpf.str[6:9] + '-' + cpf.str[9:]
+    cpf = cpf.where(~pontuado, cpf_pontuado)
+
+    matricula = pd.Series(100000 + cliente).astype(str)
+    segunda = rng.random(n) < 0.1
+    matricula = matricula.where(~segunda, matricula + '-2')
+
+    lotacoes = np.array([f"{ORGAOS[i % len(ORGAOS)]} - UNIDADE {i:04d}" for i in range(3000)], dtype=object)
+    lotacao = lotacoes[_zipf(rng, len(lotacoes), n)]
+    secretaria = np.array(ORGAOS, dtype=object)[_zipf(rng, len(ORGAOS), n, 0.8)]
+    vinculo = np.array(VINCULOS, dtype=object)[_zipf(rng, len(VINCULOS), n, 1.5)]
+
+    nomes = np.array([f"{a} {b}" for a in NOMES for b in SOBRENOMES], dtype=object)
+    nome = nomes[rng.integers(0, len(nomes), n)]
+
+    total_beneficio = np.round(np.abs(rng.normal(500, 200, n)), 2)
+    total_cartao = np.round(np.abs(rng.normal(500, 200, n)), 2)
+    disponivel_beneficio = np.where(rng.random(n) < 0.3, total_beneficio - rng.uniform(10, 200, n).round(2), total_beneficio)
+    disponivel_cartao = np.where(rng.random(n) < 0.3, total_cartao - rng.uniform(10, 200, n).round(2), total_cartao)
+
+    return pd.DataFrame({
+        'Origem_Dado': 'higienizacao',
+        'Nome_Cliente': nome,
+        'Matricula': matricula,
+        'CPF': cpf,
+        'Data_Nascimento': _datas_nascimento(rng, n),
+        'MG_Emprestimo_Total': _margem(rng, n, 600, 400),
+        'MG_Emprestimo_Disponivel': _margem(rng, n, 300, 400),
+        'MG_Beneficio_Saque_Total': total_beneficio,
+        'MG_Beneficio_Saque_Disponivel': disponivel_beneficio,
+        'MG_Cartao_Total': total_cartao,
+        'MG_Cartao_Disponivel': disponivel_cartao,
+        'Convenio': convenio,
+        'Vinculo_Servidor': vinculo,
+        'Lotacao': lotacao,
+        'Secretaria': secretaria,
+        'FONE1': pd.Series(rng.integers(10 ** 10, 10 ** 11, n)).astype(str),
+    })
+
+
+def gravar_csvs(df: pd.DataFrame, prefixo: str, arquivos: int = 2) -> list:
+    """Divide a base em `arquivos` CSVs (como vários uploads) e retorna os caminhos."""
+    caminhos = []
+    for i, parte in enumerate(np.array_split(np.arange(len(df)), max(1, arquivos))):
+        caminho = f"{prefixo}_{i + 1}.csv"
+        df.iloc[parte].to_csv(caminho, index=False)
+        caminhos.append(caminho)
+    return caminhos
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gera bases sintéticas de higienização.")
+    parser.add_argument('linhas', type=int)
+    parser.add_argument('prefixo', help="Prefixo dos CSVs gerados (ex: /tmp/base -> /tmp/base_1.csv).")
+    parser.add_argument('--convenio', choices=['govsp', 'govmt'], default='govsp')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--arquivos', type=int, default=2)
+    args = parser.parse_args()
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.prefixo)), exist_ok=True)
+    caminhos = gravar_csvs(gerar_base(args.linhas, args.convenio, args.seed), args.prefixo, args.arquivos)
+    print('\n'.join(caminhos))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+"""
+Busca de várias palavras-chave em textos ("contém alguma das palavras").
+
+Com poucas palavras, a regex em alternância (`a|b|c`) dos métodos `.str` é a
+opção mais rápida. Listas grandes (dezenas a centenas de palavras coladas na
+interface) passam por um autômato de Aho-Corasick: montado uma vez por lista
+(e guardado em cache), percorre cada texto uma única vez, com custo que não
+cresce com o número de palavras. A busca nunca diferencia maiúsculas e, se
+pedido, também ignora acentos.
+"""
+
+import re
+from collections import deque
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from normalizacao_texto import remover_acentos, remover_acentos_texto
+
+# A partir deste número de palavras a busca usa o autômato em vez da regex
+LIMITE_PALAVRAS_REGEX = 12
+
+
+class AutomatoPalavras:
+    """Autômato de Aho-Corasick sobre palavras já normalizadas (minúsculas, acentos conforme o modo)."""
+
+    def __init__(self, palavras):
+        self.transicoes = [{}]
+        self.falhas = [0]
+        self.terminais = [False]
+        for palavra in palavras:
+            self._inserir(palavra)
+        self._ligar_falhas()
+
+    def _inserir(self, palavra: str):
+        estado = 0
+        for caractere in palavra:
+            proximo = self.transicoes[estado].get(caractere)
+            if proximo is None:
+                proximo = len(self.transicoes)
+                self.transicoes.append({})
+                self.falhas.append(0)
+                self.terminais.append(False)
+                self.transicoes[estado][caractere] = proximo
+            estado = proximo
+        self.terminais[estado] = True
+
+    def _ligar_falhas(self):
+        fila = deque(self.transicoes[0].values())
+        while fila:
+            estado = fila.popleft()
+            for caractere, proximo in self.transicoes[estado].items():
+                fila.append(proximo)
+                falha = self.falhas[estado]
+                while falha and caractere not in self.transicoes[falha]:
+                    falha = self.falhas[falha]
+                destino = self.transicoes[falha].get(caractere, 0)
+                self.falhas[proximo] = destino if destino != proximo else 0
+                # Um sufixo terminal também conta como ocorrência
+                self.terminais[proximo] = self.terminais[proximo] or self.terminais[self.falhas[proximo]]
+
+    def contem(self, texto: str) -> bool:
+        """True se alguma palavra ocorre em `texto`."""
+        transicoes, falhas, terminais = self.transicoes, self.falhas, self.terminais
+        estado = 0
+        for caractere in texto:
+            while estado and caractere not in transicoes[estado]:
+                estado = falhas[estado]
+            estado = transicoes[estado].get(caractere, 0)
+            if terminais[estado]:
+                return True
+        return False
+
+
+def _normalizar_palavra(palavra: str, ignorar_acentos: bool) -> str:
+    palavra = palavra.lower()
+    return remover_acentos_texto(palavra) if ignorar_acentos else palavra
+
+
+@lru_cache(maxsize=64)
+def _automato(palavras: tuple) -> AutomatoPalavras:
+    return AutomatoPalavras(palavras)
+
+
+@lru_cache(maxsize=64)
+def _regex(palavras: tuple):
+    return re.compile('|'.join(re.escape(p) for p in palavras), flags=re.IGNORECASE)
+
+
+def mascara_contem_palavras(textos: pd.Series, palavras, ignorar_acentos: bool = False) -> np.ndarray:
+    """
+    Máscara das posições de `textos` que contêm alguma das `palavras`, sem
+    diferenciar maiúsculas (e acentos, se `ignorar_acentos`). Nulos nunca atendem.
+    Pensada para os valores distintos de uma coluna (ver valores_unicos).
+    """
+    chave = tuple(sorted({_normalizar_palavra(str(p), ignorar_acentos) for p in palavras if str(p)}))
+    if not chave or textos.empty:
+        return np.zeros(len(textos), dtype=bool)
+    if ignorar_acentos:
+        textos = remover_acentos(textos.astype('str'))
+
+    if len(chave) <= LIMITE_PALAVRAS_REGEX:
+        mascara = textos.str.contains(_regex(chave), na=False, regex=True)
+        return mascara.to_numpy(dtype=bool, na_value=False)
+
+    automato = _automato(chave)
+    minusculos = textos.astype('str').str.lower()
+    return np.fromiter(
+        (isinstance(t, str) and automato.contem(t) for t in minusculos),
+        dtype=bool, count=len(minusculos)
+    )
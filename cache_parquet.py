@@ -0,0 +1,116 @@
+"""
+Cache local em Parquet dos arquivos CSV já lidos.
+
+Cada arquivo é identificado pelo hash do seu conteúdo (mais a versão do esquema
+de colunas), então reenviar o mesmo arquivo - em outra sessão, com outro nome -
+carrega o DataFrame já tipado direto do disco. O diretório tem tamanho limitado
+(LIMITE_CACHE_UPLOADS_MB) e os arquivos menos usados recentemente são removidos.
+"""
+
+import hashlib
+import os
+import tempfile
+
+import pandas as pd
+
+from dados_constantes import (
+    DIRETORIO_CACHE_UPLOADS, LIMITE_CACHE_UPLOADS_MB, ESQUEMA_COLUNAS, PREFIXO_COLUNAS_MARGEM
+)
+
+try:
+    import pyarrow  # noqa: F401 - necessário para ler/gravar Parquet
+    CACHE_DISPONIVEL = True
+except ImportError:
+    CACHE_DISPONIVEL = False
+
+TAMANHO_BLOCO_HASH = 8 * 1024 * 1024
+
+# Muda sempre que o esquema muda, invalidando entradas gravadas com tipos antigos
+_VERSAO_ESQUEMA = hashlib.blake2b(
+    repr((sorted(ESQUEMA_COLUNAS.items()), PREFIXO_COLUNAS_MARGEM, 2)).encode(), digest_size=4
+).hexdigest()
+
+
+def hash_conteudo(arquivo) -> str:
+    """Hash (blake2b) do conteúdo de um caminho ou objeto de arquivo."""
+    h = hashlib.blake2b(digest_size=20)
+    if isinstance(arquivo, (str, os.PathLike)):
+        with open(arquivo, 'rb') as f:
+            for bloco in iter(lambda: f.read(TAMANHO_BLOCO_HASH), b''):
+                h.update(bloco)
+    elif hasattr(arquivo, 'getbuffer'):
+        # UploadedFile / BytesIO: lê o buffer sem copiar
+        h.update(arquivo.getbuffer())
+    else:
+        arquivo.seek(0)
+        for bloco in iter(lambda: arquivo.read(TAMANHO_BLOCO_HASH), b''):
+            h.update(bloco)
+        arquivo.seek(0)
+    return h.hexdigest()
+
+
+class CacheParquet:
+    """Diretório de arquivos Parquet endereçados por conteúdo, com despejo LRU por tamanho."""
+
+    def __init__(self, diretorio: str = DIRETORIO_CACHE_UPLOADS, limite_mb: float = LIMITE_CACHE_UPLOADS_MB):
+        self.diretorio = diretorio
+        self.limite_bytes = int(limite_mb * 1024 * 1024)
+        self.ativo = CACHE_DISPONIVEL and self.limite_bytes > 0
+
+    def _caminho(self, chave: str) -> str:
+        return os.path.join(self.diretorio, f"{chave}_{_VERSAO_ESQUEMA}.parquet")
+
+    def ler(self, chave: str):
+        """DataFrame guardado para `chave`, ou None se não estiver no cache."""
+        if not self.ativo:
+            return None
+        caminho = self._caminho(chave)
+        try:
+            df = pd.read_parquet(caminho)
+        except (FileNotFoundError, OSError):
+            return None
+        except Exception:
+            # Arquivo corrompido (ex: gravação interrompida): descarta
+            self._remover(caminho)
+            return None
+        try:
+            os.utime(caminho)  # marca como usado recentemente (LRU)
+        except OSError:
+            pass
+        return df
+
+    def gravar(self, chave: str, df: pd.DataFrame):
+        """Grava `df` no cache (escrita atômica) e aplica o limite de tamanho."""
+        if not self.ativo:
+            return
+        os.makedirs(self.diretorio, exist_ok=True)
+        descritor, temporario = tempfile.mkstemp(dir=self.diretorio, suffix='.tmp')
+        os.close(descritor)
+        try:
+            df.to_parquet(temporario, index=False)
+            os.replace(temporario, self._caminho(chave))
+        except Exception:
+            self._remover(temporario)
+            raise
+        self.despejar()
+
+    def despejar(self):
+        """Remove os arquivos usados há mais tempo até o cache caber no limite."""
+        try:
+            entradas = [e for e in os.scandir(self.diretorio) if e.name.endswith('.parquet')]
+        except FileNotFoundError:
+            return
+        entradas = [(e.stat().st_mtime, e.stat().st_size, e.path) for e in entradas]
+        total = sum(tamanho for _, tamanho, _ in entradas)
+        for _, tamanho, caminho in sorted(entradas):
+            if total <= self.limite_bytes:
+                break
+            self._remover(caminho)
+            total -= tamanho
+
+    @staticmethod
+    def _remover(caminho: str):
+        try:
+            os.remove(caminho)
+        except OSError:
+            pass
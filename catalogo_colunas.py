@@ -0,0 +1,59 @@
+"""
+Catálogo das colunas de uma base carregada.
+
+Os filtros de exclusão da barra lateral listam os valores distintos de Lotacao e
+Vinculo_Servidor. O catálogo calcula uma vez, ao carregar a base, os valores
+distintos com a quantidade de linhas de cada um (pelos códigos de
+valores_unicos, sem ordenar a base) e a lista de colunas. Ele é identificado
+pela impressão digital da base (memo_etapas.impressao_base), então os reruns
+do Streamlit só leem o catálogo. Com as contagens, a interface mostra quantas
+linhas cada exclusão remove sem rodar o motor.
+"""
+
+import numpy as np
+import pandas as pd
+
+from filtradores import mascara_exclusao
+from memo_etapas import impressao_base
+from valores_unicos import codificar_valores
+
+# Colunas com seleção exata de valores na barra lateral
+COLUNAS_CATALOGO = ('Lotacao', 'Vinculo_Servidor')
+
+
+class CatalogoColunas:
+    """Colunas de uma base e, para COLUNAS_CATALOGO, os valores distintos com as contagens de linhas."""
+
+    def __init__(self, df: pd.DataFrame, colunas=COLUNAS_CATALOGO):
+        self.impressao = impressao_base(df)
+        self.colunas = df.columns.tolist()
+        self.total_linhas = len(df)
+        # {coluna: Series valor -> linhas}, em ordem de valor (nulos fora)
+        self.contagens = {}
+        for coluna in colunas:
+            if coluna not in df.columns:
+                continue
+            codigos, unicos = codificar_valores(df[coluna])
+            linhas = np.bincount(codigos[codigos >= 0], minlength=len(unicos))
+            contagem = pd.Series(linhas, index=unicos.to_numpy(), dtype='int64')
+            self.contagens[coluna] = contagem[contagem > 0].sort_index()
+
+    def opcoes(self, coluna: str) -> list:
+        """Valores distintos de `coluna` em ordem (vazio se a coluna não está no catálogo)."""
+        return self.contagens[coluna].index.tolist() if coluna in self.contagens else []
+
+    def linhas(self, coluna: str, valor) -> int:
+        return int(self.contagens[coluna].get(valor, 0)) if coluna in self.contagens else 0
+
+    def rotulo(self, coluna: str, valor) -> str:
+        """Valor com a quantidade de linhas, para as opções dos multiselects."""
+        return f"{valor} ({self.linhas(coluna, valor):,})".replace(',', '.')
+
+    def linhas_excluidas(self, coluna: str, valores_exatos: list, palavras: list, ignorar_acentos: bool = False) -> int:
+        """Linhas que o filtro de exclusão de `coluna` remove (mesma regra do pré-processamento)."""
+        if coluna not in self.contagens:
+            return 0
+        contagem = self.contagens[coluna]
+        valores = pd.Series(contagem.index, dtype=object)
+        excluir = mascara_exclusao(valores, valores_exatos, palavras, ignorar_acentos)
+        return int(contagem.to_numpy()[excluir].sum())
@@ -0,0 +1,76 @@
+"""
+Chaves inteiras de CPF.
+
+O CPF é limpo uma única vez (pontuação e espaços) e cada cliente recebe uma chave
+int64 densa (0..n_chaves-1; CHAVE_AUSENTE para CPF vazio). Deduplicação,
+estatísticas e qualquer lógica de "conjunto de CPFs" trabalham sobre essas
+chaves com arrays do NumPy, sem sets de strings e sem ordenar a base.
+"""
+
+import numpy as np
+import pandas as pd
+
+CHAVE_AUSENTE = -1
+COLUNA_CHAVE_CPF = '_cpf_chave'
+
+
+def limpar_cpfs(serie: pd.Series) -> pd.Series:
+    """Remove '.', '-' e espaços; vazios viram nulos. O CPF continua como texto no arquivo."""
+    limpos = serie.astype(str).str.replace(r"[.\-]", "", regex=True).str.strip()
+    return limpos.where(~limpos.isin(['', 'nan', 'None', '<NA>']))
+
+
+def codificar_cpfs(cpfs_limpos: pd.Series) -> np.ndarray:
+    """
+    Chave int64 densa por cliente. CPFs só com dígitos são comparados como número
+    (zeros à esquerda não diferenciam clientes); valores não numéricos recebem
+    chaves próprias pelo texto.
+    """
+    n = len(cpfs_limpos)
+    chaves = np.full(n, CHAVE_AUSENTE, dtype=np.int64)
+    if n == 0:
+        return chaves
+
+    presentes = cpfs_limpos.notna().to_numpy()
+    numericos = cpfs_limpos.str.fullmatch(r"\d{1,18}").to_numpy(dtype=bool, na_value=False)
+    if numericos.any():
+        codigos, unicos = pd.factorize(cpfs_limpos[numericos].astype('int64').to_numpy())
+        chaves[numericos] = codigos
+        proxima = len(unicos)
+    else:
+        proxima = 0
+
+    textuais = presentes & ~numericos
+    if textuais.any():
+        codigos, _ = pd.factorize(cpfs_limpos[textuais].to_numpy(dtype=object))
+        chaves[textuais] = codigos + proxima
+    return chaves
+
+
+def total_chaves(chaves: np.ndarray) -> int:
+    """Tamanho necessário para um array indexado pelas chaves."""
+    return int(chaves.max()) + 1 if len(chaves) else 0
+
+
+def marcar_chaves(chaves: np.ndarray, mascara: np.ndarray, n_chaves: int) -> np.ndarray:
+    """Array booleano por chave: True para os clientes com alguma linha em `mascara`."""
+    marcadas = np.zeros(n_chaves, dtype=bool)
+    selecionadas = chaves[mascara]
+    marcadas[selecionadas[selecionadas != CHAVE_AUSENTE]] = True
+    return marcadas
+
+
+def posicoes_maior_valor_por_chave(chaves: np.ndarray, valores: np.ndarray) -> np.ndarray:
+    """
+    Máscara das linhas que ficam na deduplicação: para cada chave, a primeira linha
+    com o maior `valores`. Agrupamento por hash (sem ordenar a base); linhas sem
+    chave são descartadas.
+    """
+    manter = np.zeros(len(chaves), dtype=bool)
+    validas = np.flatnonzero(chaves != CHAVE_AUSENTE)
+    if len(validas) == 0:
+        return manter
+    valores_validos = pd.Series(np.asarray(valores, dtype='float64')[validas]).fillna(-np.inf)
+    posicoes = valores_validos.groupby(chaves[validas], sort=False).idxmax().to_numpy()
+    manter[validas[posicoes]] = True
+    return manter
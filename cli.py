@@ -0,0 +1,177 @@
+"""
+Geração de campanhas pela linha de comando, sem Streamlit.
+
+Exemplo:
+    python cli.py base1.csv base2.csv --params params.json --configs configs.json --saida campanha.csv
+    python cli.py base1.csv base2.csv --lote lote.json --saida campanhas/
+
+- params.json: o dicionário retornado por `exibir_sidebar` (datas em ISO, ex: "1952-10-16").
+- configs.json: a lista retornada por `exibir_configuracoes_banco`.
+- lote.json: lista de campanhas geradas da mesma base, cada uma um objeto com
+  "params" e "configs" (o conteúdo ou o caminho de um JSON) e, opcionalmente,
+  "saida". No modo lote, --saida é o diretório dos arquivos gerados.
+As estatísticas por configuração são impressas em JSON na saída padrão; avisos e
+erros vão para a saída de erro (use -v para ver também os logs detalhados).
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+
+from juntar_arquivos import ler_arquivos_csv
+from filtradores import aplicar_filtros
+from lote_campanhas import aplicar_filtros_lote
+from registro_eventos import RegistradorLogging, usar_registrador
+from dados_constantes import META_PICO_MEMORIA_RELATIVA
+from exportacao import FORMATOS_EXPORTACAO, exportar, nome_arquivo_exportacao
+from instrumentacao import Instrumentacao, pico_rss_mb, reiniciar_pico_rss, rss_atual_mb
+
+
+def _ler_json(caminho: str):
+    with open(caminho, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _criar_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Filtrador de Campanhas v4 (modo linha de comando).")
+    parser.add_argument('arquivos', nargs='+', help="Arquivos CSV de higienização.")
+    parser.add_argument('--params', help="JSON com os parâmetros gerais (sidebar).")
+    parser.add_argument('--configs', help="JSON com a lista de configurações de banco.")
+    parser.add_argument('--lote', help="JSON com uma lista de campanhas (params + configs) geradas da mesma base.")
+    parser.add_argument('--paralelas', type=int, help="Máximo de campanhas do lote processadas ao mesmo tempo.")
+    parser.add_argument('--saida', help="Arquivo de saída. Padrão: <Campanha>.<extensão do formato> no diretório atual.")
+    parser.add_argument('--formato', choices=list(FORMATOS_EXPORTACAO), default='csv',
+                        help="Formato do arquivo de saída (padrão: csv).")
+    parser.add_argument('--medir-memoria', action='store_true',
+                        help="Mede o pico de memória da filtragem e compara com a meta (META_PICO_MEMORIA_RELATIVA).")
+    parser.add_argument('--log-json', help="Grava o log estruturado da execução (etapas e eventos) neste arquivo JSON.")
+    parser.add_argument('-v', '--verbose', action='store_true', help="Exibe os logs detalhados de cada etapa.")
+    return parser
+
+
+def _ler_campanhas(caminho: str) -> list:
+    """Especificações do lote; "params"/"configs" podem ser o conteúdo ou o caminho de um JSON."""
+    campanhas = _ler_json(caminho)
+    for campanha in campanhas:
+        for chave in ('params', 'configs'):
+            if isinstance(campanha.get(chave), str):
+                campanha[chave] = _ler_json(campanha[chave])
+    return campanhas
+
+
+def _nome_campanha(base_filtrada) -> str:
+    return base_filtrada['Campanha'].iloc[0] if 'Campanha' in base_filtrada.columns else 'campanha_filtrada'
+
+
+def _executar_lote(args, registrador: RegistradorLogging) -> int:
+    """Modo --lote: uma leitura e um pré-processamento para todas as campanhas do arquivo."""
+    campanhas = _ler_campanhas(args.lote)
+    with usar_registrador(registrador):
+        df = ler_arquivos_csv(args.arquivos)
+        if df.empty:
+            return 1
+        resultados = aplicar_filtros_lote(
+            df, [(c['params'], c['configs']) for c in campanhas], max_paralelas=args.paralelas
+        )
+
+    diretorio = args.saida or '.'
+    os.makedirs(diretorio, exist_ok=True)
+    saidas_usadas = set()
+    resumo = []
+    for numero, (campanha, resultado) in enumerate(zip(campanhas, resultados), start=1):
+        # Eventos de cada campanha, na ordem, identificados pelo número da campanha
+        for evento in resultado['eventos']:
+            registrador.emitir(evento['nivel'], f"[Campanha {numero}] {evento['mensagem']}",
+                               grupo=evento['grupo'], detalhe=evento['detalhe'])
+        base_filtrada = resultado['base']
+        item = {'campanha': numero, 'arquivo': None, 'registros': len(base_filtrada),
+                'segundos': resultado['instrumentacao'].total_segundos, 'estatisticas': resultado['stats']}
+        if not base_filtrada.empty:
+            nome = _nome_campanha(base_filtrada)
+            saida = campanha.get('saida') or os.path.join(diretorio, nome_arquivo_exportacao(nome, args.formato))
+            raiz, extensao = os.path.splitext(saida)
+            sufixo = 2
+            while saida in saidas_usadas:
+                # Campanhas com o mesmo nome (ex: mesma equipe e data) não se sobrescrevem
+                saida = f"{raiz}_{sufixo}{extensao}"
+                sufixo += 1
+            saidas_usadas.add(saida)
+            exportar(base_filtrada, saida, args.formato, nome_interno=f"{nome}.csv")
+            registrador.info(f"[Campanha {numero}] {len(base_filtrada)} registros gravados em {saida}.")
+            item['arquivo'] = saida
+        else:
+            registrador.aviso(f"[Campanha {numero}] Nenhum registro correspondeu aos filtros. Nenhum arquivo gerado.")
+        resumo.append(item)
+
+    if args.log_json:
+        with open(args.log_json, 'w', encoding='utf-8') as f:
+            json.dump([
+                json.loads(r['instrumentacao'].para_json(eventos=r['eventos'], campanha=n, estatisticas=r['stats']))
+                for n, r in enumerate(resultados, start=1)
+            ], f, ensure_ascii=False, indent=2, default=str)
+
+    print(json.dumps(resumo, ensure_ascii=False, indent=2, default=str))
+    return 0 if any(item['arquivo'] for item in resumo) else 1
+
+
+def main(argv=None) -> int:
+    parser = _criar_parser()
+    args = parser.parse_args(argv)
+    if not args.lote and not (args.params and args.configs):
+        parser.error("informe --params e --configs, ou --lote.")
+    logging.basicConfig(
+        level=logging.DEBUG if args.verbose else logging.INFO,
+        format='%(asctime)s %(levelname)s %(message)s',
+        stream=sys.stderr,
+    )
+    registrador = RegistradorLogging()
+    if args.lote:
+        return _executar_lote(args, registrador)
+
+    params = _ler_json(args.params)
+    configs_banco = _ler_json(args.configs)
+
+    with usar_registrador(registrador):
+        df = ler_arquivos_csv(args.arquivos)
+        if df.empty:
+            return 1
+        # Memória antes da filtragem, com o pico zerado (o da leitura dos CSVs não conta)
+        rss_antes = rss_atual_mb() if args.medir_memoria and reiniciar_pico_rss() else None
+        if args.medir_memoria and rss_antes is None:
+            registrador.aviso("Medição de memória indisponível nesta plataforma (requer /proc/self/clear_refs).")
+        instrumentacao = Instrumentacao()
+        base_filtrada, stats = aplicar_filtros(df, params, configs_banco, instrumentacao=instrumentacao)
+
+    if args.log_json:
+        with open(args.log_json, 'w', encoding='utf-8') as f:
+            f.write(instrumentacao.para_json(eventos=registrador.eventos, estatisticas=stats))
+
+    if rss_antes is not None:
+        tamanho_base = df.memory_usage(deep=True).sum() / 1024 / 1024
+        # Cada etapa zera o pico ao começar: o da filtragem é o maior entre as etapas e o atual
+        picos = [m['pico_rss_mb'] for m in instrumentacao.etapas if m.get('pico_rss_mb') is not None]
+        pico_extra = max(0.0, max([pico_rss_mb()] + picos) - rss_antes)
+        relativo = pico_extra / tamanho_base if tamanho_base else 0.0
+        mensagem = (f"Memória: base de entrada {tamanho_base:.0f} MB, pico extra da filtragem "
+                    f"{pico_extra:.0f} MB ({relativo:.1f}x; meta {META_PICO_MEMORIA_RELATIVA:.1f}x).")
+        if relativo > META_PICO_MEMORIA_RELATIVA:
+            registrador.aviso(mensagem + " Acima da meta.")
+        else:
+            registrador.info(mensagem)
+
+    print(json.dumps(stats, ensure_ascii=False, indent=2, default=str))
+    if base_filtrada.empty:
+        registrador.aviso("Nenhum registro correspondeu aos filtros aplicados. Nenhum arquivo gerado.")
+        return 1
+
+    nome = _nome_campanha(base_filtrada)
+    saida = args.saida or nome_arquivo_exportacao(nome, args.formato)
+    exportar(base_filtrada, saida, args.formato, nome_interno=f"{nome}.csv")
+    registrador.info(f"{len(base_filtrada)} registros gravados em {saida}.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
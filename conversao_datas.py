@@ -0,0 +1,119 @@
+"""
+Conversão das colunas de data das bases de higienização.
+
+As datas chegam no padrão brasileiro (dd/mm/aaaa, às vezes com variações). A
+base guarda o texto original (é ele que vai para o arquivo final); os filtros
+(idade, condições de data) convertem para datetime64 quando precisam.
+
+Datas de nascimento se repetem muito (dezenas de milhares de valores distintos
+em milhões de linhas), então a conversão trabalha só nos valores únicos: o
+formato é detectado uma vez, cada texto é convertido uma única vez (memória
+compartilhada pelo processo) e o resultado volta às linhas pelos códigos do
+`pd.factorize`.
+"""
+
+import threading
+
+import numpy as np
+import pandas as pd
+
+# Formatos tentados na detecção, do mais comum nas bases para o menos comum
+FORMATOS_CANDIDATOS = ['%d/%m/%Y', '%Y-%m-%d', '%d-%m-%Y', '%d/%m/%y', '%d/%m/%Y %H:%M:%S', '%Y-%m-%d %H:%M:%S']
+TAMANHO_AMOSTRA_FORMATO = 1000
+DATA_NULA = np.datetime64('NaT', 'us')
+LIMITE_MEMORIA_DATAS = 1_000_000  # textos guardados antes de a memória ser esvaziada
+
+
+class ConversorDatas:
+    """Converte textos de data para datetime64 lembrando o formato detectado e cada valor já visto."""
+
+    def __init__(self, limite: int = LIMITE_MEMORIA_DATAS):
+        self.limite = limite
+        self.formato = None
+        self._memoria = {}
+        self._trava = threading.Lock()
+
+    def _taxa_acerto(self, amostra: pd.Series, formato: str) -> float:
+        return pd.to_datetime(amostra, format=formato, errors='coerce').notna().mean()
+
+    def _detectar_formato(self, textos: pd.Series):
+        """Formato que converte a maior parte de uma amostra dos textos (None se nenhum serve)."""
+        amostra = textos.iloc[:TAMANHO_AMOSTRA_FORMATO]
+        if self.formato is not None and self._taxa_acerto(amostra, self.formato) >= 0.5:
+            return self.formato
+        taxas = {formato: self._taxa_acerto(amostra, formato) for formato in FORMATOS_CANDIDATOS}
+        melhor = max(taxas, key=taxas.get)
+        return melhor if taxas[melhor] > 0 else None
+
+    def _converter_novos(self, textos: pd.Series) -> np.ndarray:
+        """
+        Converte textos ainda não vistos: formato detectado primeiro, depois os
+        demais candidatos e, por fim, inferência (dia primeiro) no que sobrar.
+        """
+        datas = pd.Series(DATA_NULA, index=textos.index, dtype='datetime64[us]')
+        formato = self._detectar_formato(textos)
+        if formato is not None:
+            self.formato = formato
+        for candidato in [f for f in [formato] + FORMATOS_CANDIDATOS if f is not None]:
+            falhas = datas.isna()
+            if not falhas.any():
+                break
+            datas[falhas] = pd.to_datetime(textos[falhas], format=candidato, errors='coerce')
+        falhas = datas.isna()
+        if falhas.any():
+            datas[falhas] = pd.to_datetime(textos[falhas], dayfirst=True, errors='coerce')
+        return datas.to_numpy(dtype='datetime64[us]')
+
+    def converter(self, serie: pd.Series) -> pd.Series:
+        """Converte uma coluna de datas (dia primeiro) para datetime64. Valores inválidos viram NaT."""
+        if pd.api.types.is_datetime64_any_dtype(serie):
+            return serie
+        codigos, unicos = pd.factorize(serie)
+        textos = pd.Series(unicos, dtype=object).astype(str).str.strip()
+
+        convertidos = np.full(len(textos), DATA_NULA)
+        novos = np.zeros(len(textos), dtype=bool)
+        with self._trava:
+            memoria = self._memoria
+            for i, texto in enumerate(textos):
+                data = memoria.get(texto)
+                if data is None:
+                    novos[i] = True
+                else:
+                    convertidos[i] = data
+
+        if novos.any():
+            convertidos[novos] = self._converter_novos(textos[novos].reset_index(drop=True))
+            with self._trava:
+                if len(self._memoria) + int(novos.sum()) > self.limite:
+                    self._memoria = {}
+                self._memoria.update(zip(textos[novos], convertidos[novos]))
+
+        # Código -1 (nulo) aponta para o NaT acrescentado no fim
+        valores = np.append(convertidos, DATA_NULA)
+        return pd.Series(valores[codigos], index=serie.index, name=serie.name)
+
+
+_conversor = ConversorDatas()
+
+
+def converter_datas(serie: pd.Series) -> pd.Series:
+    """Converte uma coluna de datas (dia primeiro) para datetime64. Valores inválidos viram NaT."""
+    return _conversor.converter(serie)
+
+
+def converter_data(valor):
+    """
+    Converte um único texto de data com as mesmas regras das colunas (formatos
+    candidatos, dia primeiro). Retorna um Timestamp, ou None se o texto não é data.
+
+    >>> converter_data('01/02/1970')
+    Timestamp('1970-02-01 00:00:00')
+    >>> datas = converter_datas(pd.Series(['15/01/1970', '20/01/1970', '10/03/1970']))
+    >>> (datas < converter_data('01/02/1970')).tolist()
+    [True, True, False]
+    >>> converter_data('abc') is None
+    True
+    """
+    data = converter_datas(pd.Series([str(valor).strip()], dtype=object)).iloc[0]
+    return None if pd.isna(data) else data
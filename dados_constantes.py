@@ -3,6 +3,8 @@
 Módulo para armazenar constantes e configurações da aplicação.
 """
 
+import os
+
 # Mapeamento de nomes de bancos para seus respectivos códigos
 BANCOS_MAPEAMENTO = {
     "2 - MeuCashCard": "2",
@@ -51,4 +53,67 @@ ORDEM_COLUNAS_FINAL = [
     'banco_emprestimo', 'banco_beneficio', 'banco_cartao',
     'prazo_emprestimo', 'prazo_beneficio', 'prazo_cartao',
     'Campanha'
-]
\ No newline at end of file
+]
+
+# Meta de pico de memória de uma execução de aplicar_filtros: memória extra
+# (pico de RSS durante a execução, com o pico do processo zerado antes dela, acima
+# do RSS anterior) como múltiplo do tamanho em memória da base de entrada. Medido
+# com `python cli.py ... --medir-memoria` (Linux).
+META_PICO_MEMORIA_RELATIVA = 3.0
+
+# Esquema das colunas conhecidas, aplicado uma única vez na leitura dos CSVs
+# (juntar_arquivos.aplicar_esquema). As etapas seguintes confiam nesses tipos.
+# - 'texto': lido como texto, preservando zeros à esquerda (CPF, Matrícula)
+# - 'categoria': poucos valores distintos repetidos em milhões de linhas
+# - 'data': mantido como o texto lido (vai assim para o arquivo final); os filtros
+#   convertem para datetime64 sob demanda (conversao_datas, dia primeiro)
+# Colunas com o prefixo PREFIXO_COLUNAS_MARGEM são margens em R$ e viram float32
+# (precisão de centavos até ~R$ 167 mil, mais que suficiente para margens).
+ESQUEMA_COLUNAS = {
+    'CPF': 'texto',
+    'Matricula': 'texto',
+    'Lotacao': 'categoria',
+    'Vinculo_Servidor': 'categoria',
+    'Secretaria': 'categoria',
+    'Convenio': 'categoria',
+    'Data_Nascimento': 'data',
+}
+PREFIXO_COLUNAS_MARGEM = 'MG_'
+
+# Cache local (Parquet) dos arquivos já lidos, indexado pelo hash do conteúdo.
+# Reenvios do mesmo arquivo carregam do cache em vez de reprocessar o CSV.
+DIRETORIO_CACHE_UPLOADS = os.environ.get(
+    'FILTRADOR_CACHE_UPLOADS', os.path.join(os.path.expanduser('~'), '.cache', 'filtrador_campanhas', 'uploads'))
+LIMITE_CACHE_UPLOADS_MB = float(os.environ.get('FILTRADOR_CACHE_UPLOADS_MB', 4096))
+
+# Fila local (SQLite) dos logs de auditoria ainda não enviados ao Supabase.
+# Um worker em segundo plano envia em lotes e tenta de novo em caso de falha.
+ARQUIVO_FILA_AUDITORIA = os.environ.get(
+    'FILTRADOR_FILA_AUDITORIA', os.path.join(os.path.expanduser('~'), '.cache', 'filtrador_campanhas', 'fila_auditoria.sqlite'))
+
+# Cópia local (SQLite) da tabela logs_auditoria_configs, atualizada só com o que
+# chegou desde a última sincronização. O Consultor de Coeficientes lê daqui.
+ARQUIVO_ESPELHO_AUDITORIA = os.environ.get(
+    'FILTRADOR_ESPELHO_AUDITORIA', os.path.join(os.path.expanduser('~'), '.cache', 'filtrador_campanhas', 'espelho_auditoria.sqlite'))
+INTERVALO_SINCRONIZACAO_AUDITORIA = float(os.environ.get('FILTRADOR_INTERVALO_SINCRONIZACAO', 60))
+
+# Bases das sessões (base carregada, resultado da filtragem) em arquivos Arrow
+# mapeados em memória. Acima do limite de memória as menos usadas saem da memória
+# (continuam no disco); acima do limite de disco são descartadas.
+DIRETORIO_ARMAZEM_SESSOES = os.environ.get(
+    'FILTRADOR_ARMAZEM_SESSOES', os.path.join(os.path.expanduser('~'), '.cache', 'filtrador_campanhas', 'sessoes'))
+LIMITE_MEMORIA_SESSOES_MB = float(os.environ.get('FILTRADOR_MEMORIA_SESSOES_MB', 2048))
+LIMITE_DISCO_SESSOES_MB = float(os.environ.get('FILTRADOR_DISCO_SESSOES_MB', 20480))
+
+# Normalização de texto aplicada no pré-processamento, depois dos filtros de
+# exclusão (normalizacao_texto.normalizar_colunas). Opções por coluna:
+# - 'titulo': "MARIA DA SILVA" -> "Maria Da Silva"
+# - 'sem_acentos': "João" -> "Joao"
+# - 'espacos': remove espaços das pontas e junta espaços repetidos
+# O padrão reproduz o comportamento histórico (apenas o nome em título).
+NORMALIZACAO_TEXTO = {
+    'Nome_Cliente': {'titulo': True, 'sem_acentos': False, 'espacos': False},
+    'Lotacao': {'titulo': False, 'sem_acentos': False, 'espacos': False},
+    'Vinculo_Servidor': {'titulo': False, 'sem_acentos': False, 'espacos': False},
+    'Secretaria': {'titulo': False, 'sem_acentos': False, 'espacos': False},
+}
@@ -0,0 +1,401 @@
+"""
+Cópia local (SQLite) da tabela de auditoria `logs_auditoria_configs`.
+
+A sincronização busca só o que chegou desde a última linha conhecida (marca
+d'água (created_at, id)), em páginas por chave - sem OFFSET e sem limite de
+linhas no total. Para não perder linhas gravadas com um created_at um pouco
+anterior ao da marca (transações concorrentes no servidor), cada sincronização
+recomeça SOBREPOSICAO_SEGUNDOS antes dela; as linhas já conhecidas (mesmo id)
+são ignoradas. A tabela de auditoria só recebe inserções.
+
+As consultas do Consultor de Coeficientes são respondidas daqui, também
+paginadas por chave: cada página devolve o cursor (created_at, id) da sua
+última linha, e a seguinte começa depois dele.
+
+Junto com as linhas, a sincronização mantém um índice agregado por (convênio,
+produto, banco): o registro mais recente e, para coeficiente e comissão, a
+contagem de cada valor por dia. Como os operadores repetem poucos valores, o
+último valor e a mediana/faixa em qualquer janela (JANELAS_DIAS) saem de poucas
+linhas, em milissegundos. O índice só é atualizado com as linhas novas.
+
+`buscar(apos, limite)` é a função que traz do servidor até `limite` linhas
+depois do cursor `apos` (None: desde o início), em ordem crescente de
+(created_at, id): BuscaPostgrest (HTTP puro) ou supabase_utils.BuscaSupabase.
+"""
+
+import datetime
+import json
+import os
+import threading
+import time
+import urllib.parse
+import urllib.request
+
+from dados_constantes import ARQUIVO_ESPELHO_AUDITORIA
+from fila_auditoria import cabecalhos_postgrest, conectar_sqlite
+
+TABELA_AUDITORIA = 'logs_auditoria_configs'
+TAMANHO_PAGINA_SINCRONIZACAO = 1000
+SOBREPOSICAO_SEGUNDOS = 300
+
+# Colunas com índice para filtrar/ordenar; a linha completa fica em `dados` (JSON)
+COLUNAS_INDEXADAS = ('convenio', 'produto_configurado', 'banco', 'coeficiente', 'comissao')
+
+# Índice agregado: grupo, campos resumidos e janelas (dias; None = todo o histórico)
+COLUNAS_GRUPO = ('convenio', 'produto_configurado', 'banco')
+CAMPOS_RESUMO = ('coeficiente', 'comissao')
+JANELAS_DIAS = (30, 90, 365, None)
+# Muda quando o formato do índice muda: o índice é reconstruído a partir dos registros
+VERSAO_INDICE = '1'
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS registros (
+    id INTEGER PRIMARY KEY,
+    created_at TEXT NOT NULL,
+    convenio TEXT,
+    produto_configurado TEXT,
+    banco TEXT,
+    coeficiente REAL,
+    comissao REAL,
+    dados TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS registros_recentes ON registros (created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS registros_convenio_produto
+    ON registros (convenio, produto_configurado, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS registros_produto ON registros (produto_configurado, created_at DESC, id DESC);
+CREATE TABLE IF NOT EXISTS meta (chave TEXT PRIMARY KEY, valor TEXT);
+CREATE TABLE IF NOT EXISTS indice_ultimos (
+    convenio TEXT NOT NULL,
+    produto_configurado TEXT NOT NULL,
+    banco TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    id INTEGER NOT NULL,
+    coeficiente REAL,
+    comissao REAL,
+    PRIMARY KEY (convenio, produto_configurado, banco)
+);
+CREATE TABLE IF NOT EXISTS indice_valores (
+    convenio TEXT NOT NULL,
+    produto_configurado TEXT NOT NULL,
+    banco TEXT NOT NULL,
+    campo TEXT NOT NULL,
+    dia TEXT NOT NULL,
+    valor REAL NOT NULL,
+    quantidade INTEGER NOT NULL,
+    PRIMARY KEY (convenio, produto_configurado, banco, campo, dia, valor)
+);
+"""
+
+
+def normalizar_data(valor) -> str:
+    """created_at em ISO 8601 UTC com microssegundos (ordenável como texto)."""
+    data = datetime.datetime.fromisoformat(str(valor).replace('Z', '+00:00'))
+    if data.tzinfo is None:
+        data = data.replace(tzinfo=datetime.timezone.utc)
+    return data.astimezone(datetime.timezone.utc).isoformat(timespec='microseconds')
+
+
+def _grupo(linha: dict) -> tuple:
+    """Chave (convênio, produto, banco) do índice; valores ausentes viram ''."""
+    return tuple('' if linha.get(c) is None else str(linha.get(c)) for c in COLUNAS_GRUPO)
+
+
+def _mediana_ponderada(valores: list, quantidades: list) -> float:
+    """Mediana de `valores` (em ordem crescente) repetidos `quantidades` vezes."""
+    total = sum(quantidades)
+    meio_inferior, meio_superior = (total - 1) // 2, total // 2
+    acumulado, inferior = 0, None
+    for valor, quantidade in zip(valores, quantidades):
+        acumulado += quantidade
+        if inferior is None and acumulado > meio_inferior:
+            inferior = valor
+        if acumulado > meio_superior:
+            return (inferior + valor) / 2
+
+
+def _estatisticas(valores: list, quantidades: list) -> dict:
+    """Mediana, faixa e quantidade de `valores` (em ordem crescente) repetidos `quantidades` vezes."""
+    return {'mediana': _mediana_ponderada(valores, quantidades), 'minimo': valores[0], 'maximo': valores[-1],
+            'quantidade': sum(quantidades)}
+
+
+def filtro_apos(apos) -> str:
+    """Condições PostgREST (para um `or`) de 'depois do cursor (created_at, id)'."""
+    created_at, id_ = apos
+    return f"created_at.gt.{created_at},and(created_at.eq.{created_at},id.gt.{id_})"
+
+
+class BuscaPostgrest:
+    """Busca páginas da tabela com um GET em `{url_rest}/{tabela}` (API do PostgREST)."""
+
+    def __init__(self, url_rest: str, chave: str = None, tabela: str = TABELA_AUDITORIA, timeout: float = 30.0):
+        self.url_rest = url_rest.rstrip('/')
+        self.chave = chave
+        self.tabela = tabela
+        self.timeout = timeout
+
+    def __call__(self, apos, limite: int) -> list:
+        parametros = {'select': '*', 'order': 'created_at.asc,id.asc', 'limit': str(limite)}
+        if apos is not None:
+            parametros['or'] = f"({filtro_apos(apos)})"
+        requisicao = urllib.request.Request(
+            f"{self.url_rest}/{self.tabela}?{urllib.parse.urlencode(parametros)}",
+            headers={'Accept': 'application/json', **cabecalhos_postgrest(self.chave)}
+        )
+        with urllib.request.urlopen(requisicao, timeout=self.timeout) as resposta:
+            return json.loads(resposta.read())
+
+
+class EspelhoAuditoria:
+    """Cópia local da tabela de auditoria, sincronizada por marca d'água."""
+
+    def __init__(self, buscar=None, caminho: str = ARQUIVO_ESPELHO_AUDITORIA):
+        self.buscar = buscar
+        self.caminho = caminho
+        # Última tentativa de sincronizar neste processo (com ou sem sucesso), em time.time
+        self.tentativa_em = 0.0
+        self._sincronizando = threading.Lock()
+        if os.path.dirname(caminho):
+            os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        with self._conectar() as conexao:
+            conexao.execute('PRAGMA journal_mode=WAL')
+            conexao.executescript(_ESQUEMA)
+            versao = conexao.execute("SELECT valor FROM meta WHERE chave = 'versao_indice'").fetchone()
+        if versao is None or versao[0] != VERSAO_INDICE:
+            self.reconstruir_indice()
+
+    def _conectar(self):
+        return conectar_sqlite(self.caminho)
+
+    def marca_dagua(self):
+        """(created_at, id) da linha mais recente da cópia, ou None se estiver vazia."""
+        with self._conectar() as conexao:
+            return conexao.execute(
+                'SELECT created_at, id FROM registros ORDER BY created_at DESC, id DESC LIMIT 1'
+            ).fetchone()
+
+    def sincronizado_em(self) -> float:
+        """Momento (time.time) da última sincronização concluída; 0 se nunca houve."""
+        with self._conectar() as conexao:
+            linha = conexao.execute("SELECT valor FROM meta WHERE chave = 'sincronizado_em'").fetchone()
+        return float(linha[0]) if linha else 0.0
+
+    def sincronizar_em_segundo_plano(self, intervalo: float) -> bool:
+        """
+        Sincroniza numa thread, sem avisos, se a última sincronização (ou tentativa)
+        tem mais de `intervalo` segundos e nenhuma está em andamento. Uma falha só
+        espera o próximo intervalo: a cópia local continua valendo. True se iniciou.
+        """
+        agora = time.time()
+        if (self.buscar is None or agora - max(self.sincronizado_em(), self.tentativa_em) < intervalo
+                or not self._sincronizando.acquire(blocking=False)):
+            return False
+        self.tentativa_em = agora
+
+        def sincronizar():
+            try:
+                self.sincronizar()
+            except Exception:
+                pass
+            finally:
+                self._sincronizando.release()
+
+        threading.Thread(target=sincronizar, name='sincronizar_auditoria', daemon=True).start()
+        return True
+
+    def _gravar(self, conexao, linhas: list) -> list:
+        """Insere as linhas ainda não conhecidas (pelo id); retorna as que entraram."""
+        ids = [linha['id'] for linha in linhas]
+        conhecidos = {r[0] for r in conexao.execute(
+            f"SELECT id FROM registros WHERE id IN ({','.join('?' * len(ids))})", ids
+        )}
+        novas = [linha for linha in linhas if linha['id'] not in conhecidos]
+        conexao.executemany(
+            f"INSERT INTO registros (id, created_at, {', '.join(COLUNAS_INDEXADAS)}, dados) "
+            f"VALUES (?, ?, {', '.join('?' * len(COLUNAS_INDEXADAS))}, ?)",
+            [(linha['id'], normalizar_data(linha['created_at']), *(linha.get(c) for c in COLUNAS_INDEXADAS),
+              json.dumps(linha, ensure_ascii=False)) for linha in novas]
+        )
+        self._indexar(conexao, novas)
+        return novas
+
+    @staticmethod
+    def _indexar(conexao, linhas: list):
+        """Soma `linhas` (novas) ao índice agregado, na transação de `conexao`."""
+        ultimos, valores = [], []
+        for linha in linhas:
+            grupo = _grupo(linha)
+            created_at = normalizar_data(linha['created_at'])
+            ultimos.append((*grupo, created_at, linha['id'], *(linha.get(c) for c in CAMPOS_RESUMO)))
+            for campo in CAMPOS_RESUMO:
+                if linha.get(campo) is not None:
+                    valores.append((*grupo, campo, created_at[:10], float(linha[campo])))
+        conexao.executemany(
+            """INSERT INTO indice_ultimos (convenio, produto_configurado, banco, created_at, id, coeficiente, comissao)
+               VALUES (?, ?, ?, ?, ?, ?, ?)
+               ON CONFLICT (convenio, produto_configurado, banco) DO UPDATE SET
+                   created_at = excluded.created_at, id = excluded.id,
+                   coeficiente = excluded.coeficiente, comissao = excluded.comissao
+               WHERE (excluded.created_at, excluded.id) > (indice_ultimos.created_at, indice_ultimos.id)""",
+            ultimos
+        )
+        conexao.executemany(
+            """INSERT INTO indice_valores (convenio, produto_configurado, banco, campo, dia, valor, quantidade)
+               VALUES (?, ?, ?, ?, ?, ?, 1)
+               ON CONFLICT (convenio, produto_configurado, banco, campo, dia, valor)
+               DO UPDATE SET quantidade = quantidade + 1""",
+            valores
+        )
+
+    def reconstruir_indice(self):
+        """Refaz o índice agregado a partir de todos os registros da cópia."""
+        with self._conectar() as conexao:
+            conexao.execute('BEGIN IMMEDIATE')
+            conexao.execute('DELETE FROM indice_ultimos')
+            conexao.execute('DELETE FROM indice_valores')
+            consulta = conexao.execute(f"SELECT id, created_at, {', '.join(COLUNAS_INDEXADAS)} FROM registros")
+            while True:
+                bloco = consulta.fetchmany(TAMANHO_PAGINA_SINCRONIZACAO)
+                if not bloco:
+                    break
+                self._indexar(conexao, [dict(zip(('id', 'created_at', *COLUNAS_INDEXADAS), r)) for r in bloco])
+            conexao.execute("INSERT OR REPLACE INTO meta (chave, valor) VALUES ('versao_indice', ?)", (VERSAO_INDICE,))
+            conexao.execute('COMMIT')
+
+    def sincronizar(self) -> int:
+        """Traz do servidor as linhas novas desde a marca d'água; retorna quantas entraram."""
+        if self.buscar is None:
+            return 0
+        marca = self.marca_dagua()
+        apos = None
+        if marca is not None:
+            inicio = datetime.datetime.fromisoformat(marca[0]) - datetime.timedelta(seconds=SOBREPOSICAO_SEGUNDOS)
+            apos = (inicio.isoformat(timespec='microseconds'), 0)
+        total = 0
+        while True:
+            pagina = self.buscar(apos, TAMANHO_PAGINA_SINCRONIZACAO)
+            if pagina:
+                # Uma transação por página: uma falha no meio preserva o que já entrou
+                with self._conectar() as conexao:
+                    conexao.execute('BEGIN IMMEDIATE')
+                    total += len(self._gravar(conexao, pagina))
+                    conexao.execute('COMMIT')
+                apos = (normalizar_data(pagina[-1]['created_at']), pagina[-1]['id'])
+            if len(pagina) < TAMANHO_PAGINA_SINCRONIZACAO:
+                break
+        with self._conectar() as conexao:
+            conexao.execute("INSERT OR REPLACE INTO meta (chave, valor) VALUES ('sincronizado_em', ?)",
+                            (str(time.time()),))
+        return total
+
+    @staticmethod
+    def _filtros(convenio: str = None, produto: str = None):
+        condicoes, valores = [], []
+        if convenio and convenio != "Todos":
+            condicoes.append('convenio = ?')
+            valores.append(convenio)
+        if produto and produto != "Todos":
+            condicoes.append('produto_configurado = ?')
+            valores.append(produto)
+        return condicoes, valores
+
+    def consultar(self, convenio: str = None, produto: str = None, limite: int = 100, apos=None):
+        """
+        Página de registros (dicts, do mais recente ao mais antigo) com os filtros.
+        Retorna (linhas, cursor da próxima página ou None se esta foi a última).
+        """
+        condicoes, valores = self._filtros(convenio, produto)
+        if apos is not None:
+            condicoes.append('(created_at, id) < (?, ?)')
+            valores.extend(apos)
+        where = f"WHERE {' AND '.join(condicoes)}" if condicoes else ''
+        with self._conectar() as conexao:
+            registros = conexao.execute(
+                f"SELECT created_at, id, dados FROM registros {where} ORDER BY created_at DESC, id DESC LIMIT ?",
+                [*valores, limite + 1]
+            ).fetchall()
+        proximo = (registros[limite - 1][0], registros[limite - 1][1]) if len(registros) > limite else None
+        return [json.loads(r[2]) for r in registros[:limite]], proximo
+
+    def contar(self, convenio: str = None, produto: str = None) -> int:
+        condicoes, valores = self._filtros(convenio, produto)
+        where = f"WHERE {' AND '.join(condicoes)}" if condicoes else ''
+        with self._conectar() as conexao:
+            return conexao.execute(f"SELECT COUNT(*) FROM registros {where}", valores).fetchone()[0]
+
+    def resumo_coeficientes(self, convenio, produto, banco, hoje: datetime.date = None) -> dict:
+        """
+        Resumo do índice para um (convênio, produto, banco): {'ultimo': {created_at,
+        coeficiente, comissao}, 'janelas': {dias: {campo: {mediana, minimo, maximo,
+        quantidade}}}}, com as janelas contadas até `hoje` (UTC). None se não houver registros.
+        """
+        grupo = _grupo(dict(zip(COLUNAS_GRUPO, (convenio, produto, banco))))
+        hoje = hoje or datetime.datetime.now(datetime.timezone.utc).date()
+        with self._conectar() as conexao:
+            ultimo = conexao.execute(
+                'SELECT created_at, coeficiente, comissao FROM indice_ultimos '
+                'WHERE convenio = ? AND produto_configurado = ? AND banco = ?', grupo
+            ).fetchone()
+            if ultimo is None:
+                return None
+            # Contagens diárias do grupo (uma consulta); as janelas são somadas a partir delas
+            contagens = conexao.execute(
+                'SELECT campo, valor, dia, quantidade FROM indice_valores '
+                'WHERE convenio = ? AND produto_configurado = ? AND banco = ? ORDER BY campo, valor', grupo
+            ).fetchall()
+        janelas = {}
+        for dias in JANELAS_DIAS:
+            desde = '' if dias is None else (hoje - datetime.timedelta(days=dias - 1)).isoformat()
+            janelas[dias] = {}
+            for campo in CAMPOS_RESUMO:
+                por_valor = {}
+                for campo_contagem, valor, dia, quantidade in contagens:
+                    if campo_contagem == campo and dia >= desde:
+                        por_valor[valor] = por_valor.get(valor, 0) + quantidade
+                if por_valor:
+                    janelas[dias][campo] = _estatisticas(list(por_valor), list(por_valor.values()))
+        return {
+            'ultimo': {'created_at': ultimo[0], 'coeficiente': ultimo[1], 'comissao': ultimo[2]},
+            'janelas': janelas,
+        }
+
+    def resumo_grupos(self, convenio: str = None, produto: str = None, dias: int = 90,
+                      hoje: datetime.date = None) -> list:
+        """
+        Uma linha por (convênio, produto, banco) com os filtros: último valor e
+        mediana/faixa na janela de `dias` (None: todo o histórico). Duas consultas
+        para todos os grupos; as contagens da janela já vêm somadas por valor.
+        """
+        hoje = hoje or datetime.datetime.now(datetime.timezone.utc).date()
+        desde = '' if dias is None else (hoje - datetime.timedelta(days=dias - 1)).isoformat()
+        condicoes, valores = self._filtros(convenio, produto)
+        where = f"WHERE {' AND '.join(condicoes)}" if condicoes else ''
+        with self._conectar() as conexao:
+            ultimos = conexao.execute(
+                f"SELECT convenio, produto_configurado, banco, created_at, coeficiente, comissao "
+                f"FROM indice_ultimos {where} ORDER BY convenio, produto_configurado, banco", valores
+            ).fetchall()
+            contagens = conexao.execute(
+                f"SELECT convenio, produto_configurado, banco, campo, valor, SUM(quantidade) FROM indice_valores "
+                f"WHERE {' AND '.join(condicoes + ['dia >= ?'])} "
+                "GROUP BY convenio, produto_configurado, banco, campo, valor "
+                "ORDER BY convenio, produto_configurado, banco, campo, valor", valores + [desde]
+            ).fetchall()
+        # (grupo, campo) -> (valores em ordem, quantidades)
+        por_grupo = {}
+        for *grupo, campo, valor, quantidade in contagens:
+            valores_campo, quantidades = por_grupo.setdefault((tuple(grupo), campo), ([], []))
+            valores_campo.append(valor)
+            quantidades.append(quantidade)
+        linhas = []
+        for registro in ultimos:
+            grupo = tuple(registro[:3])
+            linha = dict(zip(COLUNAS_GRUPO, grupo))
+            linha['ultimo_em'] = registro[3]
+            for campo, ultimo in zip(CAMPOS_RESUMO, registro[4:]):
+                linha[f'ultimo_{campo}'] = ultimo
+                janela = _estatisticas(*por_grupo[(grupo, campo)]) if (grupo, campo) in por_grupo else {}
+                for estatistica in ('mediana', 'minimo', 'maximo', 'quantidade'):
+                    linha[f'{estatistica}_{campo}'] = janela.get(estatistica)
+            linhas.append(linha)
+        return linhas
@@ -0,0 +1,80 @@
+"""
+Execução da filtragem em segundo plano.
+
+`aplicar_filtros` roda em uma thread de trabalho para não prender o script do
+Streamlit: a interface acompanha o progresso pela etapa em andamento da
+instrumentação e pode pedir o cancelamento, atendido no início da etapa
+seguinte. A thread não fala com a interface - os eventos ficam em um
+RegistradorEventos em memória e são reemitidos na página quando o resultado é
+recebido. Uma thread (e não um processo) evita copiar a base e permite reusar o
+MemoEtapas da sessão; as operações pesadas do pandas/numpy liberam o GIL.
+"""
+
+import threading
+
+from filtradores import aplicar_filtros
+from instrumentacao import ExecucaoCancelada, Instrumentacao
+from registro_eventos import RegistradorEventos
+
+
+class ExecucaoFiltragem:
+    """Uma chamada de aplicar_filtros em uma thread, com progresso e cancelamento."""
+
+    def __init__(self, df, params: dict, configs_banco: list, memo=None):
+        self.params = params
+        self.configs_banco = configs_banco
+        self.registrador = RegistradorEventos()
+        self.cancelamento = threading.Event()
+        self.instrumentacao = Instrumentacao(cancelamento=self.cancelamento)
+        # Pré-processamento, uma etapa por config, override GOVSP e finalização
+        self.total_etapas = len(configs_banco) + (3 if params.get('convenio') == 'govsp' else 2)
+        self.resultado = None
+        self.erro = None
+        self.cancelada = False
+        self._thread = threading.Thread(
+            target=self._executar, args=(df, params, configs_banco, memo), name='filtragem', daemon=True
+        )
+
+    def iniciar(self):
+        self._thread.start()
+        return self
+
+    def _executar(self, df, params, configs_banco, memo):
+        try:
+            self.resultado = aplicar_filtros(
+                df, params, configs_banco,
+                registrador=self.registrador, instrumentacao=self.instrumentacao, memo=memo
+            )
+        except ExecucaoCancelada:
+            self.cancelada = True
+        except Exception as e:
+            self.erro = e
+
+    @property
+    def em_andamento(self) -> bool:
+        return self._thread.is_alive()
+
+    def cancelar(self):
+        """Pede o cancelamento; a etapa em andamento termina antes."""
+        self.cancelamento.set()
+
+    def aguardar(self, segundos: float = None) -> bool:
+        """Espera a thread terminar (até `segundos`); True se terminou."""
+        self._thread.join(segundos)
+        return not self.em_andamento
+
+    def fracao_concluida(self) -> float:
+        return min(1.0, len(self.instrumentacao.etapas) / max(1, self.total_etapas))
+
+    def progresso(self) -> str:
+        """Texto de acompanhamento (ex: 'Config 3 (243/Novo) - etapa 4 de 6, 1.234.567 linhas')."""
+        concluidas = len(self.instrumentacao.etapas)
+        if self.cancelamento.is_set():
+            return "Cancelando: aguardando o fim da etapa em andamento..."
+        atual = self.instrumentacao.etapa_atual
+        if atual is None:
+            return f"Etapa {min(concluidas + 1, self.total_etapas)} de {self.total_etapas}"
+        texto = f"{atual['etapa']} - etapa {min(concluidas + 1, self.total_etapas)} de {self.total_etapas}"
+        if atual.get('linhas_entrada') is not None:
+            texto += f", {atual['linhas_entrada']:,} linhas".replace(',', '.')
+        return texto
@@ -0,0 +1,85 @@
+"""
+Exportação da campanha filtrada sem montar o arquivo inteiro em memória.
+
+O CSV (separador ';', utf-8-sig, o formato esperado pelos discadores) é escrito
+em blocos de linhas direto no destino - arquivo em disco, gzip ou zip - e o
+Parquet é gravado pelo pyarrow. `exportar_para_bytes` (download do Streamlit,
+que guarda o arquivo inteiro em memória de qualquer forma) escreve num
+temporário em disco e só lê de volta o arquivo pronto, já compactado.
+"""
+
+import gzip
+import io
+import os
+import tempfile
+import zipfile
+
+import pandas as pd
+
+# formato -> (rótulo na UI, extensão, mime)
+FORMATOS_EXPORTACAO = {
+    'csv': ("CSV (;)", '.csv', 'text/csv'),
+    'csv.gz': ("CSV compactado (gzip)", '.csv.gz', 'application/gzip'),
+    'zip': ("CSV compactado (zip)", '.zip', 'application/zip'),
+    'parquet': ("Parquet", '.parquet', 'application/vnd.apache.parquet'),
+}
+
+LINHAS_POR_BLOCO = 100_000
+
+
+def nome_arquivo_exportacao(nome_base: str, formato: str) -> str:
+    """Nome do arquivo de saída com a extensão do formato."""
+    return f"{nome_base}{FORMATOS_EXPORTACAO[formato][1]}"
+
+
+def _escrever_csv(df: pd.DataFrame, destino_binario):
+    """Escreve o CSV em blocos de LINHAS_POR_BLOCO linhas no destino binário."""
+    texto = io.TextIOWrapper(destino_binario, encoding='utf-8-sig', newline='')
+    try:
+        df.to_csv(texto, index=False, sep=';', chunksize=LINHAS_POR_BLOCO)
+        texto.flush()
+    finally:
+        # Solta o destino sem fechá-lo: quem abriu é quem fecha
+        texto.detach()
+
+
+def exportar(df: pd.DataFrame, destino, formato: str = 'csv', nome_interno: str = 'campanha.csv'):
+    """
+    Grava `df` no `destino` (caminho ou arquivo binário aberto) no `formato`
+    escolhido (ver FORMATOS_EXPORTACAO). `nome_interno` é o nome do CSV dentro do zip.
+    """
+    if formato not in FORMATOS_EXPORTACAO:
+        raise ValueError(f"Formato de exportação desconhecido: {formato}")
+
+    if formato == 'parquet':
+        df.to_parquet(destino, index=False)
+        return
+
+    arquivo = open(destino, 'wb') if isinstance(destino, (str, os.PathLike)) else None
+    saida = arquivo if arquivo is not None else destino
+    try:
+        if formato == 'csv':
+            _escrever_csv(df, saida)
+        elif formato == 'csv.gz':
+            with gzip.GzipFile(fileobj=saida, mode='wb', compresslevel=6) as comprimido:
+                _escrever_csv(df, comprimido)
+        else:
+            with zipfile.ZipFile(saida, 'w', compression=zipfile.ZIP_DEFLATED) as pacote:
+                with pacote.open(nome_interno, 'w', force_zip64=True) as comprimido:
+                    _escrever_csv(df, comprimido)
+    finally:
+        if arquivo is not None:
+            arquivo.close()
+
+
+def exportar_para_bytes(df: pd.DataFrame, formato: str = 'csv', nome_interno: str = 'campanha.csv') -> bytes:
+    """
+    Conteúdo do arquivo exportado. A escrita vai para um temporário em disco
+    (apagado no fim), então a memória guarda só o arquivo final, sem o texto do
+    CSV intermediário.
+    """
+    with tempfile.TemporaryDirectory(prefix='exportacao_') as diretorio:
+        caminho = os.path.join(diretorio, nome_arquivo_exportacao('campanha', formato))
+        exportar(df, caminho, formato, nome_interno)
+        with open(caminho, 'rb') as f:
+            return f.read()
@@ -0,0 +1,247 @@
+"""
+Fila local e durável dos logs de auditoria.
+
+Salvar uma configuração só grava as linhas em um arquivo SQLite (rápido, sem
+rede) e devolve o controle à interface. Um worker em segundo plano lê a fila em
+lotes (por tabela, na ordem de chegada; linhas aguardando nova tentativa não
+seguram as seguintes), envia cada lote com o `enviar` configurado e só apaga as
+linhas depois que o envio deu certo. Se falhar, o lote
+volta para a fila com espera exponencial; depois de MAX_TENTATIVAS as linhas
+ficam paradas como falha (não são perdidas) até `reenviar_falhas`.
+
+O envio é "ao menos uma vez": se a resposta se perder depois de o servidor
+gravar, o lote é reenviado. Várias instâncias (processos) podem usar o mesmo
+arquivo: cada lote é reservado em uma transação antes do envio.
+
+`enviar(tabela, linhas)` é qualquer função que levanta exceção em caso de falha:
+EnvioPostgrest (HTTP puro, serve para o Supabase ou um PostgREST local) ou o
+cliente do Supabase (supabase_utils.EnvioSupabase).
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import urllib.request
+
+from dados_constantes import ARQUIVO_FILA_AUDITORIA
+
+TAMANHO_LOTE = 200
+INTERVALO_VERIFICACAO = 30.0
+ESPERA_INICIAL = 5.0
+ESPERA_MAXIMA = 600.0
+MAX_TENTATIVAS = 20
+# Tempo que um lote fica reservado enquanto é enviado (se o processo morrer, volta à fila)
+RESERVA_SEGUNDOS = 120.0
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS fila (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    tabela TEXT NOT NULL,
+    linha TEXT NOT NULL,
+    criado_em REAL NOT NULL,
+    tentativas INTEGER NOT NULL DEFAULT 0,
+    proximo_envio REAL,
+    ultimo_erro TEXT
+);
+CREATE INDEX IF NOT EXISTS fila_proximo_envio ON fila (proximo_envio);
+"""
+
+
+def cabecalhos_postgrest(chave: str = None) -> dict:
+    """Cabeçalhos de autenticação do PostgREST/Supabase (sem chave, nenhum)."""
+    return {'apikey': chave, 'Authorization': f"Bearer {chave}"} if chave else {}
+
+
+def conectar_sqlite(caminho: str):
+    """
+    Conexão sqlite3 para usar em `with` (fecha no fim). isolation_level=None: as
+    transações são abertas explicitamente (BEGIN IMMEDIATE).
+    """
+    return _FechandoConexao(sqlite3.connect(caminho, timeout=30, isolation_level=None))
+
+
+class EnvioPostgrest:
+    """
+    Envia lotes com um POST para `{url_rest}/{tabela}` (API do PostgREST).
+    Para o Supabase, `url_rest` é '<supabase_url>/rest/v1'.
+    """
+
+    def __init__(self, url_rest: str, chave: str = None, timeout: float = 30.0):
+        self.url_rest = url_rest.rstrip('/')
+        self.chave = chave
+        self.timeout = timeout
+
+    def __call__(self, tabela: str, linhas: list):
+        cabecalhos = {'Content-Type': 'application/json', 'Prefer': 'return=minimal', **cabecalhos_postgrest(self.chave)}
+        requisicao = urllib.request.Request(
+            f"{self.url_rest}/{tabela}", data=json.dumps(linhas).encode('utf-8'),
+            headers=cabecalhos, method='POST'
+        )
+        # Status >= 400 levanta HTTPError
+        with urllib.request.urlopen(requisicao, timeout=self.timeout) as resposta:
+            resposta.read()
+
+
+class FilaAuditoria:
+    """Fila em SQLite com um worker que envia os lotes pendentes em segundo plano."""
+
+    def __init__(self, enviar=None, caminho: str = ARQUIVO_FILA_AUDITORIA, tamanho_lote: int = TAMANHO_LOTE,
+                 intervalo: float = INTERVALO_VERIFICACAO):
+        self.enviar = enviar
+        self.caminho = caminho
+        self.tamanho_lote = tamanho_lote
+        self.intervalo = intervalo
+        self._acordar = threading.Event()
+        self._parar = threading.Event()
+        self._thread = None
+        if os.path.dirname(caminho):
+            os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        with self._conectar() as conexao:
+            conexao.execute('PRAGMA journal_mode=WAL')
+            conexao.executescript(_ESQUEMA)
+
+    def _conectar(self):
+        # Uma conexão por operação: a fila é usada pela interface e pelo worker
+        return conectar_sqlite(self.caminho)
+
+    def enfileirar(self, tabela: str, linhas: list) -> int:
+        """Grava `linhas` (dicts serializáveis em JSON) para envio e acorda o worker."""
+        agora = time.time()
+        with self._conectar() as conexao:
+            conexao.execute('BEGIN IMMEDIATE')
+            conexao.executemany(
+                'INSERT INTO fila (tabela, linha, criado_em, proximo_envio) VALUES (?, ?, ?, ?)',
+                [(tabela, json.dumps(linha, ensure_ascii=False), agora, agora) for linha in linhas]
+            )
+            conexao.execute('COMMIT')
+        self._acordar.set()
+        return len(linhas)
+
+    def _reservar_lote(self):
+        """(tabela, ids, linhas) do próximo lote vencido, já reservado; None se não houver."""
+        agora = time.time()
+        with self._conectar() as conexao:
+            conexao.execute('BEGIN IMMEDIATE')
+            try:
+                primeira = conexao.execute(
+                    'SELECT tabela FROM fila WHERE proximo_envio <= ? ORDER BY id LIMIT 1', (agora,)
+                ).fetchone()
+                if primeira is None:
+                    return None
+                registros = conexao.execute(
+                    'SELECT id, linha FROM fila WHERE tabela = ? AND proximo_envio <= ? ORDER BY id LIMIT ?',
+                    (primeira[0], agora, self.tamanho_lote)
+                ).fetchall()
+                ids = [r[0] for r in registros]
+                conexao.executemany('UPDATE fila SET proximo_envio = ? WHERE id = ?',
+                                    [(agora + RESERVA_SEGUNDOS, i) for i in ids])
+            finally:
+                conexao.execute('COMMIT')
+        return primeira[0], ids, [json.loads(r[1]) for r in registros]
+
+    def _concluir(self, ids: list):
+        with self._conectar() as conexao:
+            conexao.executemany('DELETE FROM fila WHERE id = ?', [(i,) for i in ids])
+
+    def _falhar(self, ids: list, erro: Exception):
+        agora = time.time()
+        with self._conectar() as conexao:
+            conexao.execute('BEGIN IMMEDIATE')
+            # Espera exponencial pela tentativa (a nova); passou do limite, para (proximo_envio NULL)
+            conexao.executemany(
+                """UPDATE fila SET tentativas = tentativas + 1, ultimo_erro = ?,
+                       proximo_envio = CASE WHEN tentativas + 1 >= ? THEN NULL
+                                            ELSE ? + MIN(?, ? * (1 << tentativas)) END
+                   WHERE id = ?""",
+                [(str(erro)[:1000], MAX_TENTATIVAS, agora, ESPERA_MAXIMA, ESPERA_INICIAL, i) for i in ids]
+            )
+            conexao.execute('COMMIT')
+
+    def enviar_pendentes(self) -> int:
+        """
+        Envia os lotes vencidos até a fila esvaziar ou um envio falhar.
+        Retorna quantas linhas foram enviadas.
+        """
+        if self.enviar is None:
+            return 0
+        enviadas = 0
+        while not self._parar.is_set():
+            lote = self._reservar_lote()
+            if lote is None:
+                break
+            tabela, ids, linhas = lote
+            try:
+                self.enviar(tabela, linhas)
+            except Exception as e:
+                self._falhar(ids, e)
+                break
+            self._concluir(ids)
+            enviadas += len(ids)
+        return enviadas
+
+    def esvaziar(self, timeout: float = None) -> bool:
+        """Envia na thread atual até não haver pendências vencidas (ou o timeout); True se a fila esvaziou."""
+        limite = None if timeout is None else time.monotonic() + timeout
+        while self.enviar_pendentes():
+            if limite is not None and time.monotonic() >= limite:
+                break
+        return self.situacao()['pendentes'] == 0
+
+    def reenviar_falhas(self):
+        """Devolve à fila as linhas que passaram de MAX_TENTATIVAS."""
+        with self._conectar() as conexao:
+            conexao.execute('UPDATE fila SET tentativas = 0, proximo_envio = ? WHERE proximo_envio IS NULL',
+                            (time.time(),))
+        self._acordar.set()
+
+    def situacao(self) -> dict:
+        """Linhas pendentes (aguardando envio ou nova tentativa), paradas por falha e o último erro."""
+        with self._conectar() as conexao:
+            pendentes, falhas = conexao.execute(
+                'SELECT COUNT(proximo_envio), COUNT(*) - COUNT(proximo_envio) FROM fila'
+            ).fetchone()
+            ultimo_erro = conexao.execute(
+                'SELECT ultimo_erro FROM fila WHERE ultimo_erro IS NOT NULL ORDER BY id DESC LIMIT 1'
+            ).fetchone()
+        return {'pendentes': pendentes, 'falhas': falhas, 'ultimo_erro': ultimo_erro[0] if ultimo_erro else None}
+
+    def iniciar(self):
+        """Inicia o worker (thread daemon), se ainda não estiver rodando."""
+        if self._thread is None or not self._thread.is_alive():
+            self._parar.clear()
+            self._thread = threading.Thread(target=self._trabalhar, name='fila_auditoria', daemon=True)
+            self._thread.start()
+        return self
+
+    def parar(self, timeout: float = None):
+        self._parar.set()
+        self._acordar.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _trabalhar(self):
+        while not self._parar.is_set():
+            try:
+                self.enviar_pendentes()
+            except sqlite3.Error:
+                pass  # arquivo ocupado/indisponível: tenta na próxima volta
+            # Acorda com um novo enfileiramento ou a cada `intervalo` (novas tentativas vencidas)
+            self._acordar.wait(self.intervalo)
+            self._acordar.clear()
+
+
+class _FechandoConexao:
+    """`with` que fecha a conexão sqlite3 no fim (o da própria conexão só encerra a transação)."""
+
+    def __init__(self, conexao: sqlite3.Connection):
+        self.conexao = conexao
+
+    def __enter__(self) -> sqlite3.Connection:
+        return self.conexao
+
+    def __exit__(self, tipo, valor, traceback):
+        if tipo is not None and self.conexao.in_transaction:
+            self.conexao.execute('ROLLBACK')
+        self.conexao.close()
@@ -5,10 +5,24 @@ Organizado por convenio + produto para maior modularidade.
 
 import pandas as pd
 import numpy as np
-import streamlit as st
 from datetime import datetime
 from dados_constantes import * # Certifique-se que este arquivo exista no seu projeto
 import re
+from registro_eventos import obter_registrador, usar_registrador
+from instrumentacao import obter_instrumentacao, usar_instrumentacao
+from memo_etapas import MemoEtapas, aplicar_diferencas, diferencas_colunas
+from plano_condicoes import CacheColunas, obter_cache_colunas, usar_cache_colunas, para_float64
+from conversao_datas import converter_datas
+from normalizacao_texto import normalizar_colunas
+from valores_unicos import avaliar_por_unicos
+from busca_palavras import mascara_contem_palavras
+from chaves_cpf import (
+    COLUNA_CHAVE_CPF, limpar_cpfs, codificar_cpfs, total_chaves, marcar_chaves, posicoes_maior_valor_por_chave
+)
+
+# Grupos de log detalhado (viram expanders na interface)
+GRUPO_LOG_GOVSP = "Logs de Processamento (Lógica Específica GOVSP)"
+GRUPO_LOG_FINALIZACAO = "Logs de Finalização (Cortes de Comissão e Margem)"
 
 # ============================================
 # FUNÇÕES AUXILIARES
@@ -16,8 +30,8 @@ import re
 
 def _aplicar_margem_seguranca(margem_disponivel_series: pd.Series, config: dict) -> pd.Series:
     """Aplica margem de segurança à série de margens."""
-    # Garante que a série seja numérica, tratando erros e NaNs
-    margem_numerica = pd.to_numeric(margem_disponivel_series, errors='coerce').fillna(0)
+    # Garante que a série seja numérica (float64), tratando erros e NaNs
+    margem_numerica = pd.Series(para_float64(margem_disponivel_series), index=margem_disponivel_series.index).fillna(0)
 
     if not config.get("usa_margem_seguranca"):
         return margem_numerica
@@ -39,196 +53,210 @@ def _aplicar_margem_seguranca(margem_disponivel_series: pd.Series, config: dict)
     return margem_numerica
 
 
-def _criar_mascara_condicional(base: pd.DataFrame, config: dict, tratado_col: str) -> pd.Series:
+def _coluna_numerica(base: pd.DataFrame, coluna: str) -> pd.Series:
     """
-    Cria uma máscara booleana com base nas condições dinâmicas da UI.
-    Lê as regras da 'config' e o operador lógico ('E' ou 'OU').
+    Coluna como float64, reaproveitando a conversão do CacheColunas ativo.
+    Margens já tipadas na leitura (ESQUEMA_COLUNAS) não passam por pd.to_numeric de novo.
     """
-    # Garante que a coluna 'tratado' exista
-    if tratado_col not in base.columns:
-        st.error(f"Erro interno: Coluna de controle '{tratado_col}' não encontrada.")
-        return pd.Series([False] * len(base), index=base.index)
-    # Garante que a coluna 'tratado' seja booleana
-    try:
-        base[tratado_col] = base[tratado_col].astype(bool)
-    except Exception:
-        st.warning(f"Não foi possível converter a coluna '{tratado_col}' para booleano. Assumindo 'False'.")
-        base[tratado_col] = False
-        
-    mascara_base = (base[tratado_col] == False)
-    
-    condicoes = config.get("condicoes", [])
-    if not condicoes:
-        return mascara_base
+    return pd.Series(obter_cache_colunas(base).numerica(coluna), index=base.index, name=coluna)
 
-    lista_de_mascaras = []
-    for c_idx, c in enumerate(condicoes):
-        try:
-            tipo = c.get("tipo")
-            mascara_condicao = pd.Series([False] * len(base), index=base.index) # Default False
-
-            if tipo == "coluna_coluna":
-                col1 = c.get('coluna1')
-                col2 = c.get('coluna2')
-                if col1 and col2 and col1 in base.columns and col2 in base.columns:
-                    num1 = pd.to_numeric(base[col1], errors='coerce')
-                    num2 = pd.to_numeric(base[col2], errors='coerce')
-                    m_num = (num1 == num2)
-                    m_str = (base[col1].fillna('').astype(str) == base[col2].fillna('').astype(str))
-                    mascara_condicao = m_num.fillna(False) | (~m_num.fillna(True) & m_str)
-                else:
-                    st.warning(f"Condição {c_idx+1} 'coluna_coluna' ignorada: Colunas '{col1}' ou '{col2}' inválidas ou não encontradas.")
-
-            elif tipo == "coluna_valor":
-                coluna_nome = c.get('coluna')
-                valor_str = c.get('valor')
-                operador = c.get('operador')
-
-                if not all([coluna_nome, valor_str is not None, operador]):
-                        st.warning(f"Condição {c_idx+1} 'coluna_valor' incompleta: {c}")
-                        continue
-
-                if coluna_nome not in base.columns:
-                    st.warning(f"Condição {c_idx+1} 'coluna_valor' ignorada: Coluna '{coluna_nome}' não encontrada.")
-                    continue
 
-                coluna = base[coluna_nome]
-                valor_str_cleaned = str(valor_str).strip()
-                valor_num = pd.to_numeric(valor_str_cleaned, errors='coerce')
-                col_num = pd.to_numeric(coluna, errors='coerce')
-
-                if not pd.isna(valor_num):
-                    if operador == '<': mascara_condicao = (col_num < valor_num)
-                    else: mascara_condicao = (col_num > valor_num)
-                else:
-                    try:
-                        valor_data = pd.to_datetime(valor_str_cleaned, errors='raise')
-                        col_data = pd.to_datetime(coluna, errors='coerce')
-                        if not col_data.isna().all():
-                            if operador == '<': mascara_condicao = (col_data < valor_data)
-                            else: mascara_condicao = (col_data > valor_data)
-                        else:
-                            col_str = coluna.astype(str)
-                            if operador == '<': mascara_condicao = (col_str < valor_str_cleaned)
-                            else: mascara_condicao = (col_str > valor_str_cleaned)
-                    except (ValueError, TypeError):
-                        col_str = coluna.astype(str)
-                        if operador == '<': mascara_condicao = (col_str < valor_str_cleaned)
-                        else: mascara_condicao = (col_str > valor_str_cleaned)
-
-                mascara_condicao = mascara_condicao.fillna(False)
-
-            elif tipo == "coluna_palavras":
-                coluna_nome = c.get('coluna')
-                palavras = c.get('palavras', [])
-
-                if not coluna_nome or not palavras:
-                    st.warning(f"Condição {c_idx+1} 'coluna_palavras' incompleta: {c}")
-                    continue
+class _TransacaoColunas:
+    """
+    Transação sobre as colunas que uma configuração de banco escreve.
+    Guarda apenas essas colunas (não a base inteira) e, se o processador falhar,
+    restaura os valores originais - substitui as cópias defensivas da base.
+    """
 
-                if coluna_nome not in base.columns:
-                    st.warning(f"Condição {c_idx+1} 'coluna_palavras' ignorada: Coluna '{coluna_nome}' não encontrada.")
-                    continue
+    def __init__(self, base: pd.DataFrame, colunas: list):
+        self.base = base
+        self.colunas = [col for col in colunas if col in base.columns]
+        self._originais = {}
 
-                palavras_escaped = [re.escape(str(p).strip()) for p in palavras if str(p).strip()]
-                if palavras_escaped:
-                    palavras_regex = '|'.join(palavras_escaped)
-                    mascara_condicao = base[coluna_nome].astype(str).str.contains(palavras_regex, case=False, na=False, regex=True)
+    def __enter__(self):
+        self._originais = {col: self.base[col].copy() for col in self.colunas}
+        return self
 
-            lista_de_mascaras.append(mascara_condicao)
+    def desfazer(self):
+        for col, valores in self._originais.items():
+            self.base[col] = valores
 
-        except Exception as e:
-            st.error(f"Erro inesperado ao processar condição #{c_idx+1} ({c.get('tipo')} '{c.get('coluna')}'): {e}")
-            lista_de_mascaras.append(pd.Series([False] * len(base), index=base.index))
+    def alteracoes(self) -> dict:
+        """O que mudou nas colunas da transação até agora (ver memo_etapas)."""
+        return diferencas_colunas(self._originais, self.base)
 
-    if not lista_de_mascaras:
-        return mascara_base if not config.get("condicoes") else pd.Series([False] * len(base), index=base.index)
+    def __exit__(self, tipo_excecao, excecao, tb):
+        if tipo_excecao is not None:
+            self.desfazer()
+        self._originais = {}
+        return False
 
-    operador_logico = config.get("operador_logico", "E (AND)")
-    try:
-        if operador_logico == "E (AND)":
-            mascara_combinada = pd.Series([True] * len(base), index=base.index)
-            for m in lista_de_mascaras:
-                mascara_combinada &= m
-        else: # "Ou (OR)"
-            mascara_combinada = pd.Series([False] * len(base), index=base.index)
-            for m in lista_de_mascaras:
-                mascara_combinada |= m
-    except Exception as e:
-        st.error(f"Erro ao combinar máscaras com '{operador_logico}': {e}")
-        return pd.Series([False] * len(base), index=base.index)
 
-    return mascara_base & mascara_combinada
+def _sufixo_produto(produto_da_config: str) -> str:
+    """Sufixo das colunas de saída de um produto (ex: 'Novo' -> 'emprestimo')."""
+    return {'Novo': 'emprestimo', 'Benefício': 'beneficio', 'Cartão': 'cartao'}.get(
+        produto_da_config, produto_da_config.lower().replace(" ", "_"))
+
+
+def _colunas_escritas_pela_config(produto_da_config: str, coluna_tratado: str) -> list:
+    """Colunas de saída que o processador de um produto pode alterar."""
+    sufixo = _sufixo_produto(produto_da_config)
+    colunas = [f'{tipo}_{sufixo}' for tipo in ['valor_liberado', 'valor_parcela', 'comissao', 'banco', 'prazo']]
+    return [coluna_tratado] + colunas
+
+
+def _estatisticas_config(base: pd.DataFrame, config: dict, produto_da_config: str,
+                         coluna_tratado: str, tratado_antes: np.ndarray) -> dict:
+    """
+    Estatísticas de uma config a partir dos bitmaps da coluna 'tratado' antes e
+    depois do processador: as linhas aplicadas são as que passaram a ficar tratadas.
+    - registros_afetados: CPFs distintos tratados agora que não estavam tratados antes
+    - linhas_atendidas: linhas aplicadas pela config
+    - linhas_precificadas: linhas aplicadas com valor liberado > 0
+    - comissao_total: soma da comissão calculada nas linhas aplicadas
+    """
+    estatisticas = {
+        'banco': config.get('banco'),
+        'produto': produto_da_config,
+        'registros_afetados': 0,
+        'linhas_atendidas': 0,
+        'linhas_precificadas': 0,
+        'comissao_total': 0.0,
+    }
+    if tratado_antes is None or not pd.api.types.is_bool_dtype(base[coluna_tratado]) \
+            or len(tratado_antes) != len(base):
+        obter_registrador().aviso(f"Coluna {coluna_tratado} não é booleana para stats pós.")
+        return estatisticas
+
+    tratado_depois = base[coluna_tratado].to_numpy(dtype=bool)
+    aplicadas = tratado_depois & ~tratado_antes
+    estatisticas['linhas_atendidas'] = int(aplicadas.sum())
+
+    if COLUNA_CHAVE_CPF in base.columns:
+        chaves = base[COLUNA_CHAVE_CPF].to_numpy()
+        n_chaves = total_chaves(chaves)
+        cpfs_antes = marcar_chaves(chaves, tratado_antes, n_chaves)
+        cpfs_depois = marcar_chaves(chaves, tratado_depois, n_chaves)
+        estatisticas['registros_afetados'] = int((cpfs_depois & ~cpfs_antes).sum())
+    else:
+        estatisticas['registros_afetados'] = -1
+
+    sufixo = _sufixo_produto(produto_da_config)
+    if f'valor_liberado_{sufixo}' in base.columns:
+        valor_liberado = _coluna_numerica(base, f'valor_liberado_{sufixo}').to_numpy()
+        estatisticas['linhas_precificadas'] = int((aplicadas & (valor_liberado > 0)).sum())
+    if f'comissao_{sufixo}' in base.columns:
+        comissao = _coluna_numerica(base, f'comissao_{sufixo}').to_numpy()
+        estatisticas['comissao_total'] = round(float(np.nansum(comissao[aplicadas])), 2)
+    return estatisticas
+
+
+def _criar_mascara_condicional(base: pd.DataFrame, config: dict, tratado_col: str) -> np.ndarray:
+    """
+    Cria uma máscara booleana (array NumPy) com base nas condições dinâmicas da UI.
+    Lê as regras da 'config' e o operador lógico ('E' ou 'OU'). As condições são
+    compiladas uma vez por execução e as colunas convertidas ficam no CacheColunas
+    ativo (ver plano_condicoes), compartilhado entre as configurações.
+    """
+    # Garante que a coluna 'tratado' exista
+    if tratado_col not in base.columns:
+        obter_registrador().erro(f"Erro interno: Coluna de controle '{tratado_col}' não encontrada.")
+        return np.zeros(len(base), dtype=bool)
+    # Garante que a coluna 'tratado' seja booleana
+    if not pd.api.types.is_bool_dtype(base[tratado_col]):
+        try:
+            base[tratado_col] = base[tratado_col].astype(bool)
+        except Exception:
+            obter_registrador().aviso(f"Não foi possível converter a coluna '{tratado_col}' para booleano. Assumindo 'False'.")
+            base[tratado_col] = False
+        
+    mascara_base = ~base[tratado_col].to_numpy(dtype=bool)
+
+    cache = obter_cache_colunas(base)
+    return mascara_base & cache.plano(config).avaliar(cache)
 
 
 # ============================================
 # PRÉ-PROCESSAMENTO
 # ============================================
 
+def mascara_exclusao(coluna: pd.Series, valores_exatos: list, palavras: list, ignorar_acentos: bool = False) -> np.ndarray:
+    """
+    Linhas cujo valor está em `valores_exatos` ou contém alguma das `palavras`
+    (sem diferenciar maiúsculas). Avaliado uma vez por valor distinto da coluna.
+    """
+    palavras = [str(p) for p in (palavras or []) if str(p)]
+    if not valores_exatos and not palavras:
+        return np.zeros(len(coluna), dtype=bool)
+
+    def avaliar(valores: pd.Series) -> np.ndarray:
+        excluir = np.zeros(len(valores), dtype=bool)
+        if valores_exatos:
+            excluir |= valores.isin(valores_exatos).to_numpy()
+        if palavras:
+            excluir |= mascara_contem_palavras(valores, palavras, ignorar_acentos)
+        return excluir
+    return avaliar_por_unicos(coluna, avaliar)
+
+
 def _preprocessar_base(df: pd.DataFrame, params: dict) -> pd.DataFrame:
-    """Normaliza colunas, aplica filtros gerais e inicializa colunas."""
+    """
+    Normaliza colunas, aplica filtros gerais e inicializa colunas.
+    Os filtros de exclusão e idade são acumulados em uma única máscara e a base de
+    trabalho é materializada uma só vez; `df` não é alterado.
+    """
     if df is None or not isinstance(df, pd.DataFrame):
-        st.error("Erro Crítico: Dados de entrada inválidos para _preprocessar_base.")
+        obter_registrador().erro("Erro Crítico: Dados de entrada inválidos para _preprocessar_base.")
         return pd.DataFrame()
-    base = df.copy()
+
+    manter = np.ones(len(df), dtype=bool)
+
+    try:
+        ignorar_acentos = params.get('palavras_ignorar_acentos', False)
+        if 'Lotacao' in df.columns:
+            manter &= ~mascara_exclusao(df['Lotacao'], params.get('selecao_lotacao', []),
+                                         params.get('selecao_lotacao_palavras', []), ignorar_acentos)
+        if 'Vinculo_Servidor' in df.columns:
+            manter &= ~mascara_exclusao(df['Vinculo_Servidor'], params.get('selecao_vinculos', []),
+                                         params.get('selecao_vinculos_palavras', []), ignorar_acentos)
+    except Exception as e:
+        obter_registrador().erro(f"Erro nos filtros de exclusão: {e}")
+        return pd.DataFrame()
+
+    if 'Data_Nascimento' in df.columns and not df['Data_Nascimento'].isna().all():
+        data_limite_idade_obj = params.get('data_limite_idade')
+        if data_limite_idade_obj:
+            try:
+                # Só para o filtro: a coluna continua com o texto original (conversor memoizado)
+                datas_nascimento = converter_datas(df['Data_Nascimento'][manter])
+                data_limite_dt64 = pd.Timestamp(data_limite_idade_obj)
+                manter[manter] = ((~datas_nascimento.isna()) & (datas_nascimento >= data_limite_dt64)).to_numpy()
+            except Exception as e:
+                obter_registrador().erro(f"Erro ao aplicar filtro de idade: {e}. Verifique formatos em 'Data_Nascimento'.")
+
+    # Única cópia da base: a partir daqui todas as etapas escrevem nela no lugar
+    base = df.take(np.flatnonzero(manter)) if not manter.all() else df.copy()
 
     colunas_essenciais = ['Nome_Cliente', 'CPF', 'Lotacao', 'Vinculo_Servidor', 'Data_Nascimento',
                          'MG_Emprestimo_Disponivel', 'MG_Beneficio_Saque_Total', 'MG_Beneficio_Saque_Disponivel',
                          'MG_Cartao_Total', 'MG_Cartao_Disponivel', 'Matricula']
     for col in colunas_essenciais:
         if col not in base.columns:
-            st.warning(f"Coluna essencial '{col}' não encontrada. Criando vazia.")
+            obter_registrador().aviso(f"Coluna essencial '{col}' não encontrada. Criando vazia.")
             base[col] = pd.NA
 
     try:
-        if 'Nome_Cliente' in base.columns:
-            base['Nome_Cliente'] = base['Nome_Cliente'].apply(lambda x: x.title() if pd.notna(x) and isinstance(x, str) else x)
+        # Nome, lotação, vínculo e secretaria conforme NORMALIZACAO_TEXTO (dados_constantes)
+        normalizar_colunas(base)
         if 'CPF' in base.columns:
-            base['CPF'] = base['CPF'].astype(str).str.replace(r"[.\-]", "", regex=True).str.strip().replace(['', 'nan', 'None'], pd.NA)
-    except Exception as e:
-        st.error(f"Erro na limpeza de Nome/CPF: {e}")
-        return pd.DataFrame()
-
-    try:
-        if 'Lotacao' in base.columns:
-            selecao_lotacao_exata = params.get('selecao_lotacao', [])
-            if selecao_lotacao_exata:
-                base = base[~base['Lotacao'].astype(str).isin(selecao_lotacao_exata)]
-            selecao_lotacao_palavras = params.get('selecao_lotacao_palavras', [])
-            if selecao_lotacao_palavras:
-                lotacao_regex = '|'.join([re.escape(str(p)) for p in selecao_lotacao_palavras if str(p)])
-                if lotacao_regex:
-                    mascara_lotacao = base['Lotacao'].astype(str).str.contains(lotacao_regex, case=False, na=False, regex=True)
-                    base = base[~mascara_lotacao]
-
-        if 'Vinculo_Servidor' in base.columns:
-            selecao_vinculos_exatos = params.get('selecao_vinculos', [])
-            if selecao_vinculos_exatos:
-                base = base[~base['Vinculo_Servidor'].astype(str).isin(selecao_vinculos_exatos)]
-            selecao_vinculos_palavras = params.get('selecao_vinculos_palavras', [])
-            if selecao_vinculos_palavras:
-                vinculo_regex = '|'.join([re.escape(str(p)) for p in selecao_vinculos_palavras if str(p)])
-                if vinculo_regex:
-                    mascara_vinculo = base['Vinculo_Servidor'].astype(str).str.contains(vinculo_regex, case=False, na=False, regex=True)
-                    base = base[~mascara_vinculo]
+            base['CPF'] = limpar_cpfs(base['CPF'])
+            # Chave inteira do cliente: usada na deduplicação e nas estatísticas
+            base[COLUNA_CHAVE_CPF] = codificar_cpfs(base['CPF'])
     except Exception as e:
-        st.error(f"Erro nos filtros de exclusão: {e}")
+        obter_registrador().erro(f"Erro na limpeza de Nome/CPF: {e}")
         return pd.DataFrame()
 
-    if 'Data_Nascimento' in base.columns and not base['Data_Nascimento'].isna().all():
-        data_limite_idade_obj = params.get('data_limite_idade')
-        if data_limite_idade_obj:
-            try:
-                datas_nascimento = pd.to_datetime(base["Data_Nascimento"], dayfirst=True, errors='coerce')
-                mask_falha1 = datas_nascimento.isna()
-                if mask_falha1.any():
-                        datas_nascimento.loc[mask_falha1] = pd.to_datetime(base.loc[mask_falha1, "Data_Nascimento"], dayfirst=True, errors='coerce', format='%d/%m/%Y')
-                
-                data_limite_dt64 = pd.Timestamp(data_limite_idade_obj)
-                base = base[(~datas_nascimento.isna()) & (datas_nascimento >= data_limite_dt64)]
-            except Exception as e:
-                st.error(f"Erro ao aplicar filtro de idade: {e}. Verifique formatos em 'Data_Nascimento'.")
-
+    # Colunas de saída pré-alocadas: os processadores só escrevem nelas
     base['tratado'] = False
     base['tratado_beneficio'] = False
     base['tratado_cartao'] = False
@@ -247,7 +275,7 @@ def _preprocessar_base(df: pd.DataFrame, params: dict) -> pd.DataFrame:
     # Garante colunas GOVSP
     for col in ['MG_Beneficio_Saque_Total', 'MG_Beneficio_Saque_Disponivel', 'MG_Cartao_Total', 'MG_Cartao_Disponivel', 'Matricula']:
         if col not in base.columns:
-            st.warning(f"Coluna GOVSP '{col}' não encontrada. Criando vazia.")
+            obter_registrador().aviso(f"Coluna GOVSP '{col}' não encontrada. Criando vazia.")
             base[col] = pd.NA
 
     return base
@@ -257,85 +285,75 @@ def _preprocessar_base(df: pd.DataFrame, params: dict) -> pd.DataFrame:
 # FUNÇÕES ESPECÍFICAS POR CONVENIO + PRODUTO
 # ============================================
 
+# Os processadores recebem a base de trabalho e escrevem os resultados nela
+# mesma (no lugar), retornando a própria base. Em caso de erro, propagam a
+# exceção: aplicar_filtros desfaz as escritas da configuração (_TransacaoColunas).
+
 # --- GOVSP ---
 def govsp_novo(base: pd.DataFrame, params: dict, config: dict) -> pd.DataFrame:
     try:
-        base_calc = base.copy()
-        if 'MG_Emprestimo_Disponivel' in base_calc.columns:
-            base_calc['MG_Emprestimo_Disponivel'] = pd.to_numeric(base_calc['MG_Emprestimo_Disponivel'], errors='coerce')
-            base_filtrada = base_calc.loc[(base_calc['MG_Emprestimo_Disponivel'] >= 0).fillna(False)]
+        mascara_margem = None
+        if 'MG_Emprestimo_Disponivel' in base.columns:
+            # Só calcula para quem tem margem de empréstimo >= 0
+            mascara_margem = _coluna_numerica(base, 'MG_Emprestimo_Disponivel') >= 0
         else:
-            st.warning("GOVSP Novo: Coluna 'MG_Emprestimo_Disponivel' não encontrada.")
-            base_filtrada = base_calc
-        return _aplicar_regras_emprestimo(base_filtrada, config)
+            obter_registrador().aviso("GOVSP Novo: Coluna 'MG_Emprestimo_Disponivel' não encontrada.")
+        return _aplicar_regras_emprestimo(base, config, mascara_margem)
     except Exception as e:
-        st.error(f"Erro em govsp_novo: {e}")
-        return base
+        obter_registrador().erro(f"Erro em govsp_novo: {e}")
+        raise
 
 def govsp_beneficio(base: pd.DataFrame, params: dict, config: dict) -> pd.DataFrame:
     """ Lógica GOVSP específica para Benefício """
     try:
-        base_calc = base.copy()
-        base_calc['MG_Beneficio_Saque_Total'] = pd.to_numeric(base_calc['MG_Beneficio_Saque_Total'], errors='coerce')
-        base_calc['MG_Beneficio_Saque_Disponivel'] = pd.to_numeric(base_calc['MG_Beneficio_Saque_Disponivel'], errors='coerce')
-
         # Chama a função genérica (que usa a UI)
-        base_calc = _aplicar_regras_beneficio(base_calc, config)
+        _aplicar_regras_beneficio(base, config)
 
         # Aplica regra GOVSP: Zera valor se já usou margem
-        mascara_usou_beneficio = (base_calc['MG_Beneficio_Saque_Total'] > base_calc['MG_Beneficio_Saque_Disponivel']).fillna(False)
+        mascara_usou_beneficio = _coluna_numerica(base, 'MG_Beneficio_Saque_Total') > _coluna_numerica(base, 'MG_Beneficio_Saque_Disponivel')
         # Zera apenas para quem foi TRATADO pela função acima E já usou a margem
-        indices_para_zerar = base_calc[mascara_usou_beneficio & (base_calc['tratado_beneficio'] == True)].index
+        mascara_zerar = mascara_usou_beneficio & (base['tratado_beneficio'] == True)
 
-        if not indices_para_zerar.empty:
-            base_calc.loc[indices_para_zerar, 'valor_liberado_beneficio'] = 0.0
-            base_calc.loc[indices_para_zerar, 'comissao_beneficio'] = 0.0
-            base_calc.loc[indices_para_zerar, 'valor_parcela_beneficio'] = 0.0
+        if mascara_zerar.any():
+            base.loc[mascara_zerar, ['valor_liberado_beneficio', 'comissao_beneficio', 'valor_parcela_beneficio']] = 0.0
 
-        return base_calc
-    except Exception as e:
-        st.error(f"Erro em govsp_beneficio: {e}")
         return base
+    except Exception as e:
+        obter_registrador().erro(f"Erro em govsp_beneficio: {e}")
+        raise
 
 def govsp_cartao(base: pd.DataFrame, params: dict, config: dict) -> pd.DataFrame:
     """ Lógica GOVSP específica para Cartão """
     try:
-        base_calc = base.copy()
-        base_calc['MG_Cartao_Total'] = pd.to_numeric(base_calc['MG_Cartao_Total'], errors='coerce')
-        base_calc['MG_Cartao_Disponivel'] = pd.to_numeric(base_calc['MG_Cartao_Disponivel'], errors='coerce')
-        
         # Chama a função genérica (que usa a UI)
-        base_calc = _aplicar_regras_cartao(base_calc, config)
+        _aplicar_regras_cartao(base, config)
 
         # Aplica regra GOVSP: Zera valor se já usou margem
-        mascara_usou_cartao = (base_calc['MG_Cartao_Total'] > base_calc['MG_Cartao_Disponivel']).fillna(False)
+        mascara_usou_cartao = _coluna_numerica(base, 'MG_Cartao_Total') > _coluna_numerica(base, 'MG_Cartao_Disponivel')
         # Zera apenas para quem foi TRATADO pela função acima E já usou a margem
-        indices_para_zerar = base_calc[mascara_usou_cartao & (base_calc['tratado_cartao'] == True)].index
+        mascara_zerar = mascara_usou_cartao & (base['tratado_cartao'] == True)
 
-        if not indices_para_zerar.empty:
-            base_calc.loc[indices_para_zerar, 'valor_liberado_cartao'] = 0.0
-            base_calc.loc[indices_para_zerar, 'comissao_cartao'] = 0.0
-            base_calc.loc[indices_para_zerar, 'valor_parcela_cartao'] = 0.0
+        if mascara_zerar.any():
+            base.loc[mascara_zerar, ['valor_liberado_cartao', 'comissao_cartao', 'valor_parcela_cartao']] = 0.0
 
-        return base_calc
-    except Exception as e:
-        st.error(f"Erro em govsp_cartao: {e}")
         return base
+    except Exception as e:
+        obter_registrador().erro(f"Erro em govsp_cartao: {e}")
+        raise
 
 # --- GOVMT ---
 def govmt_novo(base: pd.DataFrame, params: dict, config: dict) -> pd.DataFrame:
     try:
-        base_calc = base.copy()
-        if 'MG_Compulsoria_Disponivel' in base_calc.columns:
-            base_calc['MG_Compulsoria_Disponivel'] = pd.to_numeric(base_calc['MG_Compulsoria_Disponivel'], errors='coerce')
-            base_filtrada = base_calc.loc[(base_calc['MG_Compulsoria_Disponivel'] >= 0).fillna(False)]
+        mascara_margem = None
+        if 'MG_Compulsoria_Disponivel' in base.columns:
+            # Só calcula para quem tem margem compulsória >= 0
+            mascara_margem = _coluna_numerica(base, 'MG_Compulsoria_Disponivel') >= 0
         else:
-            st.warning("GOVMT Novo: Coluna 'MG_Compulsoria_Disponivel' não encontrada.")
-            base_filtrada = base_calc
-        return _aplicar_regras_emprestimo(base_filtrada, config)
+            obter_registrador().aviso("GOVMT Novo: Coluna 'MG_Compulsoria_Disponivel' não encontrada.")
+        return _aplicar_regras_emprestimo(base, config, mascara_margem)
     except Exception as e:
-        st.error(f"Erro em govmt_novo: {e}")
-        return base
+        obter_registrador().erro(f"Erro em govmt_novo: {e}")
+        raise
 
 # ============================================
 # FUNÇÕES GENÉRICAS DE PROCESSAMENTO
@@ -345,146 +363,135 @@ def generico_novo(base: pd.DataFrame, params: dict, config: dict) -> pd.DataFram
     try:
         return _aplicar_regras_emprestimo(base, config)
     except Exception as e:
-        st.error(f"Erro em generico_novo: {e}")
-        return base.copy()
+        obter_registrador().erro(f"Erro em generico_novo: {e}")
+        raise
 
 def generico_beneficio(base: pd.DataFrame, params: dict, config: dict) -> pd.DataFrame:
     try:
         return _aplicar_regras_beneficio(base, config)
     except Exception as e:
-        st.error(f"Erro em generico_beneficio: {e}")
-        return base.copy()
+        obter_registrador().erro(f"Erro em generico_beneficio: {e}")
+        raise
 
 def generico_cartao(base: pd.DataFrame, params: dict, config: dict) -> pd.DataFrame:
     try:
         return _aplicar_regras_cartao(base, config)
     except Exception as e:
-        st.error(f"Erro em generico_cartao: {e}")
-        return base.copy()
+        obter_registrador().erro(f"Erro em generico_cartao: {e}")
+        raise
 
 
 # ============================================
 # FUNÇÕES GENÉRICAS DE CÁLCULO POR PRODUTO
 # ============================================
 
-def _aplicar_regras_emprestimo(base: pd.DataFrame, config: dict) -> pd.DataFrame:
-    """Aplica cálculo de empréstimo com base na máscara condicional da UI."""
-    try:
-        base_calc = base.copy()
-        mask = _criar_mascara_condicional(base_calc, config, 'tratado')
-        indices_para_calcular = base_calc[mask].index
-
-        if not indices_para_calcular.empty:
-            if 'MG_Emprestimo_Disponivel' not in base_calc.columns:
-                st.error("Erro: Coluna 'MG_Emprestimo_Disponivel' não encontrada.")
-                return base
-            margem_ajustada = _aplicar_margem_seguranca(base_calc.loc[indices_para_calcular, 'MG_Emprestimo_Disponivel'], config)
-            
-            # --- CORREÇÃO CÁLCULO VALOR LIBERADO: MARGEM * COEF ---
-            valor_liberado = (margem_ajustada * config.get('coeficiente', 1)).round(2)
-            # ------------------------------------
-            valor_parcela = margem_ajustada.round(2)
-            comissao = (valor_liberado * (config.get('comissao',0)/100)).round(2)
-
-            base_calc.loc[indices_para_calcular, 'valor_liberado_emprestimo'] = valor_liberado.fillna(0)
-            base_calc.loc[indices_para_calcular, 'valor_parcela_emprestimo'] = valor_parcela.fillna(0)
-            base_calc.loc[indices_para_calcular, 'comissao_emprestimo'] = comissao.fillna(0)
-            base_calc.loc[indices_para_calcular, 'banco_emprestimo'] = config.get('banco')
-            base_calc.loc[indices_para_calcular, 'prazo_emprestimo'] = config.get('parcelas')
-            base_calc.loc[indices_para_calcular, 'tratado'] = True
-        return base_calc
-    except Exception as e:
-        st.error(f"Erro em _aplicar_regras_emprestimo: {e}")
-        return base
+def _aplicar_regras_emprestimo(base: pd.DataFrame, config: dict, mascara_elegivel: pd.Series = None) -> pd.DataFrame:
+    """
+    Aplica cálculo de empréstimo (no lugar) com base na máscara condicional da UI.
+    `mascara_elegivel` restringe as linhas calculáveis (ex: margem >= 0 no GOVSP).
+    """
+    mask = _criar_mascara_condicional(base, config, 'tratado')
+    if mascara_elegivel is not None:
+        mask &= np.asarray(mascara_elegivel, dtype=bool)
+    indices_para_calcular = base.index[mask]
+
+    if not indices_para_calcular.empty:
+        if 'MG_Emprestimo_Disponivel' not in base.columns:
+            obter_registrador().erro("Erro: Coluna 'MG_Emprestimo_Disponivel' não encontrada.")
+            return base
+        margem_ajustada = _aplicar_margem_seguranca(_coluna_numerica(base, 'MG_Emprestimo_Disponivel').loc[indices_para_calcular], config)
+        
+        # --- CORREÇÃO CÁLCULO VALOR LIBERADO: MARGEM * COEF ---
+        valor_liberado = (margem_ajustada * config.get('coeficiente', 1)).round(2)
+        # ------------------------------------
+        valor_parcela = margem_ajustada.round(2)
+        comissao = (valor_liberado * (config.get('comissao',0)/100)).round(2)
+
+        base.loc[indices_para_calcular, 'valor_liberado_emprestimo'] = valor_liberado.fillna(0)
+        base.loc[indices_para_calcular, 'valor_parcela_emprestimo'] = valor_parcela.fillna(0)
+        base.loc[indices_para_calcular, 'comissao_emprestimo'] = comissao.fillna(0)
+        base.loc[indices_para_calcular, 'banco_emprestimo'] = config.get('banco')
+        base.loc[indices_para_calcular, 'prazo_emprestimo'] = config.get('parcelas')
+        base.loc[indices_para_calcular, 'tratado'] = True
+    return base
 
 def _aplicar_regras_beneficio(base: pd.DataFrame, config: dict) -> pd.DataFrame:
-    """Aplica cálculo de benefício com base na máscara condicional da UI."""
-    try:
-        base_calc = base.copy()
-        
-        # --- INÍCIO DA MODIFICAÇÃO ---
-        if 'MG_Beneficio_Saque_Disponivel' not in base_calc.columns:
-                st.error("Erro: Coluna 'MG_Beneficio_Saque_Disponivel' não encontrada.")
-                return base
-        
-        # Garante que a coluna de margem seja numérica
-        base_calc['MG_Beneficio_Saque_Disponivel'] = pd.to_numeric(base_calc['MG_Beneficio_Saque_Disponivel'], errors='coerce')
+    """Aplica cálculo de benefício (no lugar) com base na máscara condicional da UI."""
+    # --- INÍCIO DA MODIFICAÇÃO ---
+    if 'MG_Beneficio_Saque_Disponivel' not in base.columns:
+            obter_registrador().erro("Erro: Coluna 'MG_Beneficio_Saque_Disponivel' não encontrada.")
+            return base
+    
+    # Margem como número (float64), sem reconverter se a base já veio tipada
+    margem_beneficio = _coluna_numerica(base, 'MG_Beneficio_Saque_Disponivel')
 
-        mask_condicional = _criar_mascara_condicional(base_calc, config, 'tratado_beneficio')
-        
-        # Pega a margem mínima da config (a UI salva como 'margem_minima_cartao' para ambos)
-        margem_min_beneficio = config.get('margem_minima_cartao', 0)
-        
-        # Cria a máscara de margem mínima
-        mask_margem_minima = (base_calc['MG_Beneficio_Saque_Disponivel'] >= margem_min_beneficio).fillna(False)
-        
-        # Combina as máscaras
-        mask = mask_condicional & mask_margem_minima
-        indices_para_calcular = base_calc[mask].index
-        # --- FIM DA MODIFICAÇÃO ---
-
-        if not indices_para_calcular.empty:
-            # Coluna já verificada e convertida acima
-            margem_ajustada = _aplicar_margem_seguranca(base_calc.loc[indices_para_calcular, 'MG_Beneficio_Saque_Disponivel'], config)
-
-            # --- CORREÇÃO CÁLCULO VALOR LIBERADO: MARGEM * COEF ---
-            valor_liberado = (margem_ajustada * config.get('coeficiente', 1)).round(2)
-            # ------------------------------------
-            coef_parcela = config.get('coeficiente_parcela', 1)
-            if pd.isna(coef_parcela) or coef_parcela == 0: coef_parcela = 1
-            valor_parcela = (valor_liberado / coef_parcela).round(2) if coef_parcela != 0 else 0.0
-            comissao = (valor_liberado * (config.get('comissao',0)/100)).round(2)
-
-            base_calc.loc[indices_para_calcular, 'valor_liberado_beneficio'] = valor_liberado.fillna(0)
-            base_calc.loc[indices_para_calcular, 'valor_parcela_beneficio'] = valor_parcela.fillna(0)
-            base_calc.loc[indices_para_calcular, 'comissao_beneficio'] = comissao.fillna(0)
-            base_calc.loc[indices_para_calcular, 'banco_beneficio'] = config.get('banco')
-            base_calc.loc[indices_para_calcular, 'prazo_beneficio'] = config.get('parcelas')
-            base_calc.loc[indices_para_calcular, 'tratado_beneficio'] = True
-        return base_calc
-    except Exception as e:
-        st.error(f"Erro em _aplicar_regras_beneficio: {e}")
-        return base
+    mask_condicional = _criar_mascara_condicional(base, config, 'tratado_beneficio')
+    
+    # Pega a margem mínima da config (a UI salva como 'margem_minima_cartao' para ambos)
+    margem_min_beneficio = config.get('margem_minima_cartao', 0)
+    
+    # Cria a máscara de margem mínima
+    mask_margem_minima = margem_beneficio >= margem_min_beneficio
+    
+    # Combina as máscaras
+    mask = mask_condicional & mask_margem_minima.to_numpy(dtype=bool)
+    indices_para_calcular = base.index[mask]
+    # --- FIM DA MODIFICAÇÃO ---
+
+    if not indices_para_calcular.empty:
+        # Coluna já verificada e convertida acima
+        margem_ajustada = _aplicar_margem_seguranca(margem_beneficio.loc[indices_para_calcular], config)
+
+        # --- CORREÇÃO CÁLCULO VALOR LIBERADO: MARGEM * COEF ---
+        valor_liberado = (margem_ajustada * config.get('coeficiente', 1)).round(2)
+        # ------------------------------------
+        coef_parcela = config.get('coeficiente_parcela', 1)
+        if pd.isna(coef_parcela) or coef_parcela == 0: coef_parcela = 1
+        valor_parcela = (valor_liberado / coef_parcela).round(2) if coef_parcela != 0 else 0.0
+        comissao = (valor_liberado * (config.get('comissao',0)/100)).round(2)
+
+        base.loc[indices_para_calcular, 'valor_liberado_beneficio'] = valor_liberado.fillna(0)
+        base.loc[indices_para_calcular, 'valor_parcela_beneficio'] = valor_parcela.fillna(0)
+        base.loc[indices_para_calcular, 'comissao_beneficio'] = comissao.fillna(0)
+        base.loc[indices_para_calcular, 'banco_beneficio'] = config.get('banco')
+        base.loc[indices_para_calcular, 'prazo_beneficio'] = config.get('parcelas')
+        base.loc[indices_para_calcular, 'tratado_beneficio'] = True
+    return base
 
 def _aplicar_regras_cartao(base: pd.DataFrame, config: dict) -> pd.DataFrame:
-    """Aplica cálculo de cartão com base na máscara condicional da UI."""
-    try:
-        base_calc = base.copy()
-        if 'MG_Cartao_Disponivel' not in base.columns:
-            st.error("Erro: Coluna 'MG_Cartao_Disponivel' não encontrada.")
-            return base
-
-        base_calc['MG_Cartao_Disponivel'] = pd.to_numeric(base_calc['MG_Cartao_Disponivel'], errors='coerce')
-
-        mask_condicional = _criar_mascara_condicional(base_calc, config, 'tratado_cartao')
-        margem_min_cartao = config.get('margem_minima_cartao', 0)
-        mask_margem_minima = (base_calc['MG_Cartao_Disponivel'] >= margem_min_cartao).fillna(False)
-        mask = mask_condicional & mask_margem_minima
-        indices_para_calcular = base_calc[mask].index
-
-        if not indices_para_calcular.empty:
-            margem_ajustada = _aplicar_margem_seguranca(base_calc.loc[indices_para_calcular, 'MG_Cartao_Disponivel'], config)
-
-            # --- CÁLCULO VALOR LIBERADO (JÁ ESTAVA CORRETO COMO *) ---
-            valor_liberado = (margem_ajustada * config.get('coeficiente', 1)).round(2)
-            # -----------------------------------------------------
-            coef_parcela = config.get('coeficiente_parcela', 1)
-            if pd.isna(coef_parcela) or coef_parcela == 0: coef_parcela = 1
-            valor_parcela = (valor_liberado / coef_parcela).round(2) if coef_parcela != 0 else 0.0
-            comissao = (valor_liberado * (config.get('comissao',0)/100)).round(2)
-
-            base_calc.loc[indices_para_calcular, 'valor_liberado_cartao'] = valor_liberado.fillna(0)
-            base_calc.loc[indices_para_calcular, 'valor_parcela_cartao'] = valor_parcela.fillna(0)
-            base_calc.loc[indices_para_calcular, 'comissao_cartao'] = comissao.fillna(0)
-            base_calc.loc[indices_para_calcular, 'banco_cartao'] = config.get('banco')
-            base_calc.loc[indices_para_calcular, 'prazo_cartao'] = config.get('parcelas')
-            base_calc.loc[indices_para_calcular, 'tratado_cartao'] = True
-        
-        return base_calc
-    except Exception as e:
-        st.error(f"Erro em _aplicar_regras_cartao: {e}")
+    """Aplica cálculo de cartão (no lugar) com base na máscara condicional da UI."""
+    if 'MG_Cartao_Disponivel' not in base.columns:
+        obter_registrador().erro("Erro: Coluna 'MG_Cartao_Disponivel' não encontrada.")
         return base
 
+    margem_cartao = _coluna_numerica(base, 'MG_Cartao_Disponivel')
+
+    mask_condicional = _criar_mascara_condicional(base, config, 'tratado_cartao')
+    margem_min_cartao = config.get('margem_minima_cartao', 0)
+    mask_margem_minima = margem_cartao >= margem_min_cartao
+    mask = mask_condicional & mask_margem_minima.to_numpy(dtype=bool)
+    indices_para_calcular = base.index[mask]
+
+    if not indices_para_calcular.empty:
+        margem_ajustada = _aplicar_margem_seguranca(margem_cartao.loc[indices_para_calcular], config)
+
+        # --- CÁLCULO VALOR LIBERADO (JÁ ESTAVA CORRETO COMO *) ---
+        valor_liberado = (margem_ajustada * config.get('coeficiente', 1)).round(2)
+        # -----------------------------------------------------
+        coef_parcela = config.get('coeficiente_parcela', 1)
+        if pd.isna(coef_parcela) or coef_parcela == 0: coef_parcela = 1
+        valor_parcela = (valor_liberado / coef_parcela).round(2) if coef_parcela != 0 else 0.0
+        comissao = (valor_liberado * (config.get('comissao',0)/100)).round(2)
+
+        base.loc[indices_para_calcular, 'valor_liberado_cartao'] = valor_liberado.fillna(0)
+        base.loc[indices_para_calcular, 'valor_parcela_cartao'] = valor_parcela.fillna(0)
+        base.loc[indices_para_calcular, 'comissao_cartao'] = comissao.fillna(0)
+        base.loc[indices_para_calcular, 'banco_cartao'] = config.get('banco')
+        base.loc[indices_para_calcular, 'prazo_cartao'] = config.get('parcelas')
+        base.loc[indices_para_calcular, 'tratado_cartao'] = True
+    
+    return base
+
 # ============================================
 # MAPEAMENTO DE PROCESSADORES
 # ============================================
@@ -508,14 +515,16 @@ PROCESSADORES_GENERICOS = {
 # ============================================
 
 def _finalizar_base(df: pd.DataFrame, params: dict) -> pd.DataFrame:
+    """Cortes finais, deduplicação e montagem do arquivo. Altera `df` (a base de trabalho)."""
+    registrador = obter_registrador()
     if df is None or not isinstance(df, pd.DataFrame):
-        st.error("Erro interno: _finalizar_base recebeu dados inválidos.")
+        registrador.erro("Erro interno: _finalizar_base recebeu dados inválidos.")
         return pd.DataFrame()
     if df.empty:
-        st.info("Base vazia antes da finalização.")
+        registrador.info("Base vazia antes da finalização.")
         return pd.DataFrame()
         
-    base = df.copy()
+    base = df
     
     # Garante colunas de valor/comissão
     for prod in ['emprestimo', 'beneficio', 'cartao']:
@@ -532,82 +541,73 @@ def _finalizar_base(df: pd.DataFrame, params: dict) -> pd.DataFrame:
         base = base.loc[~mascara_todos_zero_ou_neg]
 
         if base.empty:
-            st.warning("Nenhum cliente com valor liberado > 0 após aplicar regras.")
+            registrador.aviso("Nenhum cliente com valor liberado > 0 após aplicar regras.")
             return pd.DataFrame()
     except Exception as e:
-        st.error(f"Erro ao remover linhas com valores zerados/negativos: {e}")
+        registrador.erro(f"Erro ao remover linhas com valores zerados/negativos: {e}")
         return pd.DataFrame()
 
     try:
         colunas_comissao = [f'comissao_{prod}' for prod in ['emprestimo', 'beneficio', 'cartao']]
         base['comissao_total'] = base[colunas_comissao].sum(axis=1)
     except Exception as e:
-        st.error(f"Erro ao calcular comissão total: {e}")
+        registrador.erro(f"Erro ao calcular comissão total: {e}")
         base['comissao_total'] = 0.0
 
-    # Cria um único expander para os logs desta função
-    log_expander = st.expander("Logs de Finalização (Cortes de Comissão e Margem)", expanded=False)
-
     # --- INÍCIO DO LOG 5 ---
     try:
         comissao_min = params.get('comissao_minima', 0)
         comissao_max = params.get('comissao_maxima', float('inf')) 
         
         qtd_antes_comissao = len(base)
-        with log_expander:
-            st.write("--- LOG: Corte de Comissão ---")
-            st.write(f"Linhas antes do corte de comissão: {qtd_antes_comissao}")
+        registrador.log(GRUPO_LOG_FINALIZACAO, "--- LOG: Corte de Comissão ---")
+        registrador.log(GRUPO_LOG_FINALIZACAO, f"Linhas antes do corte de comissão: {qtd_antes_comissao}")
         
         base = base.loc[(base['comissao_total'] >= comissao_min) & (base['comissao_total'] <= comissao_max)]
         
         qtd_depois_comissao = len(base)
-        with log_expander:
-            st.write(f"Linhas após o corte de comissão: {qtd_depois_comissao}")
-            st.write(f"Total removido (Comissão): {qtd_antes_comissao - qtd_depois_comissao}")
-            st.write("--- Fim Log (Comissão) ---")
+        registrador.log(GRUPO_LOG_FINALIZACAO, f"Linhas após o corte de comissão: {qtd_depois_comissao}")
+        registrador.log(GRUPO_LOG_FINALIZACAO, f"Total removido (Comissão): {qtd_antes_comissao - qtd_depois_comissao}")
+        registrador.log(GRUPO_LOG_FINALIZACAO, "--- Fim Log (Comissão) ---")
         
         if base.empty:
-            st.warning("Nenhum cliente atendeu aos filtros de comissão.")
+            registrador.aviso("Nenhum cliente atendeu aos filtros de comissão.")
             return pd.DataFrame()
     except Exception as e:
-        st.error(f"Erro ao aplicar filtro de comissão: {e}")
+        registrador.erro(f"Erro ao aplicar filtro de comissão: {e}")
         return pd.DataFrame()
     # --- FIM DO LOG 5 ---
 
     # --- INÍCIO DO LOG 6 ---
     try:
         if 'MG_Emprestimo_Disponivel' in base.columns:
-            base['MG_Emprestimo_Disponivel'] = pd.to_numeric(base['MG_Emprestimo_Disponivel'], errors='coerce')
+            margem_emprestimo = _coluna_numerica(base, 'MG_Emprestimo_Disponivel')
             margem_limite = params.get('margem_limite', 20.0)
             tipo_campanha = params.get('tipo_campanha', '')
 
             qtd_antes_margem = len(base)
-            with log_expander:
-                st.write(f"--- LOG: Corte de Margem Empréstimo ---")
-                st.write(f"Linhas antes do corte de margem de empréstimo: {qtd_antes_margem}")
+            registrador.log(GRUPO_LOG_FINALIZACAO, f"--- LOG: Corte de Margem Empréstimo ---")
+            registrador.log(GRUPO_LOG_FINALIZACAO, f"Linhas antes do corte de margem de empréstimo: {qtd_antes_margem}")
 
             if tipo_campanha == 'Novo':
-                with log_expander:
-                    st.write(f"Filtrando para: MG_Emprestimo_Disponivel > {margem_limite}")
-                base = base.loc[(base['MG_Emprestimo_Disponivel'] > margem_limite).fillna(False)]
+                registrador.log(GRUPO_LOG_FINALIZACAO, f"Filtrando para: MG_Emprestimo_Disponivel > {margem_limite}")
+                base = base.loc[margem_emprestimo > margem_limite]
             else:
-                with log_expander:
-                    st.write(f"Filtrando para: MG_Emprestimo_Disponivel <= {margem_limite}")
-                base = base.loc[(base['MG_Emprestimo_Disponivel'] <= margem_limite).fillna(False)] # <= (Corrigido)
+                registrador.log(GRUPO_LOG_FINALIZACAO, f"Filtrando para: MG_Emprestimo_Disponivel <= {margem_limite}")
+                base = base.loc[margem_emprestimo <= margem_limite] # <= (Corrigido)
             
             qtd_depois_margem = len(base)
-            with log_expander:
-                st.write(f"Linhas após o corte de margem de empréstimo: {qtd_depois_margem}")
-                st.write(f"Total removido (Margem): {qtd_antes_margem - qtd_depois_margem}")
-                st.write(f"--- Fim Log (Margem) ---")
+            registrador.log(GRUPO_LOG_FINALIZACAO, f"Linhas após o corte de margem de empréstimo: {qtd_depois_margem}")
+            registrador.log(GRUPO_LOG_FINALIZACAO, f"Total removido (Margem): {qtd_antes_margem - qtd_depois_margem}")
+            registrador.log(GRUPO_LOG_FINALIZACAO, f"--- Fim Log (Margem) ---")
 
             if base.empty:
-                st.warning("Nenhum cliente atendeu ao filtro de margem de empréstimo.")
+                registrador.aviso("Nenhum cliente atendeu ao filtro de margem de empréstimo.")
                 return pd.DataFrame()
         else:
-            st.warning("Coluna 'MG_Emprestimo_Disponivel' não encontrada para filtro de margem.")
+            registrador.aviso("Coluna 'MG_Emprestimo_Disponivel' não encontrada para filtro de margem.")
     except Exception as e:
-        st.error(f"Erro ao aplicar filtro de margem de empréstimo: {e}")
+        registrador.erro(f"Erro ao aplicar filtro de margem de empréstimo: {e}")
         return pd.DataFrame()
     # --- FIM DO LOG 6 ---
         
@@ -615,25 +615,30 @@ def _finalizar_base(df: pd.DataFrame, params: dict) -> pd.DataFrame:
         if col not in base.columns:
             base[col] = pd.NA
     colunas_presentes = [col for col in ORDEM_COLUNAS_FINAL if col in base.columns]
+    # A chave do CPF e a comissão total são internas: guardadas antes da seleção das colunas finais
+    chaves_cpf = base[COLUNA_CHAVE_CPF].to_numpy() if COLUNA_CHAVE_CPF in base.columns else None
+    if 'comissao_total' in base.columns:
+        comissao_total = base['comissao_total'].to_numpy(dtype='float64', na_value=np.nan)
+    else:
+        comissao_total = np.zeros(len(base))
     try:
         base = base[colunas_presentes]
         if MAPEAMENTO_COLUNAS_FINAL:
                 base.rename(columns=MAPEAMENTO_COLUNAS_FINAL, inplace=True, errors='ignore')
     except Exception as e:
-        st.error(f"Erro ao reordenar/renomear colunas finais: {e}")
+        registrador.erro(f"Erro ao reordenar/renomear colunas finais: {e}")
 
     if 'CPF' in base.columns and not base.empty:
-        base.dropna(subset=['CPF'], inplace=True)
-
-        if not base.empty:
-            try:
-                if 'comissao_total' in base.columns:
-                    base = base.sort_values(by='comissao_total', ascending=False, na_position='last')
+        try:
+            if chaves_cpf is None:
+                chaves_cpf = codificar_cpfs(base['CPF'])
+            # Um registro por CPF: o de maior comissão total, o primeiro em caso de empate (sem ordenar a base)
+            base = base.loc[posicoes_maior_valor_por_chave(chaves_cpf, comissao_total)]
+        except Exception as e:
+            registrador.erro(f"Erro na deduplicação: {e}")
+            base = base.dropna(subset=['CPF'])
+            if not base.empty:
                 base = base.drop_duplicates(subset=['CPF'], keep='first')
-            except Exception as e:
-                st.error(f"Erro na deduplicação: {e}")
-                if not base.empty:
-                    base = base.drop_duplicates(subset=['CPF'], keep='first')
 
     if not base.empty:
         try:
@@ -652,7 +657,7 @@ def _finalizar_base(df: pd.DataFrame, params: dict) -> pd.DataFrame:
                     indices_convai = base.sample(n=n_convai, random_state=42).index
                     base.loc[indices_convai, 'Campanha'] = f"{convenio}_{data_hoje}_{tipo_campanha_str}_convai"
         except Exception as e:
-            st.error(f"Erro ao gerar campanha/convai: {e}")
+            registrador.erro(f"Erro ao gerar campanha/convai: {e}")
 
     colunas_para_remover = [
         'tratado', 'tratado_beneficio', 'tratado_cartao', 'comissao_total'
@@ -670,180 +675,247 @@ def _finalizar_base(df: pd.DataFrame, params: dict) -> pd.DataFrame:
 # ============================================
 # FUNÇÃO PRINCIPAL
 # ============================================
-def aplicar_filtros(df: pd.DataFrame, params: dict, configs_banco: list):
-    """Função principal que orquestra todo o processo de filtragem."""
-    
-    try:
-        base_pre_processada = _preprocessar_base(df, params)
-        if base_pre_processada.empty and not df.empty:
-                st.error("Falha durante o pré-processamento.")
-                return pd.DataFrame(), []
-        elif base_pre_processada.empty and df.empty:
-                st.warning("Base inicial vazia.")
-                return pd.DataFrame(), []
-                
-        tipo_campanha_global = params.get('tipo_campanha')
-        convenio = params.get('convenio')
-
-        # Cria um único expander para os logs desta função
-        log_expander_govsp = st.expander("Logs de Processamento (Lógica Específica GOVSP)", expanded=False)
-
-        # --- INÍCIO DO LOG 1 & 2 ---
-        with log_expander_govsp:
-            st.write("--- LOG: Lógica GOVSP (Identificação) ---")
-        matriculas_para_zerar_beneficio = set()
-        matriculas_para_zerar_cartao = set()
-        if convenio == 'govsp':
-            # Garante que colunas são numéricas antes de comparar
-            mg_benef_total = pd.to_numeric(base_pre_processada['MG_Beneficio_Saque_Total'], errors='coerce')
-            mg_benef_disp = pd.to_numeric(base_pre_processada['MG_Beneficio_Saque_Disponivel'], errors='coerce')
-            mascara_beneficio = (mg_benef_total > mg_benef_disp).fillna(False)
-            matriculas_para_zerar_beneficio = set(base_pre_processada.loc[mascara_beneficio, 'Matricula'].dropna().unique())
-            with log_expander_govsp:
-                st.write(f"LOG: Matrículas que usaram Benefício (salvas para zerar): {len(matriculas_para_zerar_beneficio)}")
-
-            mg_cartao_total = pd.to_numeric(base_pre_processada['MG_Cartao_Total'], errors='coerce')
-            mg_cartao_disp = pd.to_numeric(base_pre_processada['MG_Cartao_Disponivel'], errors='coerce')
-            mascara_cartao = (mg_cartao_total > mg_cartao_disp).fillna(False)
-            matriculas_para_zerar_cartao = set(base_pre_processada.loc[mascara_cartao, 'Matricula'].dropna().unique())
-            with log_expander_govsp:
-                st.write(f"LOG: Matrículas que usaram Cartão (salvas para zerar): {len(matriculas_para_zerar_cartao)}")
-        with log_expander_govsp:
-            st.write("--- Fim Log (Identificação) ---")
-        # --- FIM DO LOG 1 & 2 ---
-
-
-        stats = []
-
-        for config_idx, config in enumerate(configs_banco):
-            try:
-                if tipo_campanha_global == 'Benefício & Cartão':
-                    produto_configurado = config.get('cartao_escolhido', 'Benefício')
-                    produto_da_config = 'Cartão' if produto_configurado == 'Consignado' else 'Benefício'
-                else:
-                    produto_da_config = tipo_campanha_global 
-                
-                chave = (convenio, produto_da_config)
-                func = PROCESSADORES.get(chave)
+def _reaplicar_config(base: pd.DataFrame, cache_colunas: CacheColunas, etapa: dict, nome_etapa: str, stats: list):
+    """Reaplica uma config guardada no MemoEtapas: alterações, eventos e estatísticas."""
+    registrador = obter_registrador()
+    with obter_instrumentacao().etapa(nome_etapa, linhas_entrada=len(base)) as medicao:
+        aplicar_diferencas(base, etapa['alteracoes'])
+        cache_colunas.invalidar(list(etapa['alteracoes']))
+        for evento in etapa['eventos']:
+            registrador.emitir(**evento)
+        if etapa['estatisticas'] is not None:
+            stats.append(dict(etapa['estatisticas']))
+        medicao['linhas_saida'] = etapa['linhas_saida']
+        medicao['status'] = 'reaproveitada' if etapa['status'] == 'ok' else etapa['status']
+
+
+def _processar_ate_finalizacao(df: pd.DataFrame, params: dict, configs_banco: list, memo: MemoEtapas = None):
+    """
+    Pré-processamento, configurações de banco e override GOVSP: retorna a base de
+    trabalho pronta para _finalizar_base e as estatísticas por config (base None
+    se o pré-processamento não deixou linhas). Usa o registrador e a instrumentação
+    ativos; exceções sobem para quem chamou.
+    """
+    registrador = obter_registrador()
+    instrumentacao = obter_instrumentacao()
+
+    linhas_entrada = len(df) if isinstance(df, pd.DataFrame) else 0
+    chave_etapa = None
+    reaproveitada = None
+    if memo is not None and isinstance(df, pd.DataFrame) and not df.empty:
+        chave_etapa = memo.chave_pre(df, params)
+        reaproveitada = memo.restaurar_pre_processamento(chave_etapa)
+    with instrumentacao.etapa("Pré-processamento", linhas_entrada=linhas_entrada) as medicao:
+        if reaproveitada is not None:
+            base_pre_processada, eventos = reaproveitada
+            for evento in eventos:
+                registrador.emitir(**evento)
+            medicao['status'] = 'reaproveitada'
+        else:
+            inicio_eventos = len(registrador.eventos)
+            base_pre_processada = _preprocessar_base(df, params)
+            if chave_etapa is not None and not base_pre_processada.empty:
+                memo.guardar_pre_processamento(chave_etapa, base_pre_processada,
+                                               registrador.eventos[inicio_eventos:])
+        medicao['linhas_saida'] = len(base_pre_processada)
+    if base_pre_processada.empty and not df.empty:
+            registrador.erro("Falha durante o pré-processamento.")
+            return None, []
+    elif base_pre_processada.empty and df.empty:
+            registrador.aviso("Base inicial vazia.")
+            return None, []
+            
+    tipo_campanha_global = params.get('tipo_campanha')
+    convenio = params.get('convenio')
+
+    # Colunas convertidas (margens, condições), compartilhadas entre as etapas
+    cache_colunas = CacheColunas(base_pre_processada)
+
+    # --- INÍCIO DO LOG 1 & 2 ---
+    registrador.log(GRUPO_LOG_GOVSP, "--- LOG: Lógica GOVSP (Identificação) ---")
+    matriculas_para_zerar_beneficio = set()
+    matriculas_para_zerar_cartao = set()
+    if convenio == 'govsp':
+        # Garante que colunas são numéricas antes de comparar
+        mascara_beneficio = cache_colunas.numerica('MG_Beneficio_Saque_Total') > cache_colunas.numerica('MG_Beneficio_Saque_Disponivel')
+        matriculas_para_zerar_beneficio = set(base_pre_processada.loc[mascara_beneficio, 'Matricula'].dropna().unique())
+        registrador.log(GRUPO_LOG_GOVSP, f"LOG: Matrículas que usaram Benefício (salvas para zerar): {len(matriculas_para_zerar_beneficio)}")
+
+        mascara_cartao = cache_colunas.numerica('MG_Cartao_Total') > cache_colunas.numerica('MG_Cartao_Disponivel')
+        matriculas_para_zerar_cartao = set(base_pre_processada.loc[mascara_cartao, 'Matricula'].dropna().unique())
+        registrador.log(GRUPO_LOG_GOVSP, f"LOG: Matrículas que usaram Cartão (salvas para zerar): {len(matriculas_para_zerar_cartao)}")
+    registrador.log(GRUPO_LOG_GOVSP, "--- Fim Log (Identificação) ---")
+    # --- FIM DO LOG 1 & 2 ---
+
+
+    stats = []
+
+    for config_idx, config in enumerate(configs_banco):
+        if chave_etapa is not None:
+            chave_etapa = MemoEtapas.chave_config(chave_etapa, convenio, tipo_campanha_global, config)
+            memorizada = memo.config_memorizada(config_idx, chave_etapa)
+            if memorizada is not None:
+                nome_etapa = f"Config {config_idx+1} ({config.get('banco')}/{memorizada['produto']})"
+                _reaplicar_config(base_pre_processada, cache_colunas, memorizada, nome_etapa, stats)
+                continue
+        # O que a config alterou, para o memo (None se ela falhar)
+        inicio_eventos = len(registrador.eventos)
+        etapa_memo = {'alteracoes': {}, 'estatisticas': None, 'linhas_saida': None,
+                      'status': 'ok', 'produto': None}
+        try:
+            if tipo_campanha_global == 'Benefício & Cartão':
+                produto_configurado = config.get('cartao_escolhido', 'Benefício')
+                produto_da_config = 'Cartão' if produto_configurado == 'Consignado' else 'Benefício'
+            else:
+                produto_da_config = tipo_campanha_global 
+            etapa_memo['produto'] = produto_da_config
+            
+            chave = (convenio, produto_da_config)
+            func = PROCESSADORES.get(chave)
+            
+            if not func:
+                func = PROCESSADORES_GENERICOS.get(produto_da_config)
                 
-                if not func:
-                    func = PROCESSADORES_GENERICOS.get(produto_da_config)
-                    
-                if func:
-                    if produto_da_config == 'Benefício': produto_key = 'beneficio'
-                    elif produto_da_config == 'Cartão': produto_key = 'cartao'
-                    elif produto_da_config == 'Novo': produto_key = ''
-                    else: produto_key = produto_da_config.lower().replace(" ", "_")
-
-                    coluna_tratado = 'tratado' if produto_da_config == 'Novo' else f'tratado_{produto_key}'
-
-                    if coluna_tratado not in base_pre_processada.columns:
-                        st.error(f"Config {config_idx+1}: Coluna '{coluna_tratado}' ausente.")
-                        continue
-
-                    if 'CPF' in base_pre_processada.columns:
-                        if pd.api.types.is_bool_dtype(base_pre_processada[coluna_tratado]):
-                            cpfs_tratados_antes = set(
-                                base_pre_processada.loc[base_pre_processada[coluna_tratado] == True, 'CPF'].dropna()
-                            )
-                        else:
-                            st.warning(f"Coluna {coluna_tratado} não é booleana para stats prévias.")
-                            cpfs_tratados_antes = set()
-                    else:
-                        cpfs_tratados_antes = set()
-
-                    base_antes_func = base_pre_processada.copy()
-                    base_pre_processada = func(base_antes_func, params, config)
-
-                    if base_pre_processada is None or not isinstance(base_pre_processada, pd.DataFrame):
-                        st.error(f"Erro Crítico: Função para {chave} retornou dados inválidos (Config {config_idx+1}). Restaurando base.")
-                        base_pre_processada = base_antes_func
-                        continue
-
-                    registros_afetados_unicos = 0
-                    if 'CPF' in base_pre_processada.columns:
-                        if pd.api.types.is_bool_dtype(base_pre_processada[coluna_tratado]):
-                            cpfs_tratados_depois = set(
-                                base_pre_processada.loc[base_pre_processada[coluna_tratado] == True, 'CPF'].dropna()
-                            )
-                            cpfs_novos_unicos = cpfs_tratados_depois - cpfs_tratados_antes
-                            registros_afetados_unicos = len(cpfs_novos_unicos)
-                        else:
-                            st.warning(f"Coluna {coluna_tratado} não é booleana para stats pós.")
+            if func:
+                if produto_da_config == 'Benefício': produto_key = 'beneficio'
+                elif produto_da_config == 'Cartão': produto_key = 'cartao'
+                elif produto_da_config == 'Novo': produto_key = ''
+                else: produto_key = produto_da_config.lower().replace(" ", "_")
+
+                coluna_tratado = 'tratado' if produto_da_config == 'Novo' else f'tratado_{produto_key}'
+
+                if coluna_tratado not in base_pre_processada.columns:
+                    registrador.erro(f"Config {config_idx+1}: Coluna '{coluna_tratado}' ausente.")
+                    continue
+
+                nome_etapa = f"Config {config_idx+1} ({config.get('banco')}/{produto_da_config})"
+                with instrumentacao.etapa(nome_etapa, linhas_entrada=len(base_pre_processada)) as medicao:
+                    # Bitmap das linhas já tratadas (cópia: o processador escreve no lugar)
+                    tratado_antes = None
+                    if pd.api.types.is_bool_dtype(base_pre_processada[coluna_tratado]):
+                        tratado_antes = base_pre_processada[coluna_tratado].to_numpy(dtype=bool, copy=True)
                     else:
+                        registrador.aviso(f"Coluna {coluna_tratado} não é booleana para stats prévias.")
+
+                    # Escrita no lugar: só as colunas desta config são guardadas para rollback
+                    colunas_config = _colunas_escritas_pela_config(produto_da_config, coluna_tratado)
+                    with _TransacaoColunas(base_pre_processada, colunas_config) as transacao, \
+                            usar_cache_colunas(cache_colunas):
                         try:
-                            linhas_depois = base_pre_processada[coluna_tratado].sum()
-                            linhas_antes_estimado = len(cpfs_tratados_antes)
-                            registros_afetados_unicos = max(0, linhas_depois - linhas_antes_estimado)
-                        except Exception:
-                            registros_afetados_unicos = -1
-
-                    stats.append({
-                        'banco': config.get('banco'),
-                        'produto': produto_da_config,
-                        'registros_afetados': registros_afetados_unicos
-                    })
-                else:
-                    st.error(f"Config {config_idx+1}: Nenhum processador para '{produto_da_config}'.")
-
-            except Exception as e_config:
-                st.error(f"Erro processando config #{config_idx+1} ({config.get('banco')}/{produto_da_config}): {e_config}")
-                import traceback
-                st.code(traceback.format_exc())
-
-        # --- INÍCIO DO LOG 3 & 4 ---
-        with log_expander_govsp:
-            st.write("--- LOG: Lógica GOVSP (Aplicação do Override) ---")
-        if convenio == 'govsp':
+                            resultado = func(base_pre_processada, params, config)
+                        finally:
+                            cache_colunas.invalidar(colunas_config)
+                        if resultado is None or not isinstance(resultado, pd.DataFrame):
+                            registrador.erro(f"Erro Crítico: Função para {chave} retornou dados inválidos (Config {config_idx+1}). Restaurando base.")
+                            transacao.desfazer()
+                            medicao['status'] = etapa_memo['status'] = 'desfeita'
+                            continue
+                        if chave_etapa is not None:
+                            if resultado is base_pre_processada:
+                                etapa_memo['alteracoes'] = transacao.alteracoes()
+                            else:
+                                etapa_memo = None  # base nova: não dá para guardar só as alterações
+                    if resultado is not base_pre_processada:
+                        cache_colunas = CacheColunas(resultado)
+                    base_pre_processada = resultado
+
+                    stats.append(_estatisticas_config(
+                        base_pre_processada, config, produto_da_config, coluna_tratado, tratado_antes
+                    ))
+                    medicao['linhas_saida'] = stats[-1]['linhas_atendidas']
+                    if etapa_memo is not None:
+                        etapa_memo['estatisticas'] = dict(stats[-1])
+                        etapa_memo['linhas_saida'] = medicao['linhas_saida']
+            else:
+                registrador.erro(f"Config {config_idx+1}: Nenhum processador para '{produto_da_config}'.")
+
+        except Exception as e_config:
+            registrador.excecao(f"Erro processando config #{config_idx+1} ({config.get('banco')}/{produto_da_config}): {e_config}")
+            etapa_memo = None
+        except BaseException:
+            # Cancelamento (ExecucaoCancelada): a config não terminou, não vai para o memo
+            etapa_memo = None
+            raise
+        finally:
+            if chave_etapa is not None:
+                memo.guardar_config(config_idx, chave_etapa, etapa_memo, registrador.eventos[inicio_eventos:])
+
+    # --- INÍCIO DO LOG 3 & 4 ---
+    registrador.log(GRUPO_LOG_GOVSP, "--- LOG: Lógica GOVSP (Aplicação do Override) ---")
+    if convenio == 'govsp':
+        with instrumentacao.etapa("Override GOVSP", linhas_entrada=len(base_pre_processada)) as medicao:
             if matriculas_para_zerar_beneficio:
                 mascara_zerar_b = base_pre_processada['Matricula'].isin(matriculas_para_zerar_beneficio)
                 # Conta apenas os que TINHAM valor > 0 e agora serão zerados
                 mascara_tinham_valor_b = (base_pre_processada['valor_liberado_beneficio'] > 0)
                 qtd_zerados_b = (mascara_zerar_b & mascara_tinham_valor_b).sum()
-                with log_expander_govsp:
-                    st.write(f"LOG: Matrículas que tiveram valor de Benefício ZERADO: {qtd_zerados_b}")
-                
+                registrador.log(GRUPO_LOG_GOVSP, f"LOG: Matrículas que tiveram valor de Benefício ZERADO: {qtd_zerados_b}")
+            
                 cols_b = ['valor_liberado_beneficio', 'comissao_beneficio', 'valor_parcela_beneficio']
                 base_pre_processada.loc[mascara_zerar_b, cols_b] = 0.0
             else:
-                with log_expander_govsp:
-                    st.write("LOG: Nenhuma matrícula marcada para zerar Benefício.")
-            
+                registrador.log(GRUPO_LOG_GOVSP, "LOG: Nenhuma matrícula marcada para zerar Benefício.")
+        
             if matriculas_para_zerar_cartao:
                 mascara_zerar_c = base_pre_processada['Matricula'].isin(matriculas_para_zerar_cartao)
                 # Conta apenas os que TINHAM valor > 0 e agora serão zerados
                 mascara_tinham_valor_c = (base_pre_processada['valor_liberado_cartao'] > 0)
                 qtd_zerados_c = (mascara_zerar_c & mascara_tinham_valor_c).sum()
-                with log_expander_govsp:
-                    st.write(f"LOG: Matrículas que tiveram valor de Cartão ZERADO: {qtd_zerados_c}")
-                
+                registrador.log(GRUPO_LOG_GOVSP, f"LOG: Matrículas que tiveram valor de Cartão ZERADO: {qtd_zerados_c}")
+            
                 cols_c = ['valor_liberado_cartao', 'comissao_cartao', 'valor_parcela_cartao']
                 base_pre_processada.loc[mascara_zerar_c, cols_c] = 0.0
             else:
-                with log_expander_govsp:
-                    st.write("LOG: Nenhuma matrícula marcada para zerar Cartão.")
-        with log_expander_govsp:
-            st.write("--- Fim Log (Aplicação) ---")
-        # --- FIM DO LOG 3 & 4 ---
+                registrador.log(GRUPO_LOG_GOVSP, "LOG: Nenhuma matrícula marcada para zerar Cartão.")
+            medicao['linhas_saida'] = len(base_pre_processada)
+    registrador.log(GRUPO_LOG_GOVSP, "--- Fim Log (Aplicação) ---")
+    # --- FIM DO LOG 3 & 4 ---
+
+    return base_pre_processada, stats
+
 
+def aplicar_filtros(df: pd.DataFrame, params: dict, configs_banco: list, registrador=None, instrumentacao=None,
+                    memo: MemoEtapas = None):
+    """
+    Função principal que orquestra todo o processo de filtragem.
+    Mensagens e logs vão para o registrador de eventos ativo; passe `registrador`
+    para usar um específico nesta execução (ex: RegistradorLogging na CLI).
+    Tempo, linhas e memória de cada etapa vão para a instrumentação ativa (ou
+    para `instrumentacao`, se informada).
+    Com `memo` (um MemoEtapas mantido entre execuções), o pré-processamento e as
+    configs cujas entradas não mudaram são reaproveitados da execução anterior.
+    """
+    if registrador is not None:
+        with usar_registrador(registrador):
+            return aplicar_filtros(df, params, configs_banco, instrumentacao=instrumentacao, memo=memo)
+    if instrumentacao is not None:
+        with usar_instrumentacao(instrumentacao):
+            return aplicar_filtros(df, params, configs_banco, memo=memo)
+    registrador = obter_registrador()
+    instrumentacao = obter_instrumentacao()
+
+    try:
+        base_pre_processada, stats = _processar_ate_finalizacao(df, params, configs_banco, memo)
+        if base_pre_processada is None:
+            return pd.DataFrame(), []
 
         if base_pre_processada.empty or (
             base_pre_processada['valor_liberado_beneficio'].fillna(0).le(0) &
             base_pre_processada['valor_liberado_cartao'].fillna(0).le(0) &
             base_pre_processada['valor_liberado_emprestimo'].fillna(0).le(0)
         ).all():
-            st.warning("Nenhum valor liberado > 0 calculado.")
+            registrador.aviso("Nenhum valor liberado > 0 calculado.")
             return pd.DataFrame(), stats
 
-        base_final = _finalizar_base(base_pre_processada, params)
+        with instrumentacao.etapa("Finalização", linhas_entrada=len(base_pre_processada)) as medicao:
+            base_final = _finalizar_base(base_pre_processada, params)
+            medicao['linhas_saida'] = len(base_final)
 
         if base_final.empty and not base_pre_processada.empty :
-                st.warning("Clientes removidos pelos filtros finais (comissão, margem, etc.).")
+                registrador.aviso("Clientes removidos pelos filtros finais (comissão, margem, etc.).")
 
         return base_final, stats
 
     except Exception as e:
-        st.error(f"Erro GERAL em aplicar_filtros: {e}")
-        import traceback
-        st.code(traceback.format_exc())
+        registrador.excecao(f"Erro GERAL em aplicar_filtros: {e}")
         return pd.DataFrame(), []
\ No newline at end of file
@@ -4,14 +4,61 @@ import pandas as pd
 from datetime import datetime
 from dados_constantes import BANCOS_MAPEAMENTO, COLUNAS_CONDICAO
 import math
+import numpy as np
 import streamlit_nested_layout # Importa a correção do expander
+from registro_eventos import RegistradorEventos
+import sensibilidade
+from catalogo_colunas import CatalogoColunas
+from memo_etapas import chave_entradas
+from supabase_utils import produto_configurado, resumo_coeficientes
 
-def exibir_sidebar(df: pd.DataFrame):
+
+class RegistradorStreamlit(RegistradorEventos):
+    """
+    Exibe os eventos do motor de filtragem na página:
+    info/aviso/erro viram st.info/st.warning/st.error e cada grupo de log vira um expander.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._expanders = {}
+
+    def _tratar(self, evento: dict):
+        nivel = evento['nivel']
+        if nivel == 'log':
+            grupo = evento['grupo']
+            if grupo not in self._expanders:
+                self._expanders[grupo] = st.expander(grupo, expanded=False)
+            self._expanders[grupo].write(evento['mensagem'])
+        elif nivel == 'info':
+            st.info(evento['mensagem'])
+        elif nivel == 'aviso':
+            st.warning(evento['mensagem'])
+        else:
+            st.error(evento['mensagem'])
+            if evento['detalhe']:
+                st.code(evento['detalhe'])
+
+
+def _legenda_exclusao(catalogo: CatalogoColunas, coluna: str, titulo: str, valores_exatos: list, palavras: list,
+                      ignorar_acentos: bool):
+    """Quantas linhas da base o filtro de exclusão de `coluna` remove (pelo catálogo)."""
+    if not valores_exatos and not palavras:
+        return
+    removidas = catalogo.linhas_excluidas(coluna, valores_exatos, palavras, ignorar_acentos)
+    st.caption(f"{titulo}: remove {removidas:,} de {catalogo.total_linhas:,} linhas".replace(',', '.')
+               + f" ({removidas / max(1, catalogo.total_linhas):.1%}).")
+
+
+def exibir_sidebar(df: pd.DataFrame, catalogo: CatalogoColunas = None):
     """
     Função principal que organiza e exibe toda a barra lateral.
     Ela chama funções menores para cada seção.
     Retorna um dicionário com todas as configurações.
+    `catalogo` (valores distintos e contagens da base) é calculado se não for passado.
     """
+    if catalogo is None:
+        catalogo = CatalogoColunas(df)
     st.sidebar.title("Configurações da Campanha")
     
     
@@ -52,11 +99,11 @@ def exibir_sidebar(df: pd.DataFrame):
         # --- (INÍCIO DA MODIFICAÇÃO) ---
         
         # Filtro de Lotação (Seleção Exata)
-        if 'Lotacao' in df.columns:
-            lotacoes_disponiveis = sorted(list(df['Lotacao'].dropna().unique()))
+        if 'Lotacao' in catalogo.contagens:
             selecao_lotacao = st.multiselect(
                 "Excluir Lotações (Seleção Exata):",
-                options=lotacoes_disponiveis,
+                options=catalogo.opcoes('Lotacao'),
+                format_func=lambda valor: catalogo.rotulo('Lotacao', valor), # Mostra quantas linhas tem cada valor
             )
         else:
             selecao_lotacao = []
@@ -73,11 +120,11 @@ def exibir_sidebar(df: pd.DataFrame):
         st.divider()
 
         # Filtro de Vínculo (Seleção Exata)
-        if 'Vinculo_Servidor' in df.columns:
-            vinculos_disponiveis = sorted(list(df['Vinculo_Servidor'].dropna().unique()))
+        if 'Vinculo_Servidor' in catalogo.contagens:
             selecao_vinculos = st.multiselect(
                 "Excluir Vínculos (Seleção Exata):",
-                options=vinculos_disponiveis,
+                options=catalogo.opcoes('Vinculo_Servidor'),
+                format_func=lambda valor: catalogo.rotulo('Vinculo_Servidor', valor),
             )
         else:
             selecao_vinculos = []
@@ -90,6 +137,18 @@ def exibir_sidebar(df: pd.DataFrame):
         )
         # Converte a string em uma lista de palavras
         lista_vinculos_palavras = [p.strip().lower() for p in selecao_vinculos_palavras.split(';') if p.strip()]
+
+        palavras_ignorar_acentos = st.checkbox(
+            "Ignorar acentos nas palavras-chave",
+            help="Com a opção marcada, 'educacao' também exclui 'EDUCAÇÃO'.",
+            key="palavras_ignorar_acentos"
+        )
+
+        # Efeito de cada exclusão, sem rodar o motor (as duas podem remover as mesmas linhas)
+        _legenda_exclusao(catalogo, 'Lotacao', "Lotações", selecao_lotacao, lista_lotacao_palavras,
+                          palavras_ignorar_acentos)
+        _legenda_exclusao(catalogo, 'Vinculo_Servidor', "Vínculos", selecao_vinculos, lista_vinculos_palavras,
+                          palavras_ignorar_acentos)
         
         # --- (FIM DA MODIFICAÇÃO) ---
 
@@ -123,6 +182,7 @@ def exibir_sidebar(df: pd.DataFrame):
         "selecao_lotacao_palavras": lista_lotacao_palavras, # Envia a lista de palavras-chave
         "selecao_vinculos": selecao_vinculos,
         "selecao_vinculos_palavras": lista_vinculos_palavras, # Envia a lista de palavras-chave
+        "palavras_ignorar_acentos": palavras_ignorar_acentos,
         # --- (FIM DA MODIFICAÇÃO) ---
         
         "equipe": equipes,
@@ -153,7 +213,35 @@ st.markdown(
     unsafe_allow_html=True
 )
 
-def exibir_configuracoes_banco(tipo_campanha: str, convenio: str, df: pd.DataFrame):
+def _preencher_coeficientes(i: int, coeficiente, comissao):
+    """Callback: preenche coeficiente e comissão da config `i` (antes de os campos serem desenhados)."""
+    if coeficiente is not None:
+        st.session_state[f"coef_{i}"] = float(coeficiente)
+    if comissao is not None:
+        st.session_state[f"comissao_{i}"] = float(comissao)
+
+
+def exibir_historico_coeficientes(i: int, resumo: dict):
+    """Último valor e mediana salvos para o banco/produto/convênio, com botões para preencher a config `i`."""
+    ultimo = resumo['ultimo']
+    # Menor janela com registros (30, 90, 365 dias ou todo o histórico)
+    dias, janela = next(((d, j) for d, j in resumo['janelas'].items() if 'coeficiente' in j), (None, {}))
+    texto = f"📊 Último salvo em {ultimo['created_at'][:10]}: coef. {ultimo['coeficiente']} | comissão {ultimo['comissao']}%"
+    if 'coeficiente' in janela:
+        coef = janela['coeficiente']
+        texto += (f" — mediana {'do histórico' if dias is None else f'em {dias} dias'}: {coef['mediana']:.4f} "
+                  f"({coef['minimo']:.4f} a {coef['maximo']:.4f}, {coef['quantidade']} registros)")
+    st.caption(texto)
+    col_ultimo, col_mediana = st.columns(2)
+    col_ultimo.button("Usar último", key=f"usar_ultimo_coef_{i}", on_click=_preencher_coeficientes,
+                      args=(i, ultimo['coeficiente'], ultimo['comissao']), use_container_width=True)
+    if 'coeficiente' in janela:
+        col_mediana.button("Usar mediana", key=f"usar_mediana_coef_{i}", on_click=_preencher_coeficientes,
+                           args=(i, janela['coeficiente']['mediana'], janela.get('comissao', {}).get('mediana')),
+                           use_container_width=True)
+
+
+def exibir_configuracoes_banco(tipo_campanha: str, convenio: str, df: pd.DataFrame, catalogo: CatalogoColunas = None):
     """Configurações de banco com filtros avançados dinâmicos em expander colorido (AND/OR)."""
     st.header("2. Configure os Bancos e Produtos")
 
@@ -216,7 +304,7 @@ def exibir_configuracoes_banco(tipo_campanha: str, convenio: str, df: pd.DataFra
                             min_value=0, max_value=10, value=0, key=f"num_condicoes_{i}"
                         )
 
-                        colunas_disponiveis = df.columns.tolist()
+                        colunas_disponiveis = catalogo.colunas if catalogo is not None else df.columns.tolist()
 
                         for c in range(num_condicoes):
                             st.markdown(f"**Condição #{c + 1}**")
@@ -255,8 +343,10 @@ def exibir_configuracoes_banco(tipo_campanha: str, convenio: str, df: pd.DataFra
                                     key=f"palavras_{i}_{c}"
                                 )
                                 lista_palavras = [p.strip().lower() for p in palavras.split(";") if p.strip()]
+                                ignorar_acentos = st.checkbox("Ignorar acentos", key=f"acentos_{i}_{c}")
                                 st.info(f"Exemplo: Aplicar quando '{coluna}' contém qualquer uma das palavras: {', '.join(lista_palavras)}")
-                                condicoes.append({"tipo":"coluna_palavras", "coluna":coluna, "palavras":lista_palavras})
+                                condicoes.append({"tipo":"coluna_palavras", "coluna":coluna, "palavras":lista_palavras,
+                                                  "ignorar_acentos":ignorar_acentos})
 
                         config["condicoes"] = condicoes
 
@@ -264,6 +354,11 @@ def exibir_configuracoes_banco(tipo_campanha: str, convenio: str, df: pd.DataFra
                     banco_nome = st.selectbox("Banco:", list(BANCOS_MAPEAMENTO.keys()), key=f"banco_{i}")
                     config["banco"] = BANCOS_MAPEAMENTO[banco_nome]
 
+                    # Histórico de coeficientes já usados (índice local da auditoria)
+                    resumo = resumo_coeficientes(convenio, produto_configurado(tipo_campanha, tipo_produto), config["banco"])
+                    if resumo:
+                        exibir_historico_coeficientes(i, resumo)
+
                     config["coeficiente"] = st.number_input("Coeficiente Principal:", min_value=0.0, step=0.0001, format="%.4f", key=f"coef_{i}")
                     config["comissao"] = st.number_input("Comissão (%):", min_value=0.0, max_value=100.0, step=0.01, key=f"comissao_{i}")
                     config["parcelas"] = st.number_input("Parcelas:", min_value=1, max_value=200, step=1, key=f"parcelas_{i}")
@@ -299,6 +394,90 @@ def exibir_configuracoes_banco(tipo_campanha: str, convenio: str, df: pd.DataFra
 
 
 
+def exibir_sensibilidade(df: pd.DataFrame, params: dict, configs_banco: list, memo, desabilitado: bool = False):
+    """
+    Curvas de leads e comissão total por comissão mínima, margem limite e pela grade
+    de coeficiente x comissão de uma config, calculadas sem gerar o arquivo.
+    Usa o `memo` da sessão: as etapas até a finalização só rodam se mudaram.
+    """
+    with st.expander("📈 Simular cortes e coeficientes (antes de gerar o arquivo)", expanded=False):
+        st.caption("Quantos leads e quanta comissão o arquivo teria para cada valor, "
+                   "mantendo os demais parâmetros como estão na tela.")
+        opcoes_config = list(range(len(configs_banco)))
+        config_idx = faixa_coef = comissoes_texto = None
+        if opcoes_config:
+            col_config, col_coef, col_comissoes = st.columns(3)
+            config_idx = col_config.selectbox(
+                "Config para a grade de coeficientes", opcoes_config,
+                format_func=lambda i: f"#{i + 1} - {BANCOS_MAPEAMENTO.get(configs_banco[i].get('banco'), configs_banco[i].get('banco'))}",
+                key='sensibilidade_config')
+            config = configs_banco[config_idx]
+            coeficiente_atual = float(config.get('coeficiente') or 1.0)
+            faixa_coef = col_coef.slider(
+                "Faixa de coeficientes", min_value=0.0, max_value=max(100.0, coeficiente_atual * 2),
+                value=(round(coeficiente_atual * 0.5, 2), round(coeficiente_atual * 1.5, 2)),
+                key=f'sensibilidade_faixa_coef_{config_idx}_{coeficiente_atual}')
+            comissoes_texto = col_comissoes.text_input(
+                "Comissões (%) separadas por vírgula (ex: 3, 5, 7.5)", value=f"{config.get('comissao', 0)}",
+                key=f"sensibilidade_comissoes_{config_idx}_{config.get('comissao', 0)}")
+
+        # As curvas valem para estas entradas; com outra base, parâmetros ou configs saem da tela
+        chave_curvas = chave_entradas(df, params, configs_banco, config_idx, faixa_coef, comissoes_texto)
+        if st.button("Calcular curvas", key='calcular_sensibilidade', disabled=desabilitado):
+            with st.spinner("Calculando curvas..."):
+                base = sensibilidade.preparar_base(df, params, configs_banco, memo)
+                if base is None:
+                    st.warning("Nenhuma linha sobrou antes da finalização para simular.")
+                    st.session_state.pop('curvas_sensibilidade', None)
+                else:
+                    curvas = {
+                        'comissao_minima': sensibilidade.curva_comissao_minima(base),
+                        'margem_limite': sensibilidade.curva_margem_limite(base),
+                    }
+                    if config_idx is not None:
+                        try:
+                            comissoes = [float(c) for c in comissoes_texto.replace(';', ',').split(',') if c.strip()]
+                        except ValueError:
+                            st.error("Comissões inválidas: use números separados por vírgula (ex: 3, 5, 7.5).")
+                            comissoes = None
+                        try:
+                            curvas['coeficientes'] = sensibilidade.grade_coeficientes(
+                                base, memo, config_idx, configs_banco[config_idx],
+                                sensibilidade.produto_da_config(params.get('tipo_campanha'), configs_banco[config_idx]),
+                                np.linspace(faixa_coef[0], faixa_coef[1], sensibilidade.PONTOS_CURVA // 2).round(2),
+                                comissoes or None,
+                            )
+                        except ValueError as e:
+                            st.warning(f"Grade de coeficientes indisponível: {e}")
+                    st.session_state.curvas_sensibilidade = curvas
+                    st.session_state.chave_curvas_sensibilidade = chave_curvas
+
+        curvas = st.session_state.get('curvas_sensibilidade')
+        if not curvas:
+            return
+        if st.session_state.get('chave_curvas_sensibilidade') != chave_curvas:
+            st.session_state.pop('curvas_sensibilidade', None)
+            st.info("A base, os parâmetros ou as configs mudaram desde o cálculo. "
+                    "Clique em \"Calcular curvas\" para atualizar.")
+            return
+        for parametro, titulo in [('comissao_minima', "Comissão mínima (R$)"), ('margem_limite', "Margem limite (R$)")]:
+            curva = curvas.get(parametro)
+            if curva is None or curva.empty:
+                continue
+            st.markdown(f"**{titulo}** (atual: {params.get(parametro)})")
+            col_leads, col_comissao = st.columns(2)
+            col_leads.line_chart(curva.set_index(parametro)['leads'], y_label="Leads")
+            col_comissao.line_chart(curva.set_index(parametro)['comissao_total'], y_label="Comissão total (R$)")
+        grade = curvas.get('coeficientes')
+        if grade is not None and not grade.empty:
+            st.markdown("**Coeficiente x comissão (%)** da config selecionada")
+            col_leads, col_comissao = st.columns(2)
+            col_leads.line_chart(grade.pivot(index='coeficiente', columns='comissao', values='leads'), y_label="Leads")
+            col_comissao.line_chart(grade.pivot(index='coeficiente', columns='comissao', values='comissao_total'),
+                                    y_label="Comissão total (R$)")
+
+
+
 
 # ======================================================================
 # Filtro Master
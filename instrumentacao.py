@@ -0,0 +1,187 @@
+"""
+Instrumentação das etapas do motor de filtragem.
+
+Cada etapa (pré-processamento, cada configuração de banco, override GOVSP,
+finalização) registra tempo de parede, linhas de entrada/saída e o pico de
+memória residente durante a etapa (o pico do processo é zerado no início dela;
+ver _MedidorPico). A medição custa duas chamadas de relógio e algumas leituras
+de /proc por etapa, então fica sempre ligada. As medições viram a tabela
+"Tempo por Etapa" na interface e um log estruturado em JSON.
+
+O início de cada etapa também é o ponto de acompanhamento de execuções em segundo
+plano (execucao_fundo): a etapa em andamento fica em `etapa_atual` e, se o
+cancelamento foi pedido, a etapa seguinte não começa (ExecucaoCancelada).
+"""
+
+import contextvars
+import datetime
+import json
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def _status_processo_mb(campo: str):
+    """Campo de memória de /proc/self/status (Linux), em MB; None se indisponível."""
+    try:
+        with open('/proc/self/status') as f:
+            for linha in f:
+                if linha.startswith(campo + ':'):
+                    return int(linha.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def rss_atual_mb():
+    """Memória residente atual do processo, em MB (None se indisponível)."""
+    return _status_processo_mb('VmRSS')
+
+
+def pico_rss_mb():
+    """
+    Pico de memória residente do processo, em MB (None se indisponível). É o pico
+    desde o início do processo ou desde o último `reiniciar_pico_rss`.
+    """
+    pico = _status_processo_mb('VmHWM')
+    if pico is not None or resource is None:
+        return pico
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux informa em KB, macOS em bytes
+    return pico / 1024 / 1024 if sys.platform == 'darwin' else pico / 1024
+
+
+def reiniciar_pico_rss() -> bool:
+    """
+    Zera o pico de memória residente (passa a ser a memória atual), para medir o
+    pico de um trecho. Só no Linux (/proc/self/clear_refs); False se não foi possível,
+    e aí `pico_rss_mb` continua sendo o pico da vida do processo.
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        return False
+    return _status_processo_mb('VmHWM') is not None
+
+
+class _MedidorPico:
+    """
+    Pico de memória por etapa. O pico é do processo inteiro: cada etapa o zera ao
+    começar, e a medição só vale se nenhuma outra etapa (outra sessão, outra
+    campanha do lote) rodou ao mesmo tempo, porque uma zeraria o pico da outra.
+    """
+
+    def __init__(self):
+        self._trava = threading.Lock()
+        self._ativas = 0
+        self._geracao = 0
+
+    def iniciar(self):
+        """Ficha da medição (geração, sozinha, rss antes) para `concluir`."""
+        with self._trava:
+            self._geracao += 1
+            self._ativas += 1
+            sozinha = self._ativas == 1 and reiniciar_pico_rss()
+            return self._geracao, sozinha, rss_atual_mb() if sozinha else None
+
+    def concluir(self, ficha):
+        """(pico, aumento sobre o RSS inicial) em MB, ou (None, None) se a medição não vale."""
+        geracao, sozinha, rss_antes = ficha
+        with self._trava:
+            self._ativas -= 1
+            if not sozinha or geracao != self._geracao or rss_antes is None:
+                return None, None
+            pico = pico_rss_mb()
+        return round(pico, 1), round(max(0.0, pico - rss_antes), 1)
+
+
+_medidor_pico = _MedidorPico()
+
+
+class ExecucaoCancelada(BaseException):
+    """
+    Pedido de cancelamento atendido no início de uma etapa. Deriva de BaseException
+    (como KeyboardInterrupt) para não ser engolida pelos `except Exception` do motor.
+    """
+
+
+class Instrumentacao:
+    """Medições das etapas de uma execução, na ordem em que terminam."""
+
+    def __init__(self, cancelamento: threading.Event = None):
+        self.inicio = datetime.datetime.now()
+        self.etapas = []
+        self.cancelamento = cancelamento
+        # Medição da etapa em andamento (lida por outra thread para mostrar o progresso)
+        self.etapa_atual = None
+
+    @contextmanager
+    def etapa(self, nome: str, linhas_entrada: int = None):
+        """
+        Mede o bloco como uma etapa. O dict entregue pode receber 'linhas_saida'
+        (e outros campos) antes do fim do bloco.
+        Levanta ExecucaoCancelada, sem executar o bloco, se o cancelamento foi pedido.
+        """
+        if self.cancelamento is not None and self.cancelamento.is_set():
+            raise ExecucaoCancelada(nome)
+        medicao = {'etapa': nome, 'linhas_entrada': linhas_entrada, 'linhas_saida': None, 'status': 'ok'}
+        self.etapa_atual = medicao
+        ficha_pico = _medidor_pico.iniciar()
+        inicio = time.perf_counter()
+        try:
+            yield medicao
+        except BaseException:
+            medicao['status'] = 'erro'
+            raise
+        finally:
+            medicao['segundos'] = round(time.perf_counter() - inicio, 4)
+            # Pico de RSS da etapa e quanto ele passou do RSS do início (None se não deu para medir)
+            medicao['pico_rss_mb'], medicao['aumento_pico_mb'] = _medidor_pico.concluir(ficha_pico)
+            self.etapas.append(medicao)
+            self.etapa_atual = None
+
+    @property
+    def total_segundos(self) -> float:
+        return round(sum(m['segundos'] for m in self.etapas), 4)
+
+    def tabela(self) -> list:
+        """Linhas para exibição (uma por etapa)."""
+        return [dict(m) for m in self.etapas]
+
+    def para_json(self, eventos: list = None, **contexto) -> str:
+        """Log estruturado da execução: etapas, eventos do registrador e campos extras de contexto."""
+        dados = {
+            'inicio': self.inicio.isoformat(timespec='seconds'),
+            'total_segundos': self.total_segundos,
+            **contexto,
+            'etapas': self.etapas,
+        }
+        if eventos is not None:
+            dados['eventos'] = eventos
+        return json.dumps(dados, ensure_ascii=False, indent=2, default=str)
+
+
+_instrumentacao_atual = contextvars.ContextVar('instrumentacao', default=None)
+
+
+def obter_instrumentacao() -> Instrumentacao:
+    """Instrumentação ativa no contexto atual (ou uma descartável)."""
+    instrumentacao = _instrumentacao_atual.get()
+    return instrumentacao if instrumentacao is not None else Instrumentacao()
+
+
+@contextmanager
+def usar_instrumentacao(instrumentacao: Instrumentacao):
+    """Ativa `instrumentacao` para todas as etapas executadas dentro do bloco."""
+    token = _instrumentacao_atual.set(instrumentacao)
+    try:
+        yield instrumentacao
+    finally:
+        _instrumentacao_atual.reset(token)
@@ -1,30 +1,173 @@
-import streamlit as st
+import hashlib
+import os
+import time
 import pandas as pd
-from supabase import create_client, Client
-from typing import List, Dict
-
-@st.cache_data
-def carregar_arquivos_csv(files: List[st.runtime.uploaded_file_manager.UploadedFile]) -> pd.DataFrame:
-    """Junta múltiplos arquivos CSV carregados em um único DataFrame."""
-    if not files:
-        st.warning("Nenhum arquivo CSV foi carregado.")
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+from registro_eventos import obter_registrador
+from dados_constantes import ESQUEMA_COLUNAS, PREFIXO_COLUNAS_MARGEM
+from cache_parquet import CacheParquet, hash_conteudo
+
+try:
+    import pyarrow  # noqa: F401 - motor de leitura multithread do pandas
+    MOTOR_CSV = 'pyarrow'
+except ImportError:
+    MOTOR_CSV = 'c'
+
+MAX_THREADS_LEITURA = os.cpu_count() or 4
+GRUPO_LOG_LEITURA = "Logs de Leitura dos Arquivos"
+
+# Colunas lidas direto como texto pelo parser (não passam por inferência numérica)
+DTYPES_LEITURA = {col: str for col, tipo in ESQUEMA_COLUNAS.items() if tipo in ('texto', 'data')}
+
+
+def _nome_arquivo(arquivo) -> str:
+    """Nome legível de um arquivo (caminho ou objeto carregado pela UI)."""
+    if isinstance(arquivo, (str, os.PathLike)):
+        return os.path.basename(arquivo)
+    return getattr(arquivo, 'name', str(arquivo))
+
+
+def _tamanho_arquivo(arquivo) -> int:
+    """Tamanho em bytes (0 se não for possível descobrir)."""
+    try:
+        if isinstance(arquivo, (str, os.PathLike)):
+            return os.path.getsize(arquivo)
+        return int(getattr(arquivo, 'size', 0) or 0)
+    except (OSError, TypeError, ValueError):
+        return 0
+
+
+def _ler_um_arquivo(arquivo, cache: CacheParquet):
+    """
+    Lê um CSV (ou o seu DataFrame já tipado do cache local) e aplica o esquema.
+    Roda nas threads de leitura: não emite eventos, só retorna (df, segundos, origem, hash).
+    O hash do conteúdo identifica o arquivo no cache e compõe a impressão digital da base.
+    """
+    inicio = time.perf_counter()
+    chave = hash_conteudo(arquivo)
+    if cache.ativo:
+        df = cache.ler(chave)
+        if df is not None:
+            return df, time.perf_counter() - inicio, 'cache', chave
+
+    if hasattr(arquivo, 'seek'):
+        # Garante que o ponteiro do arquivo esteja no início
+        arquivo.seek(0)
+    df = None
+    if MOTOR_CSV == 'pyarrow':
+        try:
+            df = pd.read_csv(arquivo, engine='pyarrow', dtype=DTYPES_LEITURA)
+        except Exception:
+            # Arquivos que o pyarrow não aceita (linhas irregulares etc.) caem no motor C
+            if hasattr(arquivo, 'seek'):
+                arquivo.seek(0)
+    if df is None:
+        df = pd.read_csv(arquivo, low_memory=False, dtype=DTYPES_LEITURA)
+    df = aplicar_esquema(df)
+
+    if cache.ativo and not df.empty:
+        try:
+            cache.gravar(chave, df)
+        except Exception:
+            pass  # cache é só otimização: falha ao gravar não impede a leitura
+    return df, time.perf_counter() - inicio, 'csv', chave
+
+
+def _concatenar(dataframes: List[pd.DataFrame]) -> pd.DataFrame:
+    """Concatena em uma única alocação, unificando antes as categorias de cada coluna categórica."""
+    if len(dataframes) > 1:
+        colunas_categoricas = {
+            col for df in dataframes for col in df.columns if isinstance(df[col].dtype, pd.CategoricalDtype)
+        }
+        for col in colunas_categoricas:
+            categorias = pd.Index([])
+            for df in dataframes:
+                if col in df.columns and isinstance(df[col].dtype, pd.CategoricalDtype):
+                    categorias = categorias.union(df[col].cat.categories)
+            for df in dataframes:
+                if col in df.columns:
+                    df[col] = pd.Categorical(df[col], categories=categorias)
+    return pd.concat(dataframes, ignore_index=True)
+
+
+def ler_arquivos_csv(arquivos: List, estatisticas: dict = None, cache: CacheParquet = None) -> pd.DataFrame:
+    """
+    Junta múltiplos arquivos CSV em um único DataFrame.
+    Aceita caminhos em disco ou objetos de arquivo (ex: UploadedFile do Streamlit).
+    Os arquivos são lidos em paralelo (pool de threads; o motor pyarrow também é
+    multithread e libera o GIL) e concatenados uma única vez, na ordem recebida.
+    Arquivos já vistos (mesmo conteúdo) vêm do cache Parquet local. Se `estatisticas`
+    for um dict, recebe 'acertos_cache', 'faltas_cache' e os detalhes por arquivo.
+    A base sai com `attrs['impressao']`, o hash dos conteúdos lidos (ver memo_etapas).
+    """
+    registrador = obter_registrador()
+    if not arquivos:
+        registrador.aviso("Nenhum arquivo CSV foi carregado.")
         return pd.DataFrame()
+    cache = cache if cache is not None else CacheParquet()
+
+    inicio = time.perf_counter()
+    n_threads = max(1, min(len(arquivos), MAX_THREADS_LEITURA))
+    with ThreadPoolExecutor(max_workers=n_threads) as executor:
+        futuros = [executor.submit(_ler_um_arquivo, arquivo, cache) for arquivo in arquivos]
 
     dataframes = []
-    for arquivo in files:
+    hashes = []
+    detalhes = []
+    total_bytes = 0
+    for arquivo, futuro in zip(arquivos, futuros):
+        nome = _nome_arquivo(arquivo)
         try:
-            # Garante que o ponteiro do arquivo esteja no início
-            arquivo.seek(0)
-            df = pd.read_csv(arquivo, low_memory=False)
-            if not df.empty:
-                dataframes.append(df)
-            else:
-                st.warning(f"O arquivo {arquivo.name} está vazio e será ignorado.")
+            df, segundos, origem, chave = futuro.result()
         except Exception as e:
-            st.error(f"Erro ao ler o arquivo {arquivo.name}: {e}")
-            
+            registrador.erro(f"Erro ao ler o arquivo {nome}: {e}")
+            continue
+        if df.empty:
+            registrador.aviso(f"O arquivo {nome} está vazio e será ignorado.")
+            continue
+        dataframes.append(df)
+        hashes.append(chave)
+        tamanho = _tamanho_arquivo(arquivo)
+        total_bytes += tamanho
+        mb = tamanho / 1024 / 1024
+        detalhes.append({'arquivo': nome, 'origem': origem, 'linhas': len(df), 'segundos': round(segundos, 3)})
+        registrador.log(GRUPO_LOG_LEITURA, f"{nome}: {len(df)} linhas, {mb:.1f} MB em {segundos:.2f}s "
+                                           f"({mb / max(segundos, 1e-6):.1f} MB/s, origem: {origem})")
+
+    if estatisticas is not None:
+        estatisticas['acertos_cache'] = sum(1 for d in detalhes if d['origem'] == 'cache')
+        estatisticas['faltas_cache'] = sum(1 for d in detalhes if d['origem'] == 'csv')
+        estatisticas['arquivos'] = detalhes
+
     if not dataframes:
-        st.error("Nenhum arquivo CSV válido pôde ser processado.")
+        registrador.erro("Nenhum arquivo CSV válido pôde ser processado.")
         return pd.DataFrame()
-        
-    return pd.concat(dataframes, ignore_index=True)
\ No newline at end of file
+
+    base = aplicar_esquema(_concatenar(dataframes))
+    base.attrs['impressao'] = hashlib.blake2b('|'.join(hashes).encode(), digest_size=16).hexdigest()
+    segundos = time.perf_counter() - inicio
+    registrador.log(GRUPO_LOG_LEITURA, f"Total: {len(dataframes)} arquivo(s), {len(base)} linhas, "
+                                       f"{total_bytes / 1024 / 1024:.1f} MB em {segundos:.2f}s "
+                                       f"(motor '{MOTOR_CSV}', {n_threads} thread(s))")
+    return base
+
+
+def aplicar_esquema(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Aplica o ESQUEMA_COLUNAS (dados_constantes) às colunas presentes em `df`:
+    margens MG_* em float32, textos fixos e categorias. Datas ficam como o texto lido
+    (o arquivo final não perde nem reescreve valores); os filtros as convertem sob demanda.
+    Colunas que já estão no tipo certo não são tocadas, então reaplicar é barato.
+    """
+    for col in df.columns:
+        tipo = ESQUEMA_COLUNAS.get(col)
+        if col.startswith(PREFIXO_COLUNAS_MARGEM):
+            tipo = 'margem'
+        if tipo == 'margem' and df[col].dtype != 'float32':
+            df[col] = pd.to_numeric(df[col], errors='coerce').astype('float32')
+        elif tipo in ('texto', 'data') and not pd.api.types.is_string_dtype(df[col]):
+            df[col] = df[col].astype(str).where(df[col].notna())
+        elif tipo == 'categoria' and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype('category')
+    return df
@@ -0,0 +1,94 @@
+"""
+Geração de várias campanhas a partir da mesma base (modo lote).
+
+Cada campanha é um par (params, configs). O pré-processamento roda uma única vez
+por combinação de filtros de exclusão/idade (chave do MemoEtapas) e as campanhas
+recomeçam da base pré-processada. Campanhas que só diferem nos parâmetros da
+finalização (equipe, comissão, margem limite, ConvAI) também compartilham as
+etapas das configs: rodam em sequência sobre o mesmo memo. Grupos independentes
+rodam em paralelo, em threads - cada uma trabalha sobre a sua cópia da base
+pré-processada, por isso o paralelismo é limitado (MAX_CAMPANHAS_PARALELAS).
+"""
+
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from filtradores import _preprocessar_base, aplicar_filtros
+from instrumentacao import Instrumentacao
+from memo_etapas import MemoEtapas
+from registro_eventos import RegistradorEventos, obter_registrador, usar_registrador
+
+# Cada campanha em andamento tem a sua cópia da base pré-processada
+MAX_CAMPANHAS_PARALELAS = min(4, os.cpu_count() or 1)
+
+
+def _chave_configs(params: dict, configs_banco: list) -> str:
+    """Entradas das etapas de config: campanhas com a mesma chave compartilham essas etapas."""
+    return json.dumps([params.get('convenio'), params.get('tipo_campanha'), configs_banco],
+                      sort_keys=True, ensure_ascii=False, default=str)
+
+
+def _executar_grupo(df: pd.DataFrame, campanhas: list, indices: list, memo: MemoEtapas) -> dict:
+    """Roda em sequência as campanhas `indices`, que compartilham o `memo`."""
+    resultados = {}
+    for indice in indices:
+        params, configs_banco = campanhas[indice]
+        registrador = RegistradorEventos()
+        instrumentacao = Instrumentacao()
+        base_filtrada, stats = aplicar_filtros(
+            df, params, configs_banco, registrador=registrador, instrumentacao=instrumentacao, memo=memo
+        )
+        resultados[indice] = {
+            'params': params,
+            'configs': configs_banco,
+            'base': base_filtrada,
+            'stats': stats,
+            'eventos': registrador.eventos,
+            'instrumentacao': instrumentacao,
+        }
+    return resultados
+
+
+def aplicar_filtros_lote(df: pd.DataFrame, campanhas: list, max_paralelas: int = None) -> list:
+    """
+    Gera todas as `campanhas` (lista de (params, configs_banco)) a partir de `df`.
+    Retorna, na ordem recebida, um dict por campanha com 'params', 'configs',
+    'base' (a base final), 'stats', 'eventos' e 'instrumentacao'.
+    Os eventos de cada campanha (inclusive os do pré-processamento compartilhado)
+    ficam no seu resultado; o registrador ativo recebe só o resumo do lote.
+    """
+    registrador = obter_registrador()
+    if not campanhas:
+        registrador.aviso("Nenhuma campanha informada para o lote.")
+        return []
+
+    # Um pré-processamento por combinação de filtros de exclusão/idade
+    memos_pre = {}
+    grupos = {}
+    for indice, (params, configs_banco) in enumerate(campanhas):
+        chave_pre = MemoEtapas.chave_pre(df, params)
+        if chave_pre not in memos_pre:
+            memo = MemoEtapas()
+            with usar_registrador(RegistradorEventos()) as registrador_pre:
+                base_pre_processada = _preprocessar_base(df, params)
+            if not base_pre_processada.empty:
+                memo.guardar_pre_processamento(chave_pre, base_pre_processada, registrador_pre.eventos)
+            del base_pre_processada
+            memos_pre[chave_pre] = memo
+        grupos.setdefault((chave_pre, _chave_configs(params, configs_banco)), []).append(indice)
+    registrador.info(f"Lote: {len(campanhas)} campanha(s), {len(memos_pre)} pré-processamento(s), "
+                     f"{len(grupos)} grupo(s) de configurações.")
+
+    max_paralelas = max(1, min(max_paralelas or MAX_CAMPANHAS_PARALELAS, len(grupos)))
+    resultados = {}
+    with ThreadPoolExecutor(max_workers=max_paralelas) as executor:
+        futuros = [
+            executor.submit(_executar_grupo, df, campanhas, indices, memos_pre[chave_pre].compartilhar_pre_processamento())
+            for (chave_pre, _), indices in grupos.items()
+        ]
+        for futuro in futuros:
+            resultados.update(futuro.result())
+    return [resultados[indice] for indice in range(len(campanhas))]
@@ -11,15 +11,97 @@ st.set_page_config(
 from juntar_arquivos import *
 from frontend_componentes import *
 from filtradores import * # --- 1. IMPORTAÇÃO ADICIONADA ---
-from supabase_utils import salvar_configuracao_no_supabase 
+from supabase_utils import salvar_configuracao_no_supabase, obter_fila_auditoria
+from registro_eventos import usar_registrador
+from exportacao import FORMATOS_EXPORTACAO, exportar_para_bytes, nome_arquivo_exportacao
+from memo_etapas import MemoEtapas, impressao_base
+from catalogo_colunas import CatalogoColunas
+from armazem_sessoes import ArmazemSessoes
+from execucao_fundo import ExecucaoFiltragem
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 
 # --- Título ---
 st.title("🚀 Filtrador de Campanhas v4")
 
-@st.cache_data
-def converter_df_para_csv(df):
-    """Converte o DataFrame para CSV com encoding correto para download."""
-    return df.to_csv(index=False, sep=';', encoding='utf-8-sig').encode('utf-8-sig')
+def carregar_arquivos_csv(files):
+    """
+    Junta os arquivos CSV carregados em um único DataFrame. Retorna também as
+    estatísticas do cache Parquet local (acertos/faltas por arquivo).
+    """
+    estatisticas = {}
+    with usar_registrador(RegistradorStreamlit()):
+        df = ler_arquivos_csv(files, estatisticas=estatisticas)
+    return df, estatisticas
+
+@st.cache_resource
+def obter_armazem() -> ArmazemSessoes:
+    """Armazém das bases das sessões (compartilhado pelo processo, com limites de memória e disco)."""
+    return ArmazemSessoes()
+
+def id_sessao() -> str:
+    contexto = get_script_run_ctx()
+    return contexto.session_id if contexto is not None else 'local'
+
+@st.cache_resource(max_entries=8)
+def obter_catalogo_colunas(impressao: str, _df: pd.DataFrame) -> CatalogoColunas:
+    """Catálogo (valores distintos e contagens) da base, calculado uma vez por impressão digital."""
+    return CatalogoColunas(_df)
+
+def receber_resultado_filtragem(execucao):
+    """
+    Mostra os eventos da execução em segundo plano e salva o resultado na sessão.
+    Uma execução cancelada mantém o resultado anterior.
+    """
+    registrador = RegistradorStreamlit()
+    for evento in execucao.registrador.eventos:
+        registrador.emitir(**evento)
+
+    if execucao.cancelada:
+        st.warning("Filtragem cancelada. Os resultados anteriores (se houver) foram mantidos.")
+        return
+    if execucao.erro is not None:
+        st.error(f"Ocorreu um erro inesperado durante a filtragem:")
+        st.exception(execucao.erro)
+        obter_armazem().remover(id_sessao(), 'base_filtrada')
+        if 'stats_filtragem' in st.session_state:
+            del st.session_state.stats_filtragem
+        return
+
+    base_filtrada, stats = execucao.resultado
+    # Salva ambos nos resultados da sessão (a base no armazém, fora do session_state)
+    obter_armazem().guardar(id_sessao(), 'base_filtrada', base_filtrada)
+    st.session_state.stats_filtragem = stats
+    # Tempo por etapa e log estruturado (etapas + eventos) da execução
+    st.session_state.etapas_filtragem = execucao.instrumentacao.tabela()
+    st.session_state.log_filtragem_json = execucao.instrumentacao.para_json(
+        eventos=execucao.registrador.eventos, estatisticas=stats
+    )
+    # Salva os parâmetros que FORAM USADOS para este filtro
+    st.session_state.params_para_salvar = execucao.params
+    st.session_state.configs_para_salvar = execucao.configs_banco
+
+@st.fragment(run_every=1.0)
+def acompanhar_execucao():
+    """Progresso da filtragem em segundo plano (atualizado a cada segundo), com botão de cancelar."""
+    execucao = st.session_state.get('execucao_filtragem')
+    if execucao is None:
+        return
+    if not execucao.em_andamento:
+        # Terminou: roda a página inteira para exibir o resultado
+        st.rerun()
+    st.progress(execucao.fracao_concluida(), text=f"Processando e aplicando filtros... {execucao.progresso()}")
+    if st.button("⛔ Cancelar filtragem", key='cancelar_filtragem', disabled=execucao.cancelamento.is_set()):
+        execucao.cancelar()
+        st.caption(execucao.progresso())
+
+def gerar_arquivo_download(df, formato, nome_interno):
+    """
+    Prepara o download: o Streamlit só chama a função retornada quando o botão é
+    clicado. O arquivo é escrito em blocos num temporário em disco (apagado em
+    seguida) e só o arquivo pronto fica em memória, que é onde o Streamlit o
+    guarda para servir o download.
+    """
+    return lambda: exportar_para_bytes(df, formato, nome_interno)
 
 
 # --- 2. Upload de Arquivos ---
@@ -32,11 +114,33 @@ arquivos_carregados = st.sidebar.file_uploader(
 )
 st.sidebar.write("---")
 
+armazem = obter_armazem()
+sessao = id_sessao()
+# Etapas memorizadas da sessão (filtragem e curvas de sensibilidade): só recalcula a partir da primeira que mudou.
+# A base pré-processada fica no armazém, dentro dos limites de memória e disco dele
+if 'memo_etapas' not in st.session_state:
+    st.session_state.memo_etapas = MemoEtapas(armazem, sessao)
 if arquivos_carregados:
-    st.session_state.df_bruto = carregar_arquivos_csv(arquivos_carregados)
+    # Só relê quando o upload muda (ou quando o armazém descartou a base por falta de disco)
+    assinatura = tuple((f.file_id, f.size) for f in arquivos_carregados)
+    if st.session_state.get('assinatura_arquivos') != assinatura or not armazem.contem(sessao, 'df_bruto'):
+        df_lido, st.session_state.estatisticas_leitura = carregar_arquivos_csv(arquivos_carregados)
+        # Chave pela impressão digital: sessões com os mesmos arquivos dividem a mesma cópia
+        armazem.guardar(sessao, 'df_bruto', df_lido, chave=impressao_base(df_lido))
+        del df_lido
+        st.session_state.assinatura_arquivos = assinatura
+    estatisticas_leitura = st.session_state.estatisticas_leitura
+    if estatisticas_leitura.get('arquivos'):
+        st.sidebar.caption(
+            f"💾 Cache de arquivos: {estatisticas_leitura['acertos_cache']} de "
+            f"{len(estatisticas_leitura['arquivos'])} carregado(s) do cache local."
+        )
     
-if 'df_bruto' in st.session_state and not st.session_state.df_bruto.empty:
-    df_bruto = st.session_state.df_bruto
+df_bruto = armazem.obter(sessao, 'df_bruto')
+# Preenchido no fim da página, depois de um resultado novo ser guardado
+uso_sessao = st.sidebar.empty()
+
+if df_bruto is not None and not df_bruto.empty:
     st.success(f"Arquivos carregados com sucesso! Total de {len(df_bruto)} registros.")
     st.dataframe(df_bruto.head(3))
     st.write("---")
@@ -45,12 +149,14 @@ if 'df_bruto' in st.session_state and not st.session_state.df_bruto.empty:
     convenio_detectado = df_bruto['Convenio'].iloc[0] if 'Convenio' in df_bruto.columns else None
     
     
-    params_gerais = exibir_sidebar(df_bruto)
+    catalogo_colunas = obter_catalogo_colunas(impressao_base(df_bruto), df_bruto)
+    params_gerais = exibir_sidebar(df_bruto, catalogo_colunas)
     
     configs_banco = exibir_configuracoes_banco(
         params_gerais['tipo_campanha'],
         params_gerais['convenio'],
-        df_bruto
+        df_bruto,
+        catalogo_colunas
     )
     
     with st.expander("Parâmetros de Entrada (Debug)", expanded=False):
@@ -59,60 +165,79 @@ if 'df_bruto' in st.session_state and not st.session_state.df_bruto.empty:
     
     # --- Ação Principal: Aplicar Filtros ---
     st.header("3. Gere a Campanha")
-    if st.button("✨ Aplicar Filtros e Gerar Arquivo", type="primary", use_container_width=True):
-        with st.spinner("Processando e aplicando filtros..."):
-            try:
-                # A função agora retorna a base e as estatísticas
-                base_filtrada, stats = aplicar_filtros(df_bruto, params_gerais, configs_banco)
-                
-                # Salva ambos nos resultados da sessão
-                st.session_state.base_filtrada = base_filtrada
-                st.session_state.stats_filtragem = stats
-                
-                # Salva os parâmetros que FORAM USADOS para este filtro
-                st.session_state.params_para_salvar = params_gerais
-                st.session_state.configs_para_salvar = configs_banco
-
-            except Exception as e:
-                st.error(f"Ocorreu um erro inesperado durante a filtragem:")
-                st.exception(e)
-                if 'base_filtrada' in st.session_state:
-                    del st.session_state.base_filtrada
-                if 'stats_filtragem' in st.session_state:
-                    del st.session_state.stats_filtragem
+    execucao = st.session_state.get('execucao_filtragem')
+    if execucao is not None and not execucao.em_andamento:
+        # A execução em segundo plano terminou: leva o resultado para a sessão
+        del st.session_state.execucao_filtragem
+        receber_resultado_filtragem(execucao)
+        execucao = None
+
+    if st.button("✨ Aplicar Filtros e Gerar Arquivo", type="primary", use_container_width=True,
+                 disabled=execucao is not None):
+        execucao = ExecucaoFiltragem(
+            df_bruto, params_gerais, configs_banco, memo=st.session_state.memo_etapas
+        ).iniciar()
+        st.session_state.execucao_filtragem = execucao
+
+    if execucao is not None:
+        acompanhar_execucao()
+
+    # Curvas de sensibilidade: reaproveitam as etapas memorizadas da sessão
+    exibir_sensibilidade(df_bruto, params_gerais, configs_banco, st.session_state.memo_etapas,
+                         desabilitado=execucao is not None)
 
     # --- 4. Resultados e Ações Pós-Filtragem ---
-    if 'base_filtrada' in st.session_state:
-        base_filtrada = st.session_state.base_filtrada
+    base_filtrada = armazem.obter(sessao, 'base_filtrada')
+    if base_filtrada is not None:
         stats = st.session_state.get('stats_filtragem', [])
         
         # (NOVA VERIFICAÇÃO) Checa se o DataFrame resultante não está vazio
         if not base_filtrada.empty:
             st.success(f"Filtragem concluída! {len(base_filtrada)} registros encontrados.")
             
-            # Exibe as estatísticas
-            st.subheader("Estatísticas da Filtragem")
-            stats_df = pd.DataFrame(stats)
-            st.dataframe(stats_df)
+            # Exibe as estatísticas e, ao lado, o tempo de cada etapa
+            col_stats, col_etapas = st.columns(2)
+            with col_stats:
+                st.subheader("Estatísticas da Filtragem")
+                stats_df = pd.DataFrame(stats)
+                st.dataframe(stats_df)
+            with col_etapas:
+                st.subheader("Tempo por Etapa")
+                etapas = st.session_state.get('etapas_filtragem', [])
+                if etapas:
+                    st.dataframe(pd.DataFrame(etapas))
+                    st.caption(f"Total: {sum(e['segundos'] for e in etapas):.2f}s")
+                if 'log_filtragem_json' in st.session_state:
+                    st.download_button(
+                        label="📄 Baixar log da execução (JSON)",
+                        data=st.session_state.log_filtragem_json,
+                        file_name="log_filtragem.json",
+                        mime='application/json'
+                    )
             
             # Exibe a prévia
             st.subheader("Prévia dos Dados Filtrados")
             st.dataframe(base_filtrada.head())
             
-            # Gera o CSV para download
-            csv_data = converter_df_para_csv(base_filtrada)
-            
             # Gera o nome do arquivo
-            nome_arquivo = "campanha_filtrada.csv"
+            nome_base = "campanha_filtrada"
             # Tenta pegar o nome da campanha gerado pelo filtradores.py
             if 'Campanha' in base_filtrada.columns:
-                nome_arquivo = f"{base_filtrada['Campanha'].iloc[0]}.csv"
-                
+                nome_base = f"{base_filtrada['Campanha'].iloc[0]}"
+
+            formato = st.selectbox(
+                "Formato do arquivo",
+                options=list(FORMATOS_EXPORTACAO),
+                format_func=lambda f: FORMATOS_EXPORTACAO[f][0],
+                key='formato_exportacao'
+            )
+            nome_arquivo = nome_arquivo_exportacao(nome_base, formato)
+
             st.download_button(
                 label="📥 Baixar Planilha Pronta",
-                data=csv_data,
+                data=gerar_arquivo_download(base_filtrada, formato, f"{nome_base}.csv"),
                 file_name=nome_arquivo,
-                mime='text/csv',
+                mime=FORMATOS_EXPORTACAO[formato][2],
                 use_container_width=True
             )
             
@@ -122,27 +247,42 @@ if 'df_bruto' in st.session_state and not st.session_state.df_bruto.empty:
             if st.button("🚀 Salvar esta Configuração no Supabase", use_container_width=True):
                 # Verifica se os parâmetros existem no session_state
                 if 'params_para_salvar' in st.session_state and 'configs_para_salvar' in st.session_state:
-                    with st.spinner("Salvando configuração..."):
-                        params = st.session_state.params_para_salvar
-                        configs = st.session_state.configs_para_salvar
-                        
-                        sucesso = salvar_configuracao_no_supabase(params, configs)
-                        
-                        if sucesso:
-                            st.success("Configuração salva com sucesso no Supabase!")
-                        else:
-                            st.error("Falha ao salvar a configuração.")
+                    params = st.session_state.params_para_salvar
+                    configs = st.session_state.configs_para_salvar
+
+                    # Só grava na fila local; o envio ao Supabase é feito em segundo plano
+                    sucesso = salvar_configuracao_no_supabase(params, configs)
+
+                    if sucesso:
+                        st.success("Configuração registrada! O envio ao Supabase é feito em segundo plano.")
+                    else:
+                        st.error("Falha ao salvar a configuração.")
                 else:
                     st.error("Erro: Não foi possível encontrar os parâmetros da última filtragem. Tente filtrar novamente.")
+
+            situacao_fila = obter_fila_auditoria().situacao()
+            if situacao_fila['pendentes'] or situacao_fila['falhas']:
+                st.caption(f"Fila de auditoria: {situacao_fila['pendentes']} linha(s) aguardando envio, "
+                           f"{situacao_fila['falhas']} com falha."
+                           + (f" Último erro: {situacao_fila['ultimo_erro']}" if situacao_fila['ultimo_erro'] else ""))
+                if situacao_fila['falhas'] and st.button("Tentar reenviar os logs com falha", key='reenviar_auditoria'):
+                    obter_fila_auditoria().reenviar_falhas()
+                    st.rerun()
             
         else:
-            # (AVISO MOVIDO) Agora, se a base estiver em session_state mas VAZIA,
+            # (AVISO MOVIDO) Agora, se a base estiver na sessão mas VAZIA,
             # ele exibirá o aviso corretamente.
             st.warning("Nenhum registro correspondeu aos filtros aplicados. Tente ajustar os parâmetros (ex: comissão mínima).")
     
     elif 'stats_filtragem' in st.session_state:
-        # Isso só será acionado se um erro tiver ocorrido E a base_filtrada foi deletada
-        st.warning("A filtragem rodou, mas nenhum resultado foi gerado. Verifique os parâmetros.")
+        # Após um erro as estatísticas também são apagadas: aqui o armazém descartou o resultado
+        # (limite de disco atingido por outras sessões)
+        st.info("O resultado da última filtragem foi descartado para liberar espaço. Aplique os filtros novamente.")
     
 else:
-    st.info("Aguardando o carregamento dos arquivos CSV para iniciar a configuração da campanha.")
\ No newline at end of file
+    st.info("Aguardando o carregamento dos arquivos CSV para iniciar a configuração da campanha.")
+
+if armazem.contem(sessao, 'df_bruto'):
+    uso_armazem = armazem.uso(sessao)
+    uso_sessao.caption(f"🗄️ Bases desta sessão: {uso_armazem['memoria'] / 2**20:,.0f} MB em memória, "
+                       f"{uso_armazem['disco'] / 2**20:,.0f} MB em disco.")
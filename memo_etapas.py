@@ -0,0 +1,177 @@
+"""
+Memória das etapas do motor de filtragem entre execuções.
+
+Ajustar comissão mínima/máxima, margem limite ou % de ConvAI só muda a
+finalização, e editar a config #4 não muda as configs #1 a #3. Cada etapa é
+identificada pelo hash das entradas que de fato lê:
+- pré-processamento: impressão digital da base + filtros de exclusão e idade;
+- config i: chave da etapa anterior + convênio, tipo de campanha e a própria config
+  (encadeada, então mudar a config #2 invalida da #2 em diante).
+Uma nova execução recomeça da primeira etapa cujas entradas mudaram. A base
+pré-processada é guardada uma vez (no ArmazemSessoes, quando o memo é de uma
+sessão, contando nos limites de memória e disco dele); de cada config guarda-se
+só o que ela alterou (posições e novos valores das suas colunas de saída), as
+estatísticas e os eventos emitidos, que são reemitidos quando a etapa é
+reaproveitada. Base guardada e base restaurada são cópias rasas: com
+Copy-on-Write, as etapas seguintes copiam só as colunas em que escrevem.
+A finalização e o override GOVSP sempre rodam (são baratos e dependem dos
+parâmetros que mais mudam).
+"""
+
+import hashlib
+import json
+
+import numpy as np
+import pandas as pd
+
+# Parâmetros gerais lidos por _preprocessar_base
+PARAMS_PRE_PROCESSAMENTO = (
+    'selecao_lotacao', 'selecao_lotacao_palavras', 'selecao_vinculos', 'selecao_vinculos_palavras',
+    'palavras_ignorar_acentos', 'data_limite_idade',
+)
+
+
+def _hash(*partes) -> str:
+    texto = json.dumps(partes, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.blake2b(texto.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def impressao_base(df: pd.DataFrame) -> str:
+    """
+    Impressão digital da base. Bases lidas por ler_arquivos_csv já trazem o hash do
+    conteúdo dos arquivos em `df.attrs['impressao']`; nas demais ela é calculada
+    (hash das linhas, colunas e tipos) e guardada no mesmo atributo.
+    """
+    impressao = df.attrs.get('impressao')
+    if impressao:
+        return impressao
+    linhas = pd.util.hash_pandas_object(df, index=False).to_numpy()
+    impressao = _hash(hashlib.blake2b(linhas.tobytes(), digest_size=16).hexdigest(),
+                      list(df.columns), [str(t) for t in df.dtypes])
+    df.attrs['impressao'] = impressao
+    return impressao
+
+
+def chave_entradas(df: pd.DataFrame, *entradas) -> str:
+    """Chave de um cálculo sobre `df`: a impressão digital da base com as demais entradas."""
+    return _hash(impressao_base(df), *entradas)
+
+
+def diferencas_colunas(originais: dict, base: pd.DataFrame) -> dict:
+    """
+    {coluna: (posições, valores novos)} do que mudou em `base` em relação às
+    séries `originais`. Colunas que mudaram de tipo vão inteiras (posições None).
+    """
+    alteracoes = {}
+    for coluna, antes in originais.items():
+        depois = base[coluna]
+        try:
+            if antes.dtype != depois.dtype:
+                raise TypeError
+            # Sem `|=`: com Copy-on-Write o to_numpy pode devolver um array só de leitura
+            iguais = (antes.eq(depois).to_numpy(dtype=bool, na_value=False)
+                      | (antes.isna() & depois.isna()).to_numpy(dtype=bool))
+        except (TypeError, ValueError):
+            alteracoes[coluna] = (None, depois.copy())
+            continue
+        posicoes = np.flatnonzero(~iguais)
+        if len(posicoes):
+            alteracoes[coluna] = (posicoes, depois.iloc[posicoes].to_numpy())
+    return alteracoes
+
+
+def aplicar_diferencas(base: pd.DataFrame, alteracoes: dict):
+    """Reaplica no lugar as alterações registradas por `diferencas_colunas`."""
+    for coluna, (posicoes, valores) in alteracoes.items():
+        if posicoes is None:
+            base[coluna] = valores.to_numpy()
+            continue
+        serie = base[coluna].copy()
+        serie.iloc[posicoes] = valores
+        base[coluna] = serie
+
+
+class MemoEtapas:
+    """
+    Resultados da última execução de uma sessão: a base pré-processada (uma só)
+    e, para cada config, as alterações que ela fez. Guardar uma nova etapa
+    descarta as seguintes, que dependiam da anterior.
+
+    Com `armazem` e `sessao`, a base pré-processada fica no ArmazemSessoes (e pode
+    sair da memória ou ser descartada pelos limites dele, o que só faz a etapa
+    rodar de novo); sem eles, fica no próprio memo.
+    """
+
+    NOME_ARMAZEM = 'memo_pre_processamento'
+
+    def __init__(self, armazem=None, sessao: str = None):
+        self._armazem = armazem if sessao is not None else None
+        self._sessao = sessao
+        self.limpar()
+
+    def limpar(self):
+        self.chave_pre_processamento = None
+        self._base_pre_processada = None
+        self._eventos_pre_processamento = []
+        self.configs = []
+        if self._armazem is not None:
+            self._armazem.remover(self._sessao, self.NOME_ARMAZEM)
+
+    @staticmethod
+    def chave_pre(df: pd.DataFrame, params: dict) -> str:
+        return _hash(impressao_base(df), {p: params.get(p) for p in PARAMS_PRE_PROCESSAMENTO})
+
+    @staticmethod
+    def chave_config(chave_anterior: str, convenio, tipo_campanha, config: dict) -> str:
+        return _hash(chave_anterior, convenio, tipo_campanha, config)
+
+    def _base(self):
+        if self._armazem is not None:
+            return self._armazem.obter(self._sessao, self.NOME_ARMAZEM)
+        return self._base_pre_processada
+
+    def restaurar_pre_processamento(self, chave: str):
+        """(cópia rasa da base pré-processada, eventos) se a chave bate e ela ainda existe, senão None."""
+        if chave != self.chave_pre_processamento:
+            return None
+        base = self._base()
+        if base is None:
+            return None
+        # Rasa: as etapas seguintes escrevem na base, e o Copy-on-Write copia só as colunas alteradas
+        return base.copy(deep=False), self._eventos_pre_processamento
+
+    def guardar_pre_processamento(self, chave: str, base: pd.DataFrame, eventos: list):
+        self.limpar()
+        self.chave_pre_processamento = chave
+        if self._armazem is not None:
+            self._armazem.guardar(self._sessao, self.NOME_ARMAZEM, base.copy(deep=False))
+        else:
+            self._base_pre_processada = base.copy(deep=False)
+        self._eventos_pre_processamento = list(eventos)
+
+    def compartilhar_pre_processamento(self) -> 'MemoEtapas':
+        """
+        Novo memo com a mesma base pré-processada (sem copiá-la) e nenhuma config,
+        para campanhas que partem do mesmo pré-processamento em paralelo.
+        """
+        novo = MemoEtapas()
+        novo.chave_pre_processamento = self.chave_pre_processamento
+        novo._base_pre_processada = self._base()
+        novo._eventos_pre_processamento = self._eventos_pre_processamento
+        return novo
+
+    def config_memorizada(self, indice: int, chave: str):
+        """Etapa guardada da config `indice` se a sua chave bate, senão None."""
+        if indice < len(self.configs) and self.configs[indice]['chave'] == chave:
+            return self.configs[indice]
+        return None
+
+    def guardar_config(self, indice: int, chave: str, etapa: dict, eventos: list):
+        """
+        Guarda a config `indice` (dict com 'alteracoes', 'estatisticas', 'linhas_saida'
+        e 'status'). `etapa` None (config que falhou) só descarta as etapas a partir dela.
+        """
+        del self.configs[indice:]
+        if etapa is None or indice != len(self.configs):
+            return
+        self.configs.append({**etapa, 'chave': chave, 'eventos': list(eventos)})
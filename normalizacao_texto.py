@@ -0,0 +1,93 @@
+"""
+Normalização vetorizada das colunas de texto (nome, lotação, vínculo, secretaria).
+
+As transformações usam os métodos `.str` do pandas (kernels do Arrow para o
+dtype de texto) em vez de um `apply` linha a linha. Colunas categóricas são
+normalizadas só nas categorias, e colunas de texto com poucos valores distintos
+só nos valores únicos, com o resultado propagado às linhas pelos códigos.
+"""
+
+import re
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+from dados_constantes import NORMALIZACAO_TEXTO
+
+# Colunas de texto com até esta fração de valores distintos (estimada por
+# amostra) são normalizadas pelos valores únicos
+FRACAO_MAXIMA_UNICOS = 0.5
+TAMANHO_AMOSTRA_CARDINALIDADE = 10_000
+
+_MARCAS_DIACRITICAS = re.compile("[\u0300-\u036f]")
+
+
+def remover_acentos(textos: pd.Series) -> pd.Series:
+    """Decompõe (NFKD) e descarta as marcas diacríticas combinantes: "João" -> "Joao"."""
+    return textos.str.normalize('NFKD').str.replace(_MARCAS_DIACRITICAS.pattern, "", regex=True)
+
+
+def remover_acentos_texto(texto: str) -> str:
+    """Versão de `remover_acentos` para um único texto."""
+    return _MARCAS_DIACRITICAS.sub("", unicodedata.normalize('NFKD', texto))
+
+
+def _normalizar_valores(textos: pd.Series, opcoes: dict) -> pd.Series:
+    """Aplica as opções ativas a uma Series de texto (nulos são preservados)."""
+    if opcoes.get('espacos'):
+        textos = textos.str.strip().str.replace(r"\s+", " ", regex=True)
+    if opcoes.get('sem_acentos'):
+        textos = remover_acentos(textos)
+    if opcoes.get('titulo'):
+        textos = textos.str.title()
+    return textos
+
+
+def _baixa_cardinalidade(serie: pd.Series) -> bool:
+    amostra = serie if len(serie) <= TAMANHO_AMOSTRA_CARDINALIDADE else \
+        serie.sample(TAMANHO_AMOSTRA_CARDINALIDADE, random_state=0)
+    return amostra.nunique(dropna=True) <= FRACAO_MAXIMA_UNICOS * len(amostra)
+
+
+def _normalizar_categorica(serie: pd.Series, opcoes: dict) -> pd.Series:
+    categorias = _normalizar_valores(pd.Series(serie.cat.categories, dtype='str'), opcoes)
+    # Categorias distintas podem virar o mesmo texto ("SAUDE"/"Saude"): refatora
+    codigos_novos, categorias_novas = pd.factorize(categorias.to_numpy())
+    codigos = serie.cat.codes.to_numpy()
+    codigos = np.where(codigos >= 0, codigos_novos[codigos], -1)
+    return pd.Series(pd.Categorical.from_codes(codigos, categorias_novas),
+                     index=serie.index, name=serie.name)
+
+
+def _normalizar_por_unicos(serie: pd.Series, opcoes: dict) -> pd.Series:
+    codigos, unicos = pd.factorize(serie)
+    normalizados = _normalizar_valores(pd.Series(unicos, dtype='str'), opcoes)
+    # Código -1 (nulo) aponta para o nulo acrescentado no fim
+    valores = np.append(normalizados.to_numpy(dtype=object, na_value=None), None)
+    return pd.Series(valores[codigos], index=serie.index, name=serie.name, dtype=serie.dtype)
+
+
+def normalizar_serie(serie: pd.Series, opcoes: dict) -> pd.Series:
+    """Normaliza uma coluna de texto conforme `opcoes` ('titulo', 'sem_acentos', 'espacos')."""
+    if not any(opcoes.values()) or serie.empty:
+        return serie
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        return _normalizar_categorica(serie, opcoes)
+    if not pd.api.types.is_string_dtype(serie):
+        serie = serie.astype('str')
+    if _baixa_cardinalidade(serie):
+        return _normalizar_por_unicos(serie, opcoes)
+    return _normalizar_valores(serie, opcoes)
+
+
+def normalizar_colunas(base: pd.DataFrame, configuracao: dict = None) -> pd.DataFrame:
+    """
+    Normaliza no lugar as colunas de `base` listadas em `configuracao`
+    (padrão: NORMALIZACAO_TEXTO de dados_constantes) e retorna a própria base.
+    """
+    configuracao = NORMALIZACAO_TEXTO if configuracao is None else configuracao
+    for coluna, opcoes in configuracao.items():
+        if coluna in base.columns:
+            base[coluna] = normalizar_serie(base[coluna], opcoes)
+    return base
@@ -3,6 +3,7 @@
 import streamlit as st
 from supabase import create_client, Client
 from datetime import datetime
+import time
 
 # --- Configuração da Página ---
 st.set_page_config(
@@ -16,6 +17,8 @@ st.title("🐞 Reportar um Erro ou Problema")
 LISTA_PRODUTOS = ['Novo', 'Benefício', 'Cartão', 'Benefício & Cartão', 'Outro']
 LISTA_CONVENIOS = ['govsp', 'govmt', 'Outro / Não Aplicável']
 STATUS_OPTIONS = ['Aberto', 'Em Análise', 'Resolvido']
+TAMANHO_PAGINA_RELATORIOS = 25
+VALIDADE_PAGINA_SEGUNDOS = 300 # Página guardada na sessão por até 5 minutos
 
 # --- Conexão com o Supabase ---
 @st.cache_resource
@@ -37,37 +40,84 @@ supabase = init_supabase_connection()
 
 # --- Funções de Callback e Fetch ---
 
-@st.cache_data(ttl=300) # Cache de 5 minutos
-def fetch_reports():
-    """Busca todos os relatórios, dos mais novos para os mais antigos."""
+def fetch_reports(status: str = None, convenio: str = None, apos=None, limite: int = TAMANHO_PAGINA_RELATORIOS):
+    """
+    Busca uma página de relatórios, dos mais novos para os mais antigos, com os
+    filtros de status e convênio aplicados no servidor. Paginação por chave: `apos`
+    é o cursor (created_at, id) da última linha da página anterior.
+    Retorna (relatórios, cursor da próxima página ou None), ou None em caso de erro.
+    """
     try:
-        response = supabase.table("bug_reports").select("*").order("created_at", desc=True).execute()
-        
-        # Retorna apenas a lista de dados, e não o objeto de resposta
-        return response.data 
+        query = supabase.table("bug_reports").select("*").order("created_at", desc=True).order("id", desc=True)
+        if status and status != "Todos":
+            query = query.eq("status", status)
+        if convenio and convenio != "Todos":
+            query = query.eq("convenio", convenio)
+        if apos is not None:
+            created_at, report_id = apos
+            query = query.or_(f"created_at.lt.{created_at},and(created_at.eq.{created_at},id.lt.{report_id})")
+
+        # Uma linha a mais só para saber se existe uma próxima página
+        reports = query.limit(limite + 1).execute().data
+        proximo = (reports[limite - 1]['created_at'], reports[limite - 1]['id']) if len(reports) > limite else None
+        return reports[:limite], proximo
     
     except Exception as e:
         st.error(f"Erro ao buscar relatórios: {e}")
         return None
 
+def obter_pagina_relatorios(status: str, convenio: str, apos, limite: int, forcar: bool = False):
+    """
+    Página atual da lista, guardada na sessão. Só vai ao Supabase quando os filtros
+    ou a página mudam, ao recarregar ou depois de VALIDADE_PAGINA_SEGUNDOS.
+    """
+    chave = (status, convenio, apos, limite)
+    pagina = st.session_state.get('pagina_relatorios')
+    if (forcar or pagina is None or pagina['chave'] != chave
+            or time.time() - pagina['buscada_em'] > VALIDADE_PAGINA_SEGUNDOS):
+        resultado = fetch_reports(status, convenio, apos, limite)
+        if resultado is None:
+            return None
+        reports, proximo = resultado
+        # Os selectboxes de status passam a refletir o que veio do servidor
+        for report in reports:
+            st.session_state.pop(f"status_select_{report['id']}", None)
+        pagina = {'chave': chave, 'reports': reports, 'proximo': proximo, 'buscada_em': time.time()}
+        st.session_state.pagina_relatorios = pagina
+    return pagina
+
+def recarregar_relatorios():
+    """Descarta a página guardada e volta para a primeira."""
+    st.session_state.pop('pagina_relatorios', None)
+    st.session_state.cursores_relatorios = [None]
+
 def update_status_callback(report_id: int):
     """
     Função chamada quando um selectbox de status é alterado.
-    Ela atualiza o status no Supabase.
+    Atualiza o status no Supabase e, no lugar, o relatório na página guardada
+    (sem buscar a lista de novo). Se a atualização falhar, o status volta ao anterior.
     """
+    # Pega o novo valor do selectbox pelo seu 'key'
+    new_status = st.session_state[f"status_select_{report_id}"]
+    pagina = st.session_state.get('pagina_relatorios')
+    report = next((r for r in pagina['reports'] if r['id'] == report_id), None) if pagina else None
+    status_anterior = report.get('status', 'Aberto') if report else None
+
+    # Atualização otimista: a página já mostra o novo status
+    if report is not None:
+        report['status'] = new_status
     try:
-        # Pega o novo valor do selectbox pelo seu 'key'
-        new_status = st.session_state[f"status_select_{report_id}"]
-        
         # Atualiza no Supabase
         supabase.table("bug_reports").update({"status": new_status}).eq("id", report_id).execute()
         
         st.toast(f"Status do Relatório #{report_id} atualizado para '{new_status}'!", icon="✅")
         
-        # Limpa o cache da função fetch_reports para recarregar a lista
-        fetch_reports.clear()
-        
     except Exception as e:
+        if report is not None:
+            report['status'] = status_anterior
+            st.session_state[f"status_select_{report_id}"] = (
+                status_anterior if status_anterior in STATUS_OPTIONS else STATUS_OPTIONS[0]
+            )
         st.toast(f"Erro ao atualizar status: {e}", icon="❌")
 
 
@@ -113,7 +163,7 @@ if supabase:
                     response = supabase.table("bug_reports").insert(data_para_inserir).execute()
                     if response.data:
                         st.success("🎉 Relatório enviado com sucesso! Obrigado pelo feedback.")
-                        fetch_reports.clear() # Limpa o cache para mostrar o novo item na lista
+                        recarregar_relatorios() # Volta para a primeira página, que mostra o novo item
                     else:
                         st.error("Houve um problema ao enviar o relatório.")
     
@@ -121,10 +171,21 @@ if supabase:
 
     # 2. Lista de Relatórios Existentes
     st.header("Relatórios de Erros Atuais")
-    st.button("Recarregar Lista", on_click=fetch_reports.clear)
+    if 'cursores_relatorios' not in st.session_state:
+        st.session_state.cursores_relatorios = [None] # Cursores das páginas já vistas (para voltar)
+
+    col_filtro_status, col_filtro_conv, col_recarregar = st.columns([2, 2, 1])
+    filtro_status = col_filtro_status.selectbox(
+        "Filtrar por Status", ["Todos"] + STATUS_OPTIONS, key="filtro_status_relatorios", on_change=recarregar_relatorios
+    )
+    filtro_convenio = col_filtro_conv.selectbox(
+        "Filtrar por Convênio", ["Todos"] + LISTA_CONVENIOS, key="filtro_convenio_relatorios", on_change=recarregar_relatorios
+    )
+    col_recarregar.button("Recarregar Lista", on_click=recarregar_relatorios)
 
-    # A variável agora contém a lista de dados diretamente
-    reports_data = fetch_reports() 
+    cursores = st.session_state.cursores_relatorios
+    pagina = obter_pagina_relatorios(filtro_status, filtro_convenio, cursores[-1], TAMANHO_PAGINA_RELATORIOS)
+    reports_data = pagina['reports'] if pagina else None
 
     # Verifica se a lista não é None e não está vazia
     if reports_data: 
@@ -167,16 +228,27 @@ if supabase:
                 with c4:
                     st.caption(report['descricao'])
                 with c5:
-                    # Este é o Selectbox que atualiza o status
+                    # Este é o Selectbox que atualiza o status (valor inicial pelo Session State,
+                    # que o callback também usa para desfazer uma atualização que falhou)
+                    if f"status_select_{report_id}" not in st.session_state:
+                        st.session_state[f"status_select_{report_id}"] = STATUS_OPTIONS[status_index]
                     st.selectbox(
                         "Alterar Status",
                         options=STATUS_OPTIONS,
-                        index=status_index,
                         key=f"status_select_{report_id}", # Chave única para o widget
                         label_visibility="collapsed",
                         on_change=update_status_callback, # Função chamada na mudança
                         args=(report_id,) # Argumento para a função
                     )
+
+        col_anterior, col_pagina, col_proxima = st.columns([1, 2, 1])
+        if col_anterior.button("◀ Anterior", disabled=len(cursores) == 1, use_container_width=True):
+            cursores.pop()
+            st.rerun()
+        col_pagina.caption(f"Página {len(cursores)}")
+        if col_proxima.button("Próxima ▶", disabled=pagina['proximo'] is None, use_container_width=True):
+            cursores.append(pagina['proximo'])
+            st.rerun()
     else:
         st.info("Nenhum relatório de erro encontrado.")
 
@@ -1,6 +1,6 @@
 import streamlit as st
 import pandas as pd
-from supabase_utils import consultar_coeficientes # Importa a função de consulta atualizada
+from supabase_utils import consultar_coeficientes, obter_espelho_auditoria, sincronizar_espelho_auditoria
 
 st.set_page_config(
     layout="wide",
@@ -18,14 +18,46 @@ col1, col2 = st.columns(2)
 convenio_selecionado = col1.selectbox("Filtrar por Convênio:", convenios_filtro, key="filtro_convenio")
 produto_selecionado = col2.selectbox("Filtrar por Produto:", produtos_filtro, key="filtro_produto")
 
+tamanho_pagina = st.selectbox("Registros por página:", [50, 100, 250, 500], index=1, key="tamanho_pagina")
+
 if st.button("Consultar Histórico", use_container_width=True, type="primary"):
-    
-    with st.spinner("Buscando dados no Supabase..."):
-        # Usa a nova função de consulta
-        resultados = consultar_coeficientes(convenio_selecionado, produto_selecionado)
-        
+    # Nova consulta: volta para a primeira página (cursores das páginas já vistas, para voltar)
+    st.session_state.consulta_coeficientes = {
+        'convenio': convenio_selecionado, 'produto': produto_selecionado, 'cursores': [None],
+    }
+
+if 'consulta_coeficientes' in st.session_state:
+    consulta = st.session_state.consulta_coeficientes
+    if st.button("🔄 Atualizar com o Supabase", key="atualizar_historico"):
+        with st.spinner("Buscando registros novos no Supabase..."):
+            novos = sincronizar_espelho_auditoria(forcar=True)
+        st.toast(f"{novos} registro(s) novo(s).")
+
+    # Resumo do índice agregado: um banco/produto/convênio por linha
+    sincronizar_espelho_auditoria()
+    resumo_grupos = obter_espelho_auditoria().resumo_grupos(consulta['convenio'], consulta['produto'], dias=90)
+    if resumo_grupos:
+        st.subheader("Resumo por banco (mediana e faixa dos últimos 90 dias)")
+        st.dataframe(pd.DataFrame(resumo_grupos).rename(columns={
+            'produto_configurado': 'Produto', 'ultimo_em': 'Último em',
+            'ultimo_coeficiente': 'Último coef.', 'mediana_coeficiente': 'Mediana coef.',
+            'minimo_coeficiente': 'Mín. coef.', 'maximo_coeficiente': 'Máx. coef.',
+            'quantidade_coeficiente': 'Registros', 'ultimo_comissao': 'Última comissão',
+            'mediana_comissao': 'Mediana comissão', 'minimo_comissao': 'Mín. comissão',
+            'maximo_comissao': 'Máx. comissão', 'quantidade_comissao': 'Registros (comissão)',
+        }), use_container_width=True)
+
+    with st.spinner("Consultando histórico..."):
+        # Servido pela cópia local; só o que é novo desde a última sincronização vem do Supabase
+        resultados, proximo_cursor = consultar_coeficientes(
+            consulta['convenio'], consulta['produto'], limite=tamanho_pagina, apos=consulta['cursores'][-1]
+        )
+        total = obter_espelho_auditoria().contar(consulta['convenio'], consulta['produto'])
+        pagina = len(consulta['cursores'])
+
         if resultados:
-            st.success(f"Encontrados {len(resultados)} registros.")
+            st.success(f"Encontrados {total} registros. Página {pagina} "
+                       f"(registros {(pagina - 1) * tamanho_pagina + 1} a {(pagina - 1) * tamanho_pagina + len(resultados)}).")
             
             # Converte a lista de dicts para um DataFrame
             df_resultados = pd.DataFrame(resultados)
@@ -74,6 +106,14 @@ if st.button("Consultar Histórico", use_container_width=True, type="primary"):
             
             st.dataframe(df_display, use_container_width=True)
             
+            col_anterior, col_proxima = st.columns(2)
+            if col_anterior.button("◀ Página anterior", disabled=pagina == 1, use_container_width=True):
+                consulta['cursores'].pop()
+                st.rerun()
+            if col_proxima.button("Próxima página ▶", disabled=proximo_cursor is None, use_container_width=True):
+                consulta['cursores'].append(proximo_cursor)
+                st.rerun()
+
             with st.expander("Ver dados JSON completos (para copiar)"):
                 st.json(resultados)
         else:
@@ -0,0 +1,239 @@
+"""
+Planos compilados para as condições dinâmicas da UI (E/OU) das configurações de banco.
+
+As `condicoes` de cada configuração são validadas e pré-processadas uma única vez
+por execução (valores convertidos, regex montadas) e avaliadas como arrays
+booleanos do NumPy. As conversões de coluna (numérica, data, valores distintos) ficam em um
+CacheColunas compartilhado entre todas as configurações da execução, então cada
+coluna é convertida no máximo uma vez por tipo.
+"""
+
+import contextvars
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+from registro_eventos import obter_registrador
+from conversao_datas import converter_data, converter_datas
+from valores_unicos import codificar_valores, expandir_para_linhas
+from busca_palavras import mascara_contem_palavras
+
+
+def para_float64(serie: pd.Series) -> np.ndarray:
+    """
+    Valores numéricos da coluna em float64. Margens guardadas em float32 (ver
+    ESQUEMA_COLUNAS) são arredondadas de volta aos centavos, para que os cálculos
+    e cortes usem exatamente o valor em reais do arquivo.
+    """
+    if serie.dtype == 'float32':
+        return np.round(serie.to_numpy(dtype='float64'), 2)
+    if pd.api.types.is_numeric_dtype(serie) and not pd.api.types.is_bool_dtype(serie):
+        return serie.to_numpy(dtype='float64', na_value=np.nan)
+    return pd.to_numeric(serie, errors='coerce').to_numpy(dtype='float64', na_value=np.nan)
+
+
+class CacheColunas:
+    """Visões tipadas das colunas da base de trabalho, calculadas sob demanda e reutilizadas."""
+
+    def __init__(self, base: pd.DataFrame):
+        self.base = base
+        self._visoes = {}
+        self._planos = {}
+
+    def _obter(self, coluna: str, tipo: str, converter):
+        chave = (coluna, tipo)
+        if chave not in self._visoes:
+            self._visoes[chave] = converter(self.base[coluna])
+        return self._visoes[chave]
+
+    def numerica(self, coluna: str) -> np.ndarray:
+        """Coluna como float64 (margens já tipadas na leitura não são reconvertidas)."""
+        return self._obter(coluna, 'numerica', para_float64)
+
+    def data(self, coluna: str) -> pd.Series:
+        """Coluna como datetime64 (conversor memoizado de conversao_datas; dia primeiro)."""
+        return self._obter(coluna, 'data', converter_datas)
+
+    def codificada(self, coluna: str):
+        """
+        (códigos por linha, valores distintos como texto): comparações de texto e
+        buscas por palavra são avaliadas uma vez por valor distinto.
+        """
+        return self._obter(coluna, 'codificada', codificar_valores)
+
+    def texto_preenchido(self, coluna: str) -> np.ndarray:
+        """Coluna como texto com nulos vazios (`fillna('')`), usada em Coluna = Coluna."""
+        return self._obter(coluna, 'texto_preenchido',
+                           lambda s: s.astype(object).where(s.notna(), '').astype(str).to_numpy(dtype=object))
+
+    def invalidar(self, colunas):
+        """Descarta as visões de colunas que foram reescritas na base."""
+        colunas = set(colunas)
+        self._visoes = {chave: v for chave, v in self._visoes.items() if chave[0] not in colunas}
+
+    def plano(self, config: dict) -> 'PlanoCondicoes':
+        """Plano compilado da configuração (compilado na primeira vez em que é pedido)."""
+        chave = id(config)
+        if chave not in self._planos:
+            self._planos[chave] = (config, compilar_condicoes(config, self.base.columns))
+        return self._planos[chave][1]
+
+
+def _nenhuma_linha(cache: CacheColunas) -> np.ndarray:
+    return np.zeros(len(cache.base), dtype=bool)
+
+
+def _comparar(valores, operador: str, referencia) -> np.ndarray:
+    resultado = (valores < referencia) if operador == '<' else (valores > referencia)
+    if isinstance(resultado, pd.Series):
+        return resultado.to_numpy(dtype=bool, na_value=False)
+    return np.asarray(resultado, dtype=bool)
+
+
+def _compilar_coluna_coluna(c: dict, c_idx: int, colunas):
+    col1 = c.get('coluna1')
+    col2 = c.get('coluna2')
+    if not (col1 and col2 and col1 in colunas and col2 in colunas):
+        obter_registrador().aviso(f"Condição {c_idx+1} 'coluna_coluna' ignorada: Colunas '{col1}' ou '{col2}' inválidas ou não encontradas.")
+        return _nenhuma_linha
+
+    def avaliar(cache):
+        # Igual como número OU igual como texto
+        m_num = cache.numerica(col1) == cache.numerica(col2)
+        m_str = cache.texto_preenchido(col1) == cache.texto_preenchido(col2)
+        return m_num | np.asarray(m_str, dtype=bool)
+    return avaliar
+
+
+def _compilar_coluna_valor(c: dict, c_idx: int, colunas):
+    coluna_nome = c.get('coluna')
+    valor_str = c.get('valor')
+    operador = c.get('operador')
+
+    if not all([coluna_nome, valor_str is not None, operador]):
+        obter_registrador().aviso(f"Condição {c_idx+1} 'coluna_valor' incompleta: {c}")
+        return None
+    if coluna_nome not in colunas:
+        obter_registrador().aviso(f"Condição {c_idx+1} 'coluna_valor' ignorada: Coluna '{coluna_nome}' não encontrada.")
+        return None
+
+    valor_str_cleaned = str(valor_str).strip()
+    valor_num = pd.to_numeric(valor_str_cleaned, errors='coerce')
+    if not pd.isna(valor_num):
+        return lambda cache: _comparar(cache.numerica(coluna_nome), operador, valor_num)
+
+    # Mesmo conversor (dia primeiro) da coluna: '01/02/1970' é 1º de fevereiro nos dois lados
+    valor_data = converter_data(valor_str_cleaned)
+
+    def avaliar(cache):
+        if valor_data is not None:
+            col_data = cache.data(coluna_nome)
+            if not col_data.isna().all():
+                return _comparar(col_data, operador, valor_data)
+        codigos, valores = cache.codificada(coluna_nome)
+        return expandir_para_linhas(_comparar(valores, operador, valor_str_cleaned), codigos)
+    return avaliar
+
+
+def _compilar_coluna_palavras(c: dict, c_idx: int, colunas):
+    coluna_nome = c.get('coluna')
+    palavras = c.get('palavras', [])
+
+    if not coluna_nome or not palavras:
+        obter_registrador().aviso(f"Condição {c_idx+1} 'coluna_palavras' incompleta: {c}")
+        return None
+    if coluna_nome not in colunas:
+        obter_registrador().aviso(f"Condição {c_idx+1} 'coluna_palavras' ignorada: Coluna '{coluna_nome}' não encontrada.")
+        return None
+
+    palavras_limpas = [str(p).strip() for p in palavras if str(p).strip()]
+    if not palavras_limpas:
+        return _nenhuma_linha
+    ignorar_acentos = bool(c.get('ignorar_acentos', False))
+
+    def avaliar(cache):
+        codigos, valores = cache.codificada(coluna_nome)
+        return expandir_para_linhas(mascara_contem_palavras(valores, palavras_limpas, ignorar_acentos), codigos)
+    return avaliar
+
+
+_COMPILADORES = {
+    'coluna_coluna': _compilar_coluna_coluna,
+    'coluna_valor': _compilar_coluna_valor,
+    'coluna_palavras': _compilar_coluna_palavras,
+}
+
+
+class PlanoCondicoes:
+    """Condições de uma configuração já validadas, prontas para avaliar sobre um CacheColunas."""
+
+    def __init__(self, tem_condicoes: bool, avaliadores: list, operador_logico: str):
+        self.tem_condicoes = tem_condicoes
+        self.avaliadores = avaliadores  # lista de (descrição, função(cache) -> np.ndarray)
+        self.operador_logico = operador_logico
+
+    def avaliar(self, cache: CacheColunas) -> np.ndarray:
+        """Máscara combinada das condições (sem considerar a coluna 'tratado')."""
+        n = len(cache.base)
+        if not self.tem_condicoes:
+            return np.ones(n, dtype=bool)
+        if not self.avaliadores:
+            return np.zeros(n, dtype=bool)
+
+        e_logico = self.operador_logico == "E (AND)"
+        combinada = np.ones(n, dtype=bool) if e_logico else np.zeros(n, dtype=bool)
+        for c_idx, (descricao, avaliar) in enumerate(self.avaliadores):
+            try:
+                mascara = avaliar(cache)
+            except Exception as e:
+                obter_registrador().erro(f"Erro inesperado ao processar condição #{c_idx+1} ({descricao}): {e}")
+                mascara = np.zeros(n, dtype=bool)
+            if e_logico:
+                combinada &= mascara
+            else:
+                combinada |= mascara
+        return combinada
+
+
+def compilar_condicoes(config: dict, colunas) -> PlanoCondicoes:
+    """Valida e pré-processa as condições de `config` para as colunas disponíveis na base."""
+    condicoes = config.get("condicoes", []) or []
+    avaliadores = []
+    for c_idx, c in enumerate(condicoes):
+        try:
+            tipo = c.get("tipo")
+            descricao = f"{tipo} '{c.get('coluna')}'"
+            compilador = _COMPILADORES.get(tipo)
+            if compilador is None:
+                # Tipo desconhecido: nenhuma linha atende
+                avaliadores.append((descricao, _nenhuma_linha))
+                continue
+            avaliar = compilador(c, c_idx, colunas)
+            if avaliar is not None:
+                avaliadores.append((descricao, avaliar))
+        except Exception as e:
+            obter_registrador().erro(f"Erro inesperado ao processar condição #{c_idx+1}: {e}")
+            avaliadores.append((f"condição #{c_idx+1}", _nenhuma_linha))
+    return PlanoCondicoes(bool(condicoes), avaliadores, config.get("operador_logico", "E (AND)"))
+
+
+_cache_atual = contextvars.ContextVar('cache_colunas', default=None)
+
+
+@contextmanager
+def usar_cache_colunas(cache: CacheColunas):
+    """Compartilha `cache` com todas as avaliações de condição feitas dentro do bloco."""
+    token = _cache_atual.set(cache)
+    try:
+        yield cache
+    finally:
+        _cache_atual.reset(token)
+
+
+def obter_cache_colunas(base: pd.DataFrame) -> CacheColunas:
+    """Cache ativo para `base` ou, fora de uma execução, um cache descartável."""
+    cache = _cache_atual.get()
+    if cache is not None and cache.base is base:
+        return cache
+    return CacheColunas(base)
@@ -0,0 +1,88 @@
+"""
+Registro de eventos do motor de filtragem.
+
+O motor (filtradores, juntar_arquivos) não fala com a interface: ele emite
+eventos (info, aviso, erro, log agrupado) para o registrador ativo, que decide
+o que fazer com eles. A interface Streamlit usa o RegistradorStreamlit
+(em frontend_componentes); a linha de comando usa o RegistradorLogging.
+"""
+
+import contextvars
+import logging
+import traceback
+from contextlib import contextmanager
+
+NIVEIS = ('info', 'aviso', 'erro', 'log')
+
+
+class RegistradorEventos:
+    """
+    Registrador base: guarda os eventos em memória, na ordem em que chegam.
+    Subclasses sobrescrevem `_tratar` para encaminhar cada evento.
+    """
+
+    def __init__(self):
+        self.eventos = []
+
+    def emitir(self, nivel: str, mensagem: str, grupo: str = None, detalhe: str = None):
+        evento = {'nivel': nivel, 'mensagem': str(mensagem), 'grupo': grupo, 'detalhe': detalhe}
+        self.eventos.append(evento)
+        self._tratar(evento)
+
+    def _tratar(self, evento: dict):
+        pass
+
+    def info(self, mensagem: str):
+        self.emitir('info', mensagem)
+
+    def aviso(self, mensagem: str):
+        self.emitir('aviso', mensagem)
+
+    def erro(self, mensagem: str, detalhe: str = None):
+        self.emitir('erro', mensagem, detalhe=detalhe)
+
+    def excecao(self, mensagem: str):
+        """Registra um erro anexando o traceback da exceção em tratamento."""
+        self.erro(mensagem, detalhe=traceback.format_exc())
+
+    def log(self, grupo: str, mensagem: str):
+        """Linha de log detalhado, agrupada por etapa (ex: 'Logs de Finalização')."""
+        self.emitir('log', mensagem, grupo=grupo)
+
+
+class RegistradorLogging(RegistradorEventos):
+    """Encaminha os eventos para o módulo `logging` (uso em servidores / CLI)."""
+
+    NIVEIS_LOGGING = {'info': logging.INFO, 'aviso': logging.WARNING, 'erro': logging.ERROR, 'log': logging.DEBUG}
+
+    def __init__(self, logger: logging.Logger = None):
+        super().__init__()
+        self.logger = logger or logging.getLogger('filtrador')
+
+    def _tratar(self, evento: dict):
+        mensagem = evento['mensagem']
+        if evento['grupo']:
+            mensagem = f"[{evento['grupo']}] {mensagem}"
+        if evento['detalhe']:
+            mensagem = f"{mensagem}\n{evento['detalhe']}"
+        self.logger.log(self.NIVEIS_LOGGING.get(evento['nivel'], logging.INFO), mensagem)
+
+
+_registrador_atual = contextvars.ContextVar('registrador_eventos', default=None)
+_registrador_padrao = RegistradorLogging()
+
+
+def obter_registrador() -> RegistradorEventos:
+    """Retorna o registrador ativo no contexto atual (ou o padrão, via logging)."""
+    registrador = _registrador_atual.get()
+    return registrador if registrador is not None else _registrador_padrao
+
+
+@contextmanager
+def usar_registrador(registrador: RegistradorEventos):
+    """Ativa `registrador` para todo o código executado dentro do bloco."""
+    token = _registrador_atual.set(registrador)
+    try:
+        yield registrador
+    finally:
+        _registrador_atual.reset(token)
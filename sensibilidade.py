@@ -0,0 +1,257 @@
+"""
+Curvas de sensibilidade dos cortes e coeficientes, sem rodar a filtragem de novo.
+
+Partindo da base de trabalho antes da finalização (o MemoEtapas torna essa etapa
+barata depois da primeira execução), calcula quantos leads e quanta comissão o
+arquivo final teria para uma faixa de valores de um parâmetro. Tudo segue as
+regras de _finalizar_base: descarte de linhas sem valor liberado, corte de
+comissão total, corte de margem de empréstimo e um registro por CPF - o de maior
+comissão total entre os que passaram nos cortes (os empates só mudam qual linha
+fica, não a comissão, então as curvas só precisam do máximo por CPF).
+- comissao_minima e margem_limite: as linhas são ordenadas pela ordem em que
+  entram no arquivo conforme o corte se afrouxa; somas acumuladas dão leads e
+  comissão após cada entrada e cada ponto da curva é uma busca binária.
+- coeficiente/comissão de uma config: a margem das linhas aplicadas pela config
+  vezes a grade de coeficientes (broadcasting), com a maior comissão de cada CPF
+  em uma única redução (`np.maximum.reduceat`) para todos os pontos.
+"""
+
+import numpy as np
+import pandas as pd
+
+from chaves_cpf import CHAVE_AUSENTE, COLUNA_CHAVE_CPF, codificar_cpfs, limpar_cpfs
+from filtradores import (
+    _aplicar_margem_seguranca, _coluna_numerica, _processar_ate_finalizacao, _sufixo_produto
+)
+from memo_etapas import MemoEtapas
+from registro_eventos import RegistradorEventos, usar_registrador
+
+PRODUTOS = ('emprestimo', 'beneficio', 'cartao')
+COLUNA_MARGEM_PRODUTO = {
+    'emprestimo': 'MG_Emprestimo_Disponivel',
+    'beneficio': 'MG_Beneficio_Saque_Disponivel',
+    'cartao': 'MG_Cartao_Disponivel',
+}
+PONTOS_CURVA = 60
+# Limite de células (linhas x pontos da grade) por bloco na grade de coeficientes
+CELULAS_POR_BLOCO = 20_000_000
+
+
+class BaseSensibilidade:
+    """Colunas da base pré-finalização que os cortes finais leem, como arrays."""
+
+    def __init__(self, base: pd.DataFrame, params: dict):
+        self.params = params
+        self.valores = {p: self._numerica(base, f'valor_liberado_{p}') for p in PRODUTOS}
+        self.comissoes = {p: self._numerica(base, f'comissao_{p}') for p in PRODUTOS}
+        self.comissao_total = self.comissoes['emprestimo'] + self.comissoes['beneficio'] + self.comissoes['cartao']
+        self.com_valor = (self.valores['emprestimo'] > 0) | (self.valores['beneficio'] > 0) | (self.valores['cartao'] > 0)
+        if COLUNA_CHAVE_CPF in base.columns:
+            self.chaves = base[COLUNA_CHAVE_CPF].to_numpy()
+        else:
+            self.chaves = codificar_cpfs(limpar_cpfs(base['CPF']))
+        if 'MG_Emprestimo_Disponivel' in base.columns:
+            self.margem_emprestimo = _coluna_numerica(base, 'MG_Emprestimo_Disponivel').to_numpy()
+        else:
+            self.margem_emprestimo = None
+        self.base = base
+
+    @staticmethod
+    def _numerica(base: pd.DataFrame, coluna: str) -> np.ndarray:
+        if coluna not in base.columns:
+            return np.zeros(len(base))
+        return pd.to_numeric(base[coluna], errors='coerce').fillna(0).to_numpy(dtype='float64')
+
+    def mascara_margem(self, margem_limite: float = None) -> np.ndarray:
+        """Linhas que passam no corte de margem de empréstimo da finalização."""
+        if self.margem_emprestimo is None:
+            return np.ones(len(self.chaves), dtype=bool)
+        if margem_limite is None:
+            margem_limite = self.params.get('margem_limite', 20.0)
+        if self.params.get('tipo_campanha', '') == 'Novo':
+            return self.margem_emprestimo > margem_limite
+        return self.margem_emprestimo <= margem_limite
+
+    def mascara_comissao(self, comissao_total: np.ndarray = None) -> np.ndarray:
+        comissao_total = self.comissao_total if comissao_total is None else comissao_total
+        comissao_min = self.params.get('comissao_minima', 0)
+        comissao_max = self.params.get('comissao_maxima', float('inf'))
+        return (comissao_total >= comissao_min) & (comissao_total <= comissao_max)
+
+
+def produto_da_config(tipo_campanha: str, config: dict) -> str:
+    """Produto calculado por uma config (mesma regra de aplicar_filtros)."""
+    if tipo_campanha == 'Benefício & Cartão':
+        return 'Cartão' if config.get('cartao_escolhido', 'Benefício') == 'Consignado' else 'Benefício'
+    return tipo_campanha
+
+
+def preparar_base(df: pd.DataFrame, params: dict, configs_banco: list, memo: MemoEtapas = None) -> BaseSensibilidade:
+    """
+    Roda (ou reaproveita do `memo`) as etapas até antes da finalização.
+    Retorna None se não sobrou base. Os eventos dessas etapas são descartados.
+    """
+    memo = memo if memo is not None else MemoEtapas()
+    with usar_registrador(RegistradorEventos()):
+        base, _ = _processar_ate_finalizacao(df, params, configs_banco, memo)
+    if base is None or base.empty:
+        return None
+    return BaseSensibilidade(base, params)
+
+
+def _acumular_entradas(chaves: np.ndarray, posicoes: np.ndarray, comissao: np.ndarray):
+    """
+    Linhas entrando no arquivo na ordem de `posicoes`. O registro de cada CPF é o
+    de maior comissão entre os que já entraram. Retorna os leads e a comissão total
+    acumulados após cada entrada (com o ponto "nenhuma" na frente).
+    """
+    chaves_entrada = chaves[posicoes]
+    comissao_registro = pd.Series(comissao[posicoes]).groupby(chaves_entrada, sort=False).cummax()
+    anterior = comissao_registro.groupby(chaves_entrada, sort=False).shift(1)
+    cpf_novo = anterior.isna().to_numpy()
+    incremento = (comissao_registro - anterior.fillna(0)).to_numpy()
+    return np.concatenate([[0], np.cumsum(cpf_novo)]), np.concatenate([[0.0], np.cumsum(incremento)])
+
+
+def _grade_automatica(valores: np.ndarray, atual: float, pontos: int = PONTOS_CURVA) -> np.ndarray:
+    """Pontos entre o mínimo e o percentil 99 dos valores, incluindo o valor atual."""
+    valores = valores[np.isfinite(valores)]
+    if len(valores) == 0:
+        return np.array([atual], dtype='float64')
+    inicio, fim = float(np.min(valores)), float(np.percentile(valores, 99))
+    grade = np.linspace(inicio, max(fim, inicio), pontos)
+    return np.unique(np.append(grade.round(2), atual))
+
+
+def curva_comissao_minima(sensibilidade: BaseSensibilidade, valores=None) -> pd.DataFrame:
+    """Leads e comissão total do arquivo final para cada valor de comissao_minima."""
+    params = sensibilidade.params
+    comissao_total = sensibilidade.comissao_total
+    elegiveis = (sensibilidade.com_valor & sensibilidade.mascara_margem() & (sensibilidade.chaves != CHAVE_AUSENTE)
+                 & (comissao_total <= params.get('comissao_maxima', float('inf'))))
+    posicoes = np.flatnonzero(elegiveis)
+    # Baixar o mínimo faz entrar as linhas de maior comissão primeiro (a primeira de cada CPF já é o registro)
+    posicoes = posicoes[np.argsort(-comissao_total[posicoes], kind='stable')]
+    leads, totais = _acumular_entradas(sensibilidade.chaves, posicoes, comissao_total)
+
+    comissoes_ordenadas = comissao_total[posicoes]
+    if valores is None:
+        valores = _grade_automatica(comissoes_ordenadas, params.get('comissao_minima', 0))
+    valores = np.asarray(valores, dtype='float64')
+    # Quantas linhas têm comissão >= valor (busca na ordem crescente dos negativos)
+    quantidade = np.searchsorted(-comissoes_ordenadas, -valores, side='right')
+    return pd.DataFrame({'comissao_minima': valores, 'leads': leads[quantidade],
+                         'comissao_total': totais[quantidade].round(2)})
+
+
+def curva_margem_limite(sensibilidade: BaseSensibilidade, valores=None) -> pd.DataFrame:
+    """Leads e comissão total do arquivo final para cada valor de margem_limite."""
+    params = sensibilidade.params
+    if sensibilidade.margem_emprestimo is None:
+        return pd.DataFrame(columns=['margem_limite', 'leads', 'comissao_total'])
+    novo = params.get('tipo_campanha', '') == 'Novo'
+    margem = sensibilidade.margem_emprestimo
+    elegiveis = (sensibilidade.com_valor & sensibilidade.mascara_comissao()
+                 & (sensibilidade.chaves != CHAVE_AUSENTE) & ~np.isnan(margem))
+    posicoes = np.flatnonzero(elegiveis)
+    # Novo exige margem > limite (baixar o limite faz entrar as maiores margens
+    # primeiro); os demais, margem <= limite (subir o limite faz entrar as menores)
+    posicoes = posicoes[np.argsort(-margem[posicoes] if novo else margem[posicoes], kind='stable')]
+    leads, totais = _acumular_entradas(sensibilidade.chaves, posicoes, sensibilidade.comissao_total)
+
+    margens = margem[posicoes]
+    if valores is None:
+        valores = _grade_automatica(margens, params.get('margem_limite', 20.0))
+    valores = np.asarray(valores, dtype='float64')
+    if novo:
+        quantidade = np.searchsorted(-margens, -valores, side='left')
+    else:
+        quantidade = np.searchsorted(margens, valores, side='right')
+    return pd.DataFrame({'margem_limite': valores, 'leads': leads[quantidade],
+                         'comissao_total': totais[quantidade].round(2)})
+
+
+def grade_coeficientes(sensibilidade: BaseSensibilidade, memo: MemoEtapas, config_idx: int, config: dict,
+                       produto: str, coeficientes, comissoes=None) -> pd.DataFrame:
+    """
+    Leads e comissão total do arquivo final para cada par (coeficiente, % de comissão)
+    da config `config_idx`, mantendo as demais configs e cortes. As linhas da config
+    vêm do `memo` (as que ela passou a tratar); linhas cujo valor foi zerado depois
+    (regras GOVSP) continuam zeradas.
+    """
+    sufixo = _sufixo_produto(produto)
+    coluna_tratado = 'tratado' if produto == 'Novo' else f'tratado_{sufixo}'
+    if config_idx >= len(memo.configs):
+        raise ValueError(f"Config {config_idx + 1} não está no memo: rode as etapas antes da grade.")
+    posicoes, _ = memo.configs[config_idx]['alteracoes'].get(coluna_tratado, (np.empty(0, dtype=np.int64), None))
+
+    coeficientes = np.asarray(coeficientes, dtype='float64')
+    comissoes = np.asarray([config.get('comissao', 0)] if comissoes is None else comissoes, dtype='float64')
+    grade_coef, grade_comissao = (g.ravel() for g in np.meshgrid(coeficientes, comissoes, indexing='ij'))
+    resultado = pd.DataFrame({'coeficiente': grade_coef, 'comissao': grade_comissao})
+    if posicoes is None:
+        raise ValueError(f"Config {config_idx + 1}: coluna '{coluna_tratado}' mudou de tipo; linhas da config desconhecidas.")
+
+    # Linhas fora da config: comissão e cortes fixos; por CPF, a maior comissão entre as que passam
+    chaves = sensibilidade.chaves
+    fixas = np.ones(len(chaves), dtype=bool)
+    fixas[posicoes] = False
+    passa_margem = sensibilidade.mascara_margem()
+    passa_fixa = fixas & sensibilidade.com_valor & passa_margem & sensibilidade.mascara_comissao() & (chaves != CHAVE_AUSENTE)
+    n_chaves = int(chaves.max()) + 1 if len(chaves) else 0
+    comissao_fixa_cpf = np.full(n_chaves, -np.inf)
+    np.maximum.at(comissao_fixa_cpf, chaves[passa_fixa], sensibilidade.comissao_total[passa_fixa])
+    tem_fixa = np.isfinite(comissao_fixa_cpf)
+
+    # Linhas da config com CPF e dentro do corte de margem, agrupadas por CPF
+    posicoes = posicoes[(chaves[posicoes] != CHAVE_AUSENTE) & passa_margem[posicoes]]
+    posicoes = posicoes[np.argsort(chaves[posicoes], kind='stable')]
+    chaves_config = chaves[posicoes]
+    inicios = np.flatnonzero(np.r_[True, chaves_config[1:] != chaves_config[:-1]]) if len(posicoes) else np.empty(0, int)
+    cpfs_config = chaves_config[inicios]
+
+    margem = _aplicar_margem_seguranca(
+        _coluna_numerica(sensibilidade.base, COLUNA_MARGEM_PRODUTO[sufixo]).iloc[posicoes], config
+    ).to_numpy(dtype='float64')
+    valor_atual = sensibilidade.valores[sufixo][posicoes]
+    # Linha zerada depois da config (GOVSP): o valor calculado não chegou ao arquivo
+    zerada = (valor_atual == 0) & (np.round(margem * config.get('coeficiente', 1), 2) != 0)
+    outros_valores = np.zeros(len(posicoes), dtype=bool)
+    for prod in PRODUTOS:
+        if prod != sufixo:
+            outros_valores |= sensibilidade.valores[prod][posicoes] > 0
+
+    # CPFs sem linhas da config: resultado fixo em toda a grade
+    fora_da_config = tem_fixa.copy()
+    fora_da_config[cpfs_config] = False
+    leads_fixos = int(fora_da_config.sum())
+    comissao_fixa = float(comissao_fixa_cpf[fora_da_config].sum())
+    comissao_fixa_config = comissao_fixa_cpf[cpfs_config][:, None]
+
+    leads = np.full(len(resultado), leads_fixos, dtype=np.int64)
+    totais = np.full(len(resultado), comissao_fixa)
+    if len(posicoes):
+        comissao_min = sensibilidade.params.get('comissao_minima', 0)
+        comissao_max = sensibilidade.params.get('comissao_maxima', float('inf'))
+        bloco = max(1, CELULAS_POR_BLOCO // len(posicoes))
+        for inicio in range(0, len(resultado), bloco):
+            fatia = slice(inicio, inicio + bloco)
+            # Mesmos arredondamentos dos processadores: valor e comissão a 2 casas
+            valor = np.round(margem[:, None] * grade_coef[None, fatia], 2)
+            comissao = np.round(valor * (grade_comissao[None, fatia] / 100), 2)
+            valor[zerada] = 0.0
+            comissao[zerada] = 0.0
+            # Soma na mesma ordem da finalização (empréstimo, benefício, cartão)
+            total = 0.0
+            for prod in PRODUTOS:
+                total = total + (comissao if prod == sufixo else sensibilidade.comissoes[prod][posicoes][:, None])
+            passa = (outros_valores[:, None] | (valor > 0)) & (total >= comissao_min) & (total <= comissao_max)
+            # Registro do CPF: a maior comissão entre as linhas da config que passam e as fixas
+            comissao_config = np.maximum.reduceat(np.where(passa, total, -np.inf), inicios, axis=0)
+            comissao_cpf = np.maximum(comissao_config, comissao_fixa_config)
+            no_arquivo = np.isfinite(comissao_cpf)
+            leads[fatia] += no_arquivo.sum(axis=0)
+            totais[fatia] += np.where(no_arquivo, comissao_cpf, 0.0).sum(axis=0)
+    resultado['leads'] = leads
+    resultado['comissao_total'] = totais.round(2)
+    return resultado
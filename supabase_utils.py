@@ -1,10 +1,12 @@
 import streamlit as st
 from supabase import create_client, Client
-import copy
 import json
-from postgrest.exceptions import APIError
 import pandas as pd
 from datetime import date # Importado para safe_json_serialize
+import time
+from fila_auditoria import EnvioPostgrest, FilaAuditoria
+from espelho_auditoria import TABELA_AUDITORIA, BuscaPostgrest, EspelhoAuditoria, filtro_apos
+from dados_constantes import INTERVALO_SINCRONIZACAO_AUDITORIA
 
 @st.cache_resource
 def init_supabase() -> Client:
@@ -29,115 +31,185 @@ def safe_json_serialize(obj):
             return o.isoformat()
         return str(o) # Fallback para string
 
-    # Garante que o objeto não é nulo antes de copiar
     if obj is None:
         return None
-    obj_copy = copy.deepcopy(obj)
-    
-    # Serializa e desserializa para garantir que é um objeto JSON válido
-    return json.loads(json.dumps(obj_copy, default=default))
+    # Serializa e desserializa para garantir que é um objeto JSON válido.
+    # json.dumps não altera o objeto, então não é preciso copiá-lo antes.
+    return json.loads(json.dumps(obj, default=default))
+
+
+class EnvioSupabase:
+    """Envio de lotes da fila de auditoria pelo cliente do Supabase (criado no primeiro envio)."""
+
+    def __init__(self, url: str, chave: str):
+        self.url = url
+        self.chave = chave
+        self._client = None
+
+    def __call__(self, tabela: str, linhas: list):
+        if self._client is None:
+            self._client = create_client(self.url, self.chave)
+        self._client.table(tabela).insert(linhas).execute()
+
+
+class BuscaSupabase:
+    """Busca de páginas da tabela de auditoria (para o espelho local) pelo cliente do Supabase."""
+
+    def __init__(self, url: str, chave: str):
+        self.url = url
+        self.chave = chave
+        self._client = None
+
+    def __call__(self, apos, limite: int) -> list:
+        if self._client is None:
+            self._client = create_client(self.url, self.chave)
+        query = self._client.table(TABELA_AUDITORIA).select("*").order("created_at").order("id")
+        if apos is not None:
+            query = query.or_(filtro_apos(apos))
+        return query.limit(limite).execute().data
+
+
+def _criar_acesso_auditoria(classe_postgrest, classe_supabase):
+    """
+    Envio/busca da tabela de auditoria conforme os secrets: `postgrest_url` (ex: um
+    PostgREST local) usa HTTP puro; senão, o cliente do Supabase. None se não houver configuração.
+    """
+    try:
+        segredos = st.secrets["supabase"]
+        chave = segredos.get("supabase_key")
+        if segredos.get("postgrest_url"):
+            return classe_postgrest(segredos["postgrest_url"], chave)
+        return classe_supabase(segredos["supabase_url"], chave)
+    except Exception:
+        return None
+
+
+@st.cache_resource
+def obter_fila_auditoria() -> FilaAuditoria:
+    """Fila local de auditoria do processo, com o worker de envio já rodando."""
+    return FilaAuditoria(_criar_acesso_auditoria(EnvioPostgrest, EnvioSupabase)).iniciar()
+
+
+@st.cache_resource
+def obter_espelho_auditoria() -> EspelhoAuditoria:
+    """Cópia local da tabela de auditoria (compartilhada pelas sessões do processo)."""
+    return EspelhoAuditoria(_criar_acesso_auditoria(BuscaPostgrest, BuscaSupabase))
+
+
+def sincronizar_espelho_auditoria(forcar: bool = False) -> int:
+    """
+    Traz para a cópia local o que chegou ao Supabase desde a última sincronização
+    (no máximo uma vez a cada INTERVALO_SINCRONIZACAO_AUDITORIA segundos, salvo `forcar`).
+    Retorna quantos registros novos entraram; em caso de falha, avisa e segue com a cópia local.
+    """
+    espelho = obter_espelho_auditoria()
+    if not forcar and time.time() - espelho.sincronizado_em() < INTERVALO_SINCRONIZACAO_AUDITORIA:
+        return 0
+    try:
+        return espelho.sincronizar()
+    except Exception as e:
+        st.warning(f"Não foi possível atualizar o histórico com o Supabase ({e}). Exibindo a cópia local.")
+        return 0
+
+
+def sincronizar_espelho_em_segundo_plano():
+    """
+    Como sincronizar_espelho_auditoria, mas em uma thread e sem avisos: para páginas
+    que só leem a cópia local e não devem esperar o Supabase. Uma por vez.
+    """
+    obter_espelho_auditoria().sincronizar_em_segundo_plano(INTERVALO_SINCRONIZACAO_AUDITORIA)
+
+
+def resumo_coeficientes(convenio: str, produto: str, banco: str):
+    """
+    Último coeficiente/comissão e mediana/faixa por janela para (convênio, produto, banco),
+    do índice agregado da cópia local (ver EspelhoAuditoria.resumo_coeficientes). None se não houver.
+    """
+    sincronizar_espelho_em_segundo_plano()
+    try:
+        return obter_espelho_auditoria().resumo_coeficientes(convenio, produto, banco)
+    except Exception:
+        return None
+
+
+def produto_configurado(tipo_campanha: str, cartao_escolhido: str) -> str:
+    """Produto gravado na auditoria ('produto_configurado') para a campanha e o produto da config."""
+    if tipo_campanha in ('Novo', 'Benefício', 'Cartão'):
+        return tipo_campanha
+    if tipo_campanha == 'Benefício & Cartão':
+        return "Cartão" if cartao_escolhido == 'Consignado' else "Benefício"
+    return "N/A"
+
 
 # --- FUNÇÃO DE SALVAR REESCRITA (para tabela larga) ---
+def montar_linhas_auditoria(params_gerais: dict, configs_banco: list) -> list:
+    """Uma linha da tabela 'logs_auditoria_configs' para CADA configuração de banco."""
+    params_serializados = safe_json_serialize(params_gerais)
+    linhas_para_inserir = []
+
+    # Loop através de cada configuração de banco
+    for config in configs_banco:
+        
+        # Lógica para determinar o 'produto' final
+        produto_final = produto_configurado(params_gerais.get('tipo_campanha'), config.get('cartao_escolhido'))
+
+        # Prepara o payload (uma linha para a tabela)
+        payload = {
+            # --- Colunas de Parâmetros Gerais ---
+            "convenio": params_gerais.get('convenio'),
+            "tipo_campanha_geral": params_gerais.get('tipo_campanha'),
+            "equipe": params_gerais.get('equipe'),
+
+            # --- Colunas da Configuração do Banco ---
+            "produto_configurado": produto_final,
+            "cartao_escolhido": config.get('cartao_escolhido'),
+            "operador_logico": config.get('operador_logico'),
+            "condicoes": safe_json_serialize(config.get('condicoes')),
+            "banco": config.get('banco'),
+            "coeficiente": config.get('coeficiente'),
+            "comissao": config.get('comissao'),
+            "parcelas": config.get('parcelas'),
+            "coeficiente_parcela": config.get('coeficiente_parcela'),
+            "margem_minima_cartao": config.get('margem_minima_cartao'),
+            "usa_margem_seguranca": config.get('usa_margem_seguranca'),
+            "modo_margem_seguranca": config.get('modo_margem_seguranca'),
+            "valor_margem_seguranca": config.get('valor_margem_seguranca'),
+
+            # --- JSON de Auditoria ---
+            "params_gerais_json": params_serializados
+        }
+        linhas_para_inserir.append(payload)
+
+    return linhas_para_inserir
+
+
 def salvar_configuracao_no_supabase(params_gerais: dict, configs_banco: list):
     """
     Salva CADA configuração de banco como uma NOVA LINHA na tabela 'logs_auditoria_configs'.
+    As linhas vão para a fila local de auditoria e são enviadas em segundo plano;
+    retorna assim que estão gravadas na fila.
     """
-    client = init_supabase()
-    if client is None:
-        st.warning("Conexão com o Supabase falhou. Não foi possível salvar o log.")
+    fila = obter_fila_auditoria()
+    if fila.enviar is None:
+        # Sem secrets do Supabase as linhas nunca sairiam da fila
+        st.warning("Conexão com o Supabase não configurada. Não foi possível salvar o log.")
         return False
 
     try:
-        params_serializados = safe_json_serialize(params_gerais)
-        linhas_para_inserir = []
-
-        # Loop através de cada configuração de banco
-        for config in configs_banco:
-            
-            # Lógica para determinar o 'produto' final
-            produto_final = "N/A"
-            tipo_campanha_global = params_gerais.get('tipo_campanha')
-            
-            if tipo_campanha_global == 'Novo':
-                produto_final = "Novo"
-            elif tipo_campanha_global == 'Benefício':
-                produto_final = "Benefício"
-            elif tipo_campanha_global == 'Cartão':
-                produto_final = "Cartão"
-            elif tipo_campanha_global == 'Benefício & Cartão':
-                if config.get('cartao_escolhido') == 'Consignado':
-                    produto_final = "Cartão"
-                else:
-                    produto_final = "Benefício"
-
-            # Prepara o payload (uma linha para a tabela)
-            payload = {
-                # --- Colunas de Parâmetros Gerais ---
-                "convenio": params_gerais.get('convenio'),
-                "tipo_campanha_geral": params_gerais.get('tipo_campanha'),
-                "equipe": params_gerais.get('equipe'),
-
-                # --- Colunas da Configuração do Banco ---
-                "produto_configurado": produto_final,
-                "cartao_escolhido": config.get('cartao_escolhido'),
-                "operador_logico": config.get('operador_logico'),
-                "condicoes": safe_json_serialize(config.get('condicoes')),
-                "banco": config.get('banco'),
-                "coeficiente": config.get('coeficiente'),
-                "comissao": config.get('comissao'),
-                "parcelas": config.get('parcelas'),
-                "coeficiente_parcela": config.get('coeficiente_parcela'),
-                "margem_minima_cartao": config.get('margem_minima_cartao'),
-                "usa_margem_seguranca": config.get('usa_margem_seguranca'),
-                "modo_margem_seguranca": config.get('modo_margem_seguranca'),
-                "valor_margem_seguranca": config.get('valor_margem_seguranca'),
-
-                # --- JSON de Auditoria ---
-                "params_gerais_json": params_serializados
-            }
-            linhas_para_inserir.append(payload)
-
-        # Insere todas as linhas de uma vez
-        client.table("logs_auditoria_configs").insert(linhas_para_inserir).execute()
+        linhas_para_inserir = montar_linhas_auditoria(params_gerais, configs_banco)
+        fila.enfileirar(TABELA_AUDITORIA, linhas_para_inserir)
         return True
 
-    except APIError as e:
-        st.warning(f"Erro ao salvar log no Supabase (APIError): {e}")
-        return False
     except Exception as e:
-        st.warning(f"Erro inesperado ao serializar ou salvar log no Supabase: {e}")
+        st.warning(f"Erro inesperado ao serializar ou gravar o log na fila de auditoria: {e}")
         return False
 
-# --- FUNÇÃO DE CONSULTA ATUALIZADA (para tabela larga) ---
-@st.cache_data(ttl=300) # Cache de 5 minutos
-def consultar_coeficientes(convenio: str = None, produto: str = None) -> list:
+# --- FUNÇÃO DE CONSULTA ATUALIZADA (servida pela cópia local) ---
+def consultar_coeficientes(convenio: str = None, produto: str = None, limite: int = 100, apos=None):
     """
-    Consulta os logs de auditoria no Supabase, com filtros.
+    Consulta os logs de auditoria, com filtros, na cópia local (sincronizada antes
+    com o que houver de novo no Supabase). Paginada por chave: retorna
+    (registros da página, cursor da próxima página ou None).
     """
-    client = init_supabase()
-    if client is None:
-        st.error("Conexão com o Supabase falhou. Não foi possível consultar os dados.")
-        return []
-
-    try:
-        # Seleciona todas as colunas da nova tabela
-        query = client.table("logs_auditoria_configs").select("*").order("created_at", desc=True)
-
-        if convenio and convenio != "Todos":
-            query = query.eq("convenio", convenio)
-        
-        # Filtra pela coluna 'produto_configurado'
-        if produto and produto != "Todos":
-            query = query.eq("produto_configurado", produto)
-        
-        query = query.limit(200) # Aumenta o limite
-        
-        response = query.execute()
-        return response.data
-
-    except APIError as e:
-        st.error(f"Erro ao consultar dados no Supabase (APIError): {e}")
-        return []
-    except Exception as e:
-        st.error(f"Erro inesperado ao consultar dados: {e}")
-        return []
+    sincronizar_espelho_auditoria()
+    return obter_espelho_auditoria().consultar(convenio, produto, limite=limite, apos=apos)
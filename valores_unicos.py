@@ -0,0 +1,43 @@
+"""
+Avaliação de filtros no domínio dos valores distintos de uma coluna.
+
+Colunas como Lotacao e Vinculo_Servidor têm poucos milhares de valores distintos
+em milhões de linhas. Em vez de rodar a regex/`isin` em todas as linhas, o
+filtro é avaliado uma vez por valor distinto (categorias ou `pd.factorize`) e o
+resultado é propagado às linhas pelos códigos.
+"""
+
+import numpy as np
+import pandas as pd
+
+
+def codificar_valores(serie: pd.Series):
+    """
+    (códigos por linha, valores distintos como texto). Colunas categóricas
+    reaproveitam os códigos e categorias; as demais passam por `pd.factorize`.
+    Nulos têm código -1.
+    """
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        codigos = serie.cat.codes.to_numpy()
+        unicos = serie.cat.categories
+    else:
+        codigos, unicos = pd.factorize(serie)
+    return codigos, pd.Series(unicos, dtype=object).astype(str)
+
+
+def expandir_para_linhas(mascara_unicos, codigos: np.ndarray, valor_nulo: bool = False) -> np.ndarray:
+    """Leva uma máscara por valor distinto para as linhas (código -1 recebe `valor_nulo`)."""
+    mascara_unicos = np.asarray(mascara_unicos, dtype=bool)
+    return np.append(mascara_unicos, valor_nulo)[codigos]
+
+
+def avaliar_por_unicos(serie: pd.Series, avaliar) -> np.ndarray:
+    """
+    Máscara por linha de `avaliar(valores_distintos) -> máscara`, calculada só nos
+    valores distintos. Linhas nulas ficam False (como `na=False` nas buscas de texto).
+    """
+    codigos, unicos = codificar_valores(serie)
+    mascara = avaliar(unicos)
+    if isinstance(mascara, pd.Series):
+        mascara = mascara.to_numpy(dtype=bool, na_value=False)
+    return expandir_para_linhas(mascara, codigos)